@@ -0,0 +1,459 @@
+"""
+MIT License
+
+Copyright (c) 2025 Damian Zaremba
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import base64
+import hashlib
+import io
+import json
+import re
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Sequence
+from unittest import mock
+
+import click
+from requests.exceptions import HTTPError
+
+from cbng_trainer import cli
+from cbng_trainer.common import http_client, toolforge
+from cbng_trainer.common.consts import JOB_LOGS_END_MARKER, JOB_TELEMETRY_MARKER
+from cbng_trainer.common.files import SharedWorkspace
+
+REVIEW_HOST = "http://review.invalid"
+TRAINER_HOST = "http://file-api.invalid"
+TRAINING_DUMP_URL = f"{REVIEW_HOST}/api/v1/edit-groups/1/dump-editset/"
+TRIAL_DUMP_URL = f"{REVIEW_HOST}/api/v1/edit-groups/2/dump-editset/"
+
+_DUMP_URL_RE = re.compile(rf"^{re.escape(REVIEW_HOST)}/api/v1/edit-groups/(\d+)/dump-editset/$")
+_UPLOAD_FILE_RE = re.compile(r'^upload_file "([^"]+)" "([^"]+)"$', re.MULTILINE)
+_CURL_DOWNLOAD_RE = re.compile(r"^curl .*--output '([^']+)' '([^']+)'$", re.MULTILINE)
+_SHARED_WORKSPACE_RE = re.compile(r"workspace_path='([^']+)/'\"\$\{target_url#'([^']+)/'\}\"")
+_ENCODED_SCRIPT_RE = re.compile(r"base64 -d <<<([A-Za-z0-9+/=]+) > /tmp/setup.sh")
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, content: bytes = b"", headers: Optional[Dict[str, str]] = None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.content = content
+        self.text = content.decode("utf-8", "replace")
+        self.raw = io.BytesIO(content)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+    def iter_lines(self):
+        return iter(self.content.splitlines())
+
+    def iter_content(self, chunk_size: int = 1):
+        return (self.content[offset : offset + chunk_size] for offset in range(0, len(self.content), chunk_size))
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            raise HTTPError(response=self)
+
+
+class FakeJob:
+    def __init__(
+        self,
+        name: str,
+        command: str,
+        start_polls: int,
+        run_polls: int,
+        log_lines: int,
+        exit_code: int = 0,
+        fail_to_start: bool = False,
+    ):
+        self.name = name
+        self.exit_code = exit_code
+        self.fail_to_start = fail_to_start
+        self.command = command
+        self.polls = 0
+        self.start_polls = start_polls
+        self.run_polls = run_polls
+        self.log_lines = log_lines
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+
+    @property
+    def script(self) -> str:
+        if match := _ENCODED_SCRIPT_RE.search(self.command):
+            return base64.b64decode(match.group(1)).decode("utf-8")
+        return ""
+
+    def poll(self) -> Dict[str, str]:
+        self.polls += 1
+        if self.polls <= self.start_polls:
+            return {"status_short": "Pending", "status_long": "Waiting for the pod to be scheduled."}
+        if self.fail_to_start:
+            return {"status_short": "Failed", "status_long": "Pod failed to start."}
+
+        if self.started_at is None:
+            self.started_at = datetime.now(tz=timezone.utc)
+        if self.polls <= self.start_polls + self.run_polls:
+            return {
+                "status_short": "Running for 1s",
+                "status_long": f"Last run at {self.started_at.isoformat()}. Pod in 'Running' phase.",
+            }
+
+        if self.finished_at is None:
+            self.finished_at = datetime.now(tz=timezone.utc)
+        return {"status_short": "Completed", "status_long": f"Last run at ... Exit code '{self.exit_code}'."}
+
+    def logs(self) -> List[Dict[str, str]]:
+        if self.started_at is None:
+            return []
+        logs = [
+            {
+                "datetime": (self.started_at + timedelta(microseconds=index)).isoformat(),
+                "message": f"+ synthetic log line {index} for {self.name}",
+                "pod": self.name,
+                "container": "job",
+            }
+            for index in range(self.log_lines)
+        ]
+        if JOB_TELEMETRY_MARKER in self.script:
+            logs.extend(
+                {
+                    "datetime": (self.started_at + timedelta(seconds=index)).isoformat(),
+                    "message": synthetic_telemetry_line(index),
+                    "pod": self.name,
+                    "container": "job",
+                }
+                for index in range(3)
+            )
+        if self.finished_at is not None:
+            logs.append(
+                {
+                    "datetime": self.finished_at.isoformat(),
+                    "message": JOB_LOGS_END_MARKER,
+                    "pod": self.name,
+                    "container": "job",
+                }
+            )
+        return logs
+
+
+class FakeFileApi:
+    def __init__(self):
+        self.objects: Dict[str, bytes] = {}
+        # Objects pushed through the api, by the coordinator or a job
+        self.uploads = 0
+        self.downloads = 0
+
+    def get(self, url: str, headers: Optional[Dict[str, str]] = None) -> FakeResponse:
+        self.downloads += 1
+        if url not in self.objects:
+            return FakeResponse(404)
+        etag = f'"{hashlib.sha256(self.objects[url]).hexdigest()}"'
+        if (headers or {}).get("If-None-Match") == etag:
+            return FakeResponse(304, headers={"ETag": etag})
+        return FakeResponse(200, self.objects[url], headers={"ETag": etag})
+
+    def post(self, url: str, data: Any) -> FakeResponse:
+        if hasattr(data, "read"):
+            data = data.read()
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        if url in self.objects:
+            # As the real api, objects can not be replaced
+            return FakeResponse(409, b"Object already exists")
+        self.objects[url] = data
+        self.uploads += 1
+        return FakeResponse(201)
+
+    def store_job_outputs(self, script: str) -> None:
+        # Pretend the job did its thing and pushed every output it would upload
+        workspace = None
+        if match := _SHARED_WORKSPACE_RE.search(script):
+            workspace = SharedWorkspace(url_prefix=match.group(2), directory=match.group(1))
+
+        # Anything the job downloaded & re-uploads as is (the edit sets) keeps the real contents
+        downloads = dict(_CURL_DOWNLOAD_RE.findall(script))
+        for source_path, target_url in _UPLOAD_FILE_RE.findall(script):
+            if downloads.get(source_path) in self.objects:
+                contents = self.objects[downloads[source_path]]
+            else:
+                contents = synthetic_file_contents(source_path, target_url)
+            if workspace and (path := workspace.path_for(target_url)):
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.write_bytes(contents)
+                if not workspace.is_published(target_url):
+                    continue
+            self.objects[target_url] = contents
+            self.uploads += 1
+
+
+class FakeToolforge:
+    def __init__(
+        self,
+        file_api: FakeFileApi,
+        start_polls: int = 2,
+        run_polls: int = 3,
+        log_lines: int = 50,
+        stuck_jobs: Optional[List[str]] = None,
+        failing_jobs: Optional[List[str]] = None,
+        unstartable_jobs: Optional[List[str]] = None,
+    ):
+        self.file_api = file_api
+        # Matched against the end of the job name, never scheduled, as if stuck on a bad node
+        self.stuck_jobs = stuck_jobs or []
+        # Matched against the end of the job name, exit non-zero
+        self.failing_jobs = failing_jobs or []
+        # Matched against the end of the job name, fail after the usual scheduling delay, as if the image pull failed
+        self.unstartable_jobs = unstartable_jobs or []
+        self.start_polls = start_polls
+        self.run_polls = run_polls
+        self.log_lines = log_lines
+        self.jobs: Dict[str, FakeJob] = {}
+        self.envvars: Dict[str, str] = {}
+        self.calls: Counter = Counter()
+
+    @staticmethod
+    def _not_found() -> HTTPError:
+        return HTTPError("404 Not Found", response=FakeResponse(404))
+
+    def get(self, path: str, **kwargs) -> Dict[str, Any]:
+        self.calls["get"] += 1
+        parts = path.strip("/").split("/")
+        if parts[0] == "jobs":
+            if (job := self.jobs.get(parts[-1])) is None:
+                raise self._not_found()
+            status = job.poll()
+            if (
+                status["status_short"] == "Completed"
+                and job.exit_code == 0
+                and job.polls == job.start_polls + job.run_polls + 1
+            ):
+                self.file_api.store_job_outputs(job.script)
+            return {"job": status | {"name": job.name, "cmd": job.command}}
+
+        if parts[0] == "logs":
+            if (job := self.jobs.get(parts[-2])) is None:
+                raise self._not_found()
+            return {"data": {"logs": job.logs()}}
+
+        if parts[0] == "envvars":
+            if parts[-1] not in self.envvars:
+                raise self._not_found()
+            return {"envvar": {"name": parts[-1], "value": self.envvars[parts[-1]]}}
+
+        raise self._not_found()
+
+    def post(self, path: str, json: Dict[str, Any], **kwargs) -> Dict[str, Any]:
+        self.calls["post"] += 1
+        if path.strip("/").startswith("jobs"):
+            if json["name"] in self.jobs:
+                raise HTTPError("409 Conflict", response=FakeResponse(409))
+            self.jobs[json["name"]] = FakeJob(
+                json["name"],
+                json["cmd"],
+                10**9 if any(json["name"].endswith(name) for name in self.stuck_jobs) else self.start_polls,
+                self.run_polls,
+                self.log_lines,
+                exit_code=1 if any(json["name"].endswith(name) for name in self.failing_jobs) else 0,
+                fail_to_start=any(json["name"].endswith(name) for name in self.unstartable_jobs),
+            )
+        else:
+            self.envvars[json["name"]] = json["value"]
+        return {}
+
+    def delete(self, path: str, **kwargs) -> Dict[str, Any]:
+        self.calls["delete"] += 1
+        parts = path.strip("/").split("/")
+        if parts[0] == "envvars":
+            if self.envvars.pop(parts[-1], None) is None:
+                raise self._not_found()
+            return {}
+        if self.jobs.pop(parts[-1], None) is None:
+            raise self._not_found()
+        return {}
+
+
+def synthetic_edit_set(edits: int = 1000, first_edit_id: int = 0) -> bytes:
+    # Odd edit ids are vandalism
+    return (
+        "<WPEditSet>"
+        + "".join(
+            f"<WPEdit><EditID>{edit_id}</EditID><isVandalism>{'true' if edit_id % 2 else 'false'}</isVandalism>"
+            "</WPEdit>"
+            for edit_id in range(first_edit_id, first_edit_id + edits)
+        )
+        + "</WPEditSet>"
+    ).encode("utf-8")
+
+
+def synthetic_file_contents(source_path: str, target_url: str = "", edits: int = 1000) -> bytes:
+    if target_url.endswith("/train.xml") or target_url.endswith("/trial.xml"):
+        return synthetic_edit_set(edits)
+    if source_path.endswith("main_ann_train.dat"):
+        # FANN training data, a "rows inputs outputs" header then an input & output line per row
+        rows = edits // 10
+        return (f"{rows} 3 1\n" + "0.1 0.2 0.3\n1\n" * rows).encode("utf-8")
+    if source_path.endswith("_bayes_train.dat"):
+        # Word counts, a "<word>\t<count>\t<count>" line per word
+        return "".join(f"word{word}\t{word % 7}\t{word % 3}\n" for word in range(edits)).encode("utf-8")
+    if source_path.endswith("thresholdtable.txt"):
+        # "<threshold> <detection rate> <false positive rate>", as fractions, both falling as the threshold rises
+        return "".join(
+            f"{threshold / 100:.2f} {1 - threshold / 200:.6f} {(100 - threshold) / 5000:.6f}\n"
+            for threshold in range(100)
+        ).encode("utf-8")
+    if source_path.endswith("debug.xml"):
+        return (
+            "<WPEditSet>"
+            + "".join(
+                f"<WPEdit><EditID>{edit_id}</EditID><isVandalism>{'true' if edit_id % 2 else 'false'}</isVandalism>"
+                f"<score>{(edit_id % 100) / 100}</score></WPEdit>"
+                for edit_id in range(edits)
+            )
+            + "</WPEditSet>"
+        ).encode("utf-8")
+    if source_path.endswith("falsepositives.txt") or source_path.endswith("falsenegatives.txt"):
+        return "\n".join(str(edit_id) for edit_id in range(0, edits, 97)).encode("utf-8")
+    return f"synthetic contents of {source_path}\n".encode("utf-8")
+
+
+def synthetic_telemetry_line(index: int) -> str:
+    sample = {
+        "time": 1_700_000_000 + index,
+        "cpu_usec": index * 900_000,
+        "memory_bytes": 100_000_000 + index * 1_000_000,
+        "memory_peak_bytes": 100_000_000 + index * 1_000_000,
+        "disk_used_kb": 1_000 + index,
+        "rx_bytes": index * 1_000_000,
+        "tx_bytes": index * 1_000,
+    }
+    return f"{JOB_TELEMETRY_MARKER} {json.dumps(sample)}"
+
+
+def synthetic_edit_groups(targets: int) -> List[Dict[str, Any]]:
+    edit_groups = []
+    for index in range(targets):
+        edit_groups.append(
+            {"id": index * 2 + 1, "name": f"Synthetic Target {index}", "type": "Training", "related_to": None}
+        )
+        edit_groups.append(
+            {
+                "id": index * 2 + 2,
+                "name": f"Synthetic Target {index} Trial",
+                "type": "Trial",
+                "related_to": index * 2 + 1,
+            }
+        )
+    return edit_groups
+
+
+class FakeEnvironment:
+    def __init__(self, targets: int = 0, **toolforge_kwargs):
+        self.file_api = FakeFileApi()
+        self.toolforge = FakeToolforge(self.file_api, **toolforge_kwargs)
+        self.edit_groups = synthetic_edit_groups(targets)
+        # Served for the edit groups' dumps, unless replaced by an object in the file api
+        self.edit_group_dumps = {
+            edit_group["id"]: synthetic_edit_set(10, first_edit_id=edit_group["id"] * 1000)
+            for edit_group in self.edit_groups
+        }
+        self.listing_requests = 0
+        self.dump_requests = 0
+        self._patches = []
+
+    def _requests_get(self, url: str, *args, **kwargs) -> FakeResponse:
+        if url == f"{REVIEW_HOST}/api/v1/edit-groups/":
+            self.listing_requests += 1
+            content = json.dumps(self.edit_groups).encode("utf-8")
+            etag = f'"{hashlib.sha256(content).hexdigest()}"'
+            if (kwargs.get("headers") or {}).get("If-None-Match") == etag:
+                return FakeResponse(304, headers={"ETag": etag})
+            return FakeResponse(200, content, headers={"ETag": etag})
+        if match := _DUMP_URL_RE.match(url):
+            self.dump_requests += 1
+            if url not in self.file_api.objects and int(match.group(1)) in self.edit_group_dumps:
+                content = self.edit_group_dumps[int(match.group(1))]
+                etag = f'"{hashlib.sha256(content).hexdigest()}"'
+                if (kwargs.get("headers") or {}).get("If-None-Match") == etag:
+                    return FakeResponse(304, headers={"ETag": etag})
+                return FakeResponse(200, content, headers={"ETag": etag})
+        return self.file_api.get(url, kwargs.get("headers"))
+
+    def _requests_post(self, url: str, *args, data: Any = None, **kwargs) -> FakeResponse:
+        return self.file_api.post(url, data)
+
+    def __enter__(self) -> "FakeEnvironment":
+        self._patches = [
+            mock.patch.object(toolforge, "_client_config", lambda target_user: self.toolforge),
+            mock.patch.object(toolforge.time, "sleep", lambda seconds: None),
+            mock.patch.object(
+                http_client, "_session", SimpleNamespace(get=self._requests_get, post=self._requests_post)
+            ),
+            mock.patch.dict("os.environ", {"FILE_API_KEY": "benchmark"}),
+        ]
+        for patch in self._patches:
+            patch.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        for patch in reversed(self._patches):
+            patch.stop()
+        toolforge.configure_job_slots(None)
+
+    def run_edit_set(
+        self,
+        *args: str,
+        trial: bool = True,
+        training_edits: int = 1000,
+        trial_edits: int = 200,
+        cli_args: Sequence[str] = (),
+    ) -> None:
+        # The review api dumps, fetched by `store_edit_sets` (or sampled & mirrored locally)
+        self.file_api.objects.setdefault(TRAINING_DUMP_URL, synthetic_edit_set(training_edits))
+        self.file_api.objects.setdefault(TRIAL_DUMP_URL, synthetic_edit_set(trial_edits, first_edit_id=training_edits))
+        # Only through the group when it has options, as that installs the signal handlers
+        command, command_args = (cli.cli, list(cli_args) + ["run-edit-set"]) if cli_args else (cli.run_edit_set, [])
+        invoke(
+            command,
+            command_args
+            + [
+                "--target-name=Benchmark",
+                "--instance-name=benchmark",
+                "--trainer-image-name=benchmark",
+                "--core-image-name=benchmark",
+                f"--trainer-host={TRAINER_HOST}",
+                f"--download-training={TRAINING_DUMP_URL}",
+            ]
+            + ([f"--download-trial={TRIAL_DUMP_URL}"] if trial else [])
+            + list(args),
+        )
+
+
+def invoke(command: click.Command, args: List[str]) -> None:
+    # As the cli would, but raising rather than exiting on errors
+    command.main(args=args, standalone_mode=False)
@@ -0,0 +1,109 @@
+"""
+MIT License
+
+Copyright (c) 2025 Damian Zaremba
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import json
+import logging
+import os
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+import click
+
+from benchmarks.suite import BENCHMARKS
+
+BASELINE_PATH = Path(__file__).parent / "baseline.json"
+
+
+def _is_timing(metric: str) -> bool:
+    return metric.endswith("_per_second") or metric.endswith("seconds") or metric.endswith("seconds_per_call")
+
+
+def _is_regression(metric: str, value: float, baseline: float, tolerance: float) -> bool:
+    if metric.endswith("_per_second"):
+        return value * tolerance < baseline
+    if _is_timing(metric):
+        return value > baseline * tolerance
+    # Counters (api calls, bytes) are deterministic, so any growth is a regression
+    return value > baseline
+
+
+def _best(metric: str, values: List[float]) -> float:
+    return max(values) if metric.endswith("_per_second") else min(values)
+
+
+@click.command()
+@click.option("--only", multiple=True, default=None)
+@click.option("--update-baseline/--no-update-baseline", default=False)
+@click.option("--tolerance", default=1.5, type=float)
+# Timings are noisy on a shared machine, a timing regression only counts if it is still there on a re-run
+@click.option("--retries", default=2, type=int)
+@click.option("--output", type=click.Path(dir_okay=False), required=False)
+def main(only: List[str], update_baseline: bool, tolerance: float, retries: int, output: str) -> None:
+    # Realistic logging overhead, without the noise
+    handler = logging.StreamHandler(open(os.devnull, "w"))
+    handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
+    logging.basicConfig(level=logging.INFO, handlers=[handler])
+
+    baseline: Dict[str, Dict[str, float]] = {}
+    if BASELINE_PATH.exists():
+        baseline = json.loads(BASELINE_PATH.read_text())
+
+    results: Dict[str, Dict[str, float]] = {}
+    regressions = []
+    for name, func in BENCHMARKS.items():
+        if only and name not in only:
+            continue
+
+        results[name] = func()
+        for _ in range(retries):
+            if not any(
+                _is_timing(metric) and _is_regression(metric, value, baseline[name][metric], tolerance)
+                for metric, value in results[name].items()
+                if metric in baseline.get(name, {})
+            ):
+                break
+            rerun = func()
+            results[name] = {
+                metric: _best(metric, [value, rerun[metric]]) if _is_timing(metric) else value
+                for metric, value in results[name].items()
+            }
+
+        for metric, value in results[name].items():
+            expected = baseline.get(name, {}).get(metric)
+            status = ""
+            if expected is not None and _is_regression(metric, value, expected, tolerance):
+                status = f"REGRESSION (baseline {expected:.6g})"
+                regressions.append(f"{name}.{metric}")
+            print(f"{name:<40} {metric:<24} {value:>16.6g} {status}")
+
+    if output:
+        Path(output).write_text(json.dumps(results, indent=2, sort_keys=True))
+
+    if update_baseline:
+        BASELINE_PATH.write_text(json.dumps(baseline | results, indent=2, sort_keys=True) + "\n")
+        print(f"Updated {BASELINE_PATH}")
+    elif regressions:
+        print(f"Regressions found: {', '.join(regressions)}", file=sys.stderr)
+        sys.exit(1)
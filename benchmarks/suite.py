@@ -0,0 +1,484 @@
+"""
+MIT License
+
+Copyright (c) 2025 Damian Zaremba
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import json
+import os
+import subprocess  # nosec: B404
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Tuple
+
+from benchmarks.fakes import (
+    FakeEnvironment,
+    FakeJob,
+    REVIEW_HOST,
+    TRAINER_HOST,
+    invoke,
+    synthetic_edit_set,
+    synthetic_telemetry_line,
+)
+from cbng_trainer import cli
+from cbng_trainer.common.bundle import calculate_pointer_path, publish_pointer
+from cbng_trainer.common.mirror import materialise_edit_set_mirror, sync_edit_set_mirror
+from cbng_trainer.common.steps import Steps
+from cbng_trainer.common.telemetry import build_telemetry_timeline
+from cbng_trainer.common.toolforge import _peak_at_logs, run_job
+from cbng_trainer.common.utils import generate_command_command, generate_execution_script
+from cbng_trainer.common.watch import EditGroupWatcher
+
+BENCHMARKS: Dict[str, Callable[[], Dict[str, float]]] = {}
+
+
+def benchmark(name: str):
+    def _register(func: Callable[[], Dict[str, float]]) -> Callable[[], Dict[str, float]]:
+        BENCHMARKS[name] = func
+        return func
+
+    return _register
+
+
+def _best_of(func: Callable[[], None], repeat: int = 5) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def _started_job(env: FakeEnvironment, name: str, log_lines: int) -> Tuple[FakeJob, datetime]:
+    job = FakeJob(name, "", start_polls=0, run_polls=1, log_lines=log_lines)
+    job.started_at = datetime.now(tz=timezone.utc)
+    env.toolforge.jobs[name] = job
+    return job, job.started_at - timedelta(seconds=1)
+
+
+@benchmark("run_job")
+def bench_run_job() -> Dict[str, float]:
+    with FakeEnvironment() as env:
+        start = time.perf_counter()
+        run_job(
+            target_user="benchmark",
+            job_name="benchmark-run-job",
+            image_name="benchmark",
+            run_commands=['echo "benchmark"'],
+        )
+        duration = time.perf_counter() - start
+        return {"api_calls": sum(env.toolforge.calls.values()), "seconds": duration}
+
+
+@benchmark("run_job_hedged")
+def bench_run_job_hedged() -> Dict[str, float]:
+    with FakeEnvironment(stuck_jobs=["benchmark-run-job"]) as env:
+        start = time.perf_counter()
+        run_job(
+            target_user="benchmark",
+            job_name="benchmark-run-job",
+            image_name="benchmark",
+            run_commands=['echo "benchmark"'],
+            max_hedges=1,
+            hedge_after=0,
+        )
+        duration = time.perf_counter() - start
+        return {
+            "api_calls": sum(env.toolforge.calls.values()),
+            "jobs_created": env.toolforge.calls["post"],
+            "seconds": duration,
+        }
+
+
+@benchmark("run_job_hedged_failed_start")
+def bench_run_job_hedged_failed_start() -> Dict[str, float]:
+    # The original fails to start once the hedge is pending, the hedge should carry on rather than fail the step
+    with FakeEnvironment(unstartable_jobs=["benchmark-run-job"]) as env:
+        start = time.perf_counter()
+        run_job(
+            target_user="benchmark",
+            job_name="benchmark-run-job",
+            image_name="benchmark",
+            run_commands=['echo "benchmark"'],
+            max_hedges=1,
+            hedge_after=0,
+        )
+        duration = time.perf_counter() - start
+        return {
+            "api_calls": sum(env.toolforge.calls.values()),
+            "jobs_created": env.toolforge.calls["post"],
+            "seconds": duration,
+        }
+
+
+def _bench_peak_at_logs(log_lines: int, repeat: int) -> Dict[str, float]:
+    with FakeEnvironment() as env:
+        _, start_time = _started_job(env, "benchmark-logs", log_lines)
+
+        def _first_poll():
+            _peak_at_logs("benchmark", "benchmark-logs", start_time, [])
+
+        seen_logs: List[Tuple[datetime, str]] = []
+        _peak_at_logs("benchmark", "benchmark-logs", start_time, seen_logs)
+
+        def _steady_state_poll():
+            _peak_at_logs("benchmark", "benchmark-logs", start_time, seen_logs)
+
+        return {
+            "first_poll_seconds": _best_of(_first_poll, repeat),
+            "steady_poll_seconds": _best_of(_steady_state_poll, repeat),
+        }
+
+
+@benchmark("peak_at_logs_10k")
+def bench_peak_at_logs_10k() -> Dict[str, float]:
+    return _bench_peak_at_logs(10_000, repeat=5)
+
+
+@benchmark("peak_at_logs_100k")
+def bench_peak_at_logs_100k() -> Dict[str, float]:
+    return _bench_peak_at_logs(100_000, repeat=1)
+
+
+@benchmark("clean_log_lines_100k")
+def bench_clean_log_lines() -> Dict[str, float]:
+    with FakeEnvironment():
+        steps = Steps(
+            target_name="benchmark",
+            toolforge_user="benchmark",
+            trainer_image_name="benchmark",
+            core_image_name="benchmark",
+            upload_logs=f"{TRAINER_HOST}/logs",
+        )
+        now = datetime.now(tz=timezone.utc)
+        logs = [
+            (now + timedelta(microseconds=index), f"{now.isoformat()}: + synthetic log line {index}")
+            for index in range(100_000)
+        ]
+        duration = _best_of(lambda: steps._clean_log_lines(logs), repeat=3)
+        return {"seconds": duration, "lines_per_second": len(logs) / duration}
+
+
+@benchmark("generate_execution_script")
+def bench_generate_execution_script() -> Dict[str, float]:
+    kwargs = {
+        "download_file_urls": {
+            "edits.xml": f"{TRAINER_HOST}/target/instance/edit-sets/train.xml",
+            "data/bayes.db": f"{TRAINER_HOST}/target/instance/artifacts/bayes.db",
+            "data/two_bayes.db": f"{TRAINER_HOST}/target/instance/artifacts/two_bayes.db",
+        },
+        "run_commands": [
+            'echo "Executing ann_train"',
+            "sed -i s'/, \"train_outputs\"//g' conf/cluebotng.conf",
+            "./cluebotng -c conf -m ann_train -f edits.xml",
+            f'upload_file "data/main_ann_train.dat" "{TRAINER_HOST}/target/instance/artifacts/main_ann_train.dat"',
+        ],
+        "configure_upload_file_helper": True,
+    }
+    script = generate_execution_script(**kwargs)
+    command = generate_command_command(script, 7200)
+
+    iterations = 1000
+    duration = _best_of(lambda: [generate_execution_script(**kwargs) for _ in range(iterations)], repeat=3)
+    return {
+        "script_bytes": len(script.encode("utf-8")),
+        "command_bytes": len(command.encode("utf-8")),
+        "seconds_per_call": duration / iterations,
+    }
+
+
+@benchmark("run_edit_sets_10_targets")
+def bench_run_edit_sets() -> Dict[str, float]:
+    with FakeEnvironment(targets=10) as env:
+        start = time.perf_counter()
+        invoke(
+            cli.run_edit_sets,
+            ["--no-copy-credentials", f"--review-host={REVIEW_HOST}", f"--trainer-host={TRAINER_HOST}"],
+        )
+        duration = time.perf_counter() - start
+        return {"api_calls": sum(env.toolforge.calls.values()), "seconds": duration}
+
+
+@benchmark("run_edit_sets_10_targets_in_process")
+def bench_run_edit_sets_in_process() -> Dict[str, float]:
+    with FakeEnvironment(targets=10) as env:
+        start = time.perf_counter()
+        invoke(
+            cli.run_edit_sets,
+            [
+                "--no-copy-credentials",
+                "--in-process",
+                f"--review-host={REVIEW_HOST}",
+                f"--trainer-host={TRAINER_HOST}",
+            ],
+        )
+        duration = time.perf_counter() - start
+        return {
+            "api_calls": sum(env.toolforge.calls.values()),
+            "jobs_created": env.toolforge.calls["post"],
+            "seconds": duration,
+        }
+
+
+@benchmark("run_edit_set")
+def bench_run_edit_set() -> Dict[str, float]:
+    with FakeEnvironment() as env:
+        start = time.perf_counter()
+        env.run_edit_set()
+        duration = time.perf_counter() - start
+        return {
+            "api_calls": sum(env.toolforge.calls.values()),
+            "jobs_created": env.toolforge.calls["post"],
+            "seconds": duration,
+        }
+
+
+@benchmark("run_edit_set_shared_workspace")
+def bench_run_edit_set_shared_workspace() -> Dict[str, float]:
+    results = {}
+    for name, shared_workspace in (("file_api", False), ("shared_workspace", True)):
+        with FakeEnvironment() as env, tempfile.TemporaryDirectory() as tmp_dir:
+            env.run_edit_set("--shards=4", *([f"--shared-workspace-dir={tmp_dir}"] if shared_workspace else []))
+            results[f"{name}_uploads"] = env.file_api.uploads
+    return results
+
+
+@benchmark("run_edit_set_traced")
+def bench_run_edit_set_traced() -> Dict[str, float]:
+    with FakeEnvironment() as env, tempfile.TemporaryDirectory() as tmp_dir:
+        trace_file = f"{tmp_dir}/trace.json"
+        start = time.perf_counter()
+        env.run_edit_set(cli_args=[f"--trace-file={trace_file}"])
+        duration = time.perf_counter() - start
+        with open(trace_file) as fh:
+            events = json.load(fh)["traceEvents"]
+        return {
+            "spans": sum(1 for event in events if event["ph"] == "X"),
+            "seconds": duration,
+        }
+
+
+@benchmark("run_edit_set_4_shards")
+def bench_run_edit_set_shards() -> Dict[str, float]:
+    with FakeEnvironment() as env:
+        start = time.perf_counter()
+        env.run_edit_set("--shards=4")
+        duration = time.perf_counter() - start
+        return {
+            "api_calls": sum(env.toolforge.calls.values()),
+            "jobs_created": env.toolforge.calls["post"],
+            "seconds": duration,
+        }
+
+
+@benchmark("run_edit_set_fail_fast")
+def bench_run_edit_set_fail_fast() -> Dict[str, float]:
+    # The main bayes db fails whilst the two bayes db is stuck pending, which should be cancelled rather than waited on
+    with FakeEnvironment(failing_jobs=["create-main-bayes-db"], stuck_jobs=["create-two-bayes-db"]) as env:
+        start = time.perf_counter()
+        try:
+            env.run_edit_set("--max-hedges=0", trial=False)
+        except SystemExit:
+            pass
+        duration = time.perf_counter() - start
+        # Polls of the stuck job race the failure (sleeps are no-ops), so api calls are not comparable run to run
+        return {
+            "jobs_created": env.toolforge.calls["post"],
+            "jobs_deleted": env.toolforge.calls["delete"],
+            "seconds": duration,
+        }
+
+
+@benchmark("evaluate_5_trials")
+def bench_evaluate() -> Dict[str, float]:
+    with FakeEnvironment() as env:
+        start = time.perf_counter()
+        invoke(
+            cli.evaluate,
+            [
+                "--target-name=Benchmark",
+                "--instance-name=benchmark",
+                "--evaluation-name=benchmark",
+                "--trainer-image-name=benchmark",
+                "--core-image-name=benchmark",
+                f"--trainer-host={TRAINER_HOST}",
+            ]
+            + [f"--trial=trial {i}={REVIEW_HOST}/api/v1/edit-groups/{i}/dump-editset/" for i in range(5)],
+        )
+        duration = time.perf_counter() - start
+        return {
+            "api_calls": sum(env.toolforge.calls.values()),
+            "jobs_created": env.toolforge.calls["post"],
+            "seconds": duration,
+        }
+
+
+@benchmark("plan_10_targets")
+def bench_plan() -> Dict[str, float]:
+    with FakeEnvironment(targets=10) as env, tempfile.TemporaryDirectory() as tmp_dir:
+        listing_file, plan_file = os.path.join(tmp_dir, "listing.json"), os.path.join(tmp_dir, "plan.json")
+        with open(listing_file, "w") as fh:
+            json.dump(env.edit_groups, fh)
+
+        start = time.perf_counter()
+        invoke(
+            cli.plan,
+            [
+                f"--listing-file={listing_file}",
+                f"--output={plan_file}",
+                f"--review-host={REVIEW_HOST}",
+                f"--trainer-host={TRAINER_HOST}",
+            ],
+        )
+        duration = time.perf_counter() - start
+        with open(plan_file) as fh:
+            plan = json.load(fh)
+        return {
+            # Offline & read only, no requests at all
+            "listing_requests": env.listing_requests,
+            "api_calls": sum(env.toolforge.calls.values()),
+            "file_api_downloads": env.file_api.downloads,
+            "file_api_uploads": env.file_api.uploads,
+            "planned_steps": sum(len(target["steps"]) for target in plan["targets"]),
+            "seconds": duration,
+        }
+
+
+@benchmark("cli_import")
+def bench_cli_import() -> Dict[str, float]:
+    # In a fresh interpreter, as everything is already imported here
+    result = subprocess.run(  # nosec: B603
+        [
+            sys.executable,
+            "-c",
+            "import sys, time; start = time.perf_counter(); import cbng_trainer.cli; "
+            "print(time.perf_counter() - start, sum(name.startswith('toolforge_weld') for name in sys.modules))",
+        ],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    seconds, toolforge_modules = result.stdout.split()
+    return {"seconds": float(seconds), "toolforge_weld_modules": int(toolforge_modules)}
+
+
+@benchmark("latest_good_pointer_1000_generations")
+def bench_latest_good_pointer() -> Dict[str, float]:
+    with FakeEnvironment() as env:
+        pointer_url = calculate_pointer_path(TRAINER_HOST, "Benchmark")
+        for generation in range(1000):
+            env.file_api.objects[f"{pointer_url}/{generation}.json"] = b"{}"
+
+        requested = []
+        get = env.file_api.get
+        env.file_api.get = lambda url, headers=None: requested.append(url) or get(url, headers)
+
+        def _publish():
+            requested.clear()
+            generation = publish_pointer(pointer_url, {"instance_name": "benchmark"}, "benchmark")
+            # Each repeat publishes against the same 1000 generations
+            del env.file_api.objects[f"{pointer_url}/{generation}.json"]
+
+        seconds = _best_of(_publish, 20)
+        return {
+            "probes": len(requested),
+            "seconds": seconds,
+        }
+
+
+@benchmark("watch_100_polls")
+def bench_watch() -> Dict[str, float]:
+    with FakeEnvironment(targets=10) as env:
+        watcher = EditGroupWatcher(REVIEW_HOST, [], debounce=0)
+        queued = 0
+        start = time.perf_counter()
+        for poll in range(100):
+            if poll in {50, 51, 52}:
+                # A burst of review activity on one target (edits added to its group), collapsed into a single run
+                env.edit_group_dumps[1] = synthetic_edit_set(poll, first_edit_id=1000)
+            watcher.poll()
+            if poll not in {50, 51}:
+                for target_name in watcher.pop_ready():
+                    queued += 1
+                    # The first run fails, so is retried rather than waiting on another change
+                    watcher.mark_done(target_name, queued > 1)
+        duration = time.perf_counter() - start
+        return {
+            "listing_requests": env.listing_requests,
+            "dump_requests": env.dump_requests,
+            "runs_queued": queued,
+            "seconds": duration,
+        }
+
+
+@benchmark("mirror_sync_10k")
+def bench_mirror_sync() -> Dict[str, float]:
+    source_url = f"{REVIEW_HOST}/api/v1/edit-groups/1/dump-editset/"
+    with FakeEnvironment() as env, tempfile.TemporaryDirectory() as tmp_dir:
+        mirror_path = f"{tmp_dir}/mirror.sqlite"
+        dump = synthetic_edit_set(10_000)
+
+        env.file_api.objects[source_url] = dump
+        start = time.perf_counter()
+        sync_edit_set_mirror(source_url, mirror_path)
+        cold = time.perf_counter() - start
+
+        # Typical churn, a few edits re-labelled & a batch of new ones
+        env.file_api.objects[source_url] = dump.replace(
+            b"<EditID>5</EditID><isVandalism>true", b"<EditID>5</EditID><isVandalism>false"
+        ).replace(
+            b"</WPEditSet>",
+            b"".join(
+                f"<WPEdit><EditID>{edit_id}</EditID></WPEdit>".encode("utf-8") for edit_id in range(10_000, 10_100)
+            )
+            + b"</WPEditSet>",
+        )
+        start = time.perf_counter()
+        stats = sync_edit_set_mirror(source_url, mirror_path)
+        warm = time.perf_counter() - start
+
+        start = time.perf_counter()
+        sync_edit_set_mirror(source_url, mirror_path)
+        not_modified = time.perf_counter() - start
+
+        with tempfile.TemporaryFile() as fh:
+            start = time.perf_counter()
+            materialise_edit_set_mirror(mirror_path, fh)
+            materialise = time.perf_counter() - start
+
+        return {
+            "cold_sync_seconds": cold,
+            "warm_sync_seconds": warm,
+            "warm_edits_written": stats["added"] + stats["changed"] + stats["removed"],
+            "not_modified_sync_seconds": not_modified,
+            "materialise_seconds": materialise,
+        }
+
+
+@benchmark("telemetry_timeline_10k")
+def bench_telemetry_timeline() -> Dict[str, float]:
+    now = datetime.now(tz=timezone.utc)
+    logs = [(now, f"{now.isoformat()}: + synthetic log line {index}") for index in range(10_000)]
+    logs.extend((now, f"{now.isoformat()}: {synthetic_telemetry_line(index)}") for index in range(1_000))
+
+    return {"seconds": _best_of(lambda: build_telemetry_timeline(logs), 50)}
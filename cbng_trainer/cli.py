@@ -23,29 +23,122 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
+import copy
+import functools
+import json
 import logging
+import signal
+import sqlite3
 import sys
-from concurrent.futures import ThreadPoolExecutor
+import tarfile
+import tempfile
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timezone
-from typing import Optional, List
+from pathlib import Path
+from typing import Callable, Dict, Optional, List, TextIO
 
 import click
-from toolforge_weld.kubernetes_config import Kubeconfig
 
-from cbng_trainer.common.files import calculate_target_path
-from cbng_trainer.common.steps import Steps
-from cbng_trainer.common.toolforge import run_job, create_or_update_envvar
+from cbng_trainer.common.bundle import (
+    BUNDLE_FILE,
+    BUNDLE_MANIFEST_FILE,
+    calculate_pointer_path,
+    extract_bundle,
+    read_bundle_manifest,
+    read_pointer,
+    sha256_file,
+)
+from cbng_trainer.common.files import calculate_target_path, download_file
+from cbng_trainer.common.reports import TRIAL_INDEX_FILE, compare_trial_indexes
+from cbng_trainer.common.consts import TOOLFORGE_JOB_QUOTA
+from cbng_trainer.common.evaluation import clean_trial_name
+from cbng_trainer.common.pipeline import execute_edit_set, execute_evaluation, resolve_edit_set_runs
+from cbng_trainer.common.plan import StepPlan
+from cbng_trainer.common.sampling import parse_sample_spec
+from cbng_trainer.common.state import RunState
+from cbng_trainer.common.toolforge import (
+    run_job,
+    create_or_update_envvar,
+    configure_coordinator_job,
+    configure_job_slots,
+    request_shutdown,
+    shutdown_requested,
+)
+from cbng_trainer.common.tracing import StackSampler, configure_tracing, span, write_trace
+from cbng_trainer.common.watch import EditGroupWatcher
 from cbng_trainer.common.utils import (
     get_target_edit_groups,
     clean_job_name,
+    map_target_edit_groups,
 )
 
 logger = logging.getLogger(__name__)
 
 
+_received_signal: Optional[int] = None
+
+
+def _handle_shutdown(signum, frame, cancel_on_exit: bool = False) -> None:
+    # Note: only flags the workers, which return once they notice (within a second or so), then we exit.
+    #       SIGTERM is also what an eviction sends, so running jobs are left to be adopted unless asked otherwise
+    #       (or, as a coordinator job, run-edit-sets flagged that it deleted us on purpose)
+    global _received_signal
+    _received_signal = signum
+    request_shutdown(delete_jobs=cancel_on_exit or signum == signal.SIGINT)
+    # A second signal is not handled, for when the workers are stuck
+    signal.signal(signum, signal.SIG_DFL)
+
+
+def _exit_on_signal() -> None:
+    if _received_signal is not None:
+        logger.warning(f"Stopped by {signal.Signals(_received_signal).name}")
+        sys.exit(128 + _received_signal)
+
+
+def _validate_sample(ctx: click.Context, param: click.Parameter, value: Optional[str]) -> Optional[str]:
+    # Kept as given, to be passed through to the coordinator jobs, but rejected here rather than in a job
+    if value is not None:
+        try:
+            parse_sample_spec(value)
+        except ValueError as e:
+            raise click.BadParameter(f"Expected a count (1000) or fraction (0.05 / 5%) of each edit set: {e}")
+    return value
+
+
+def _write_trace(trace_file: str) -> None:
+    logger.info(f"Wrote {write_trace(trace_file)} spans to {trace_file}")
+    configure_tracing(False)
+
+
+def _write_profile(sampler: StackSampler, profile: str) -> None:
+    logger.info(f"Wrote {sampler.stop(profile)} stack samples to {profile}")
+
+
 @click.group()
-def cli() -> None:
+# Nested spans of the coordinator's work (commands, steps, job phases & api calls), in chrome trace format
+@click.option("--trace-file", required=False)
+# Sampled stacks of every coordinator thread, in collapsed (flame graph) format
+@click.option("--profile", required=False)
+# Delete running jobs on SIGTERM, not just SIGINT, rather than leaving them for a resumed run to adopt
+@click.option("--cancel-on-exit/--no-cancel-on-exit", default=False)
+@click.pass_context
+def cli(ctx: click.Context, trace_file: Optional[str], profile: Optional[str], cancel_on_exit: bool) -> None:
     logging.basicConfig(level=logging.INFO, stream=sys.stderr, format="%(asctime)s [%(levelname)s] %(message)s")
+    handler = functools.partial(_handle_shutdown, cancel_on_exit=cancel_on_exit)
+    signal.signal(signal.SIGTERM, handler)
+    signal.signal(signal.SIGINT, handler)
+
+    # Note: resources are released in reverse, so the command span is closed before the trace is written
+    ctx.call_on_close(_exit_on_signal)
+    if profile:
+        sampler = StackSampler()
+        sampler.start()
+        ctx.call_on_close(functools.partial(_write_profile, sampler, profile))
+    if trace_file:
+        configure_tracing(True)
+        ctx.call_on_close(functools.partial(_write_trace, trace_file))
+        ctx.with_resource(span(ctx.invoked_subcommand, "command"))
 
 
 # "Job runner" - spawns kubernetes pods to run through our steps
@@ -60,6 +153,30 @@ def cli() -> None:
 @click.option("--trainer-image-name", required=True)
 @click.option("--core-image-name", required=True)
 @click.option("--trainer-host", required=True)
+# Resuming
+@click.option("--track-state/--no-track-state", default=True)
+@click.option("--state-file", required=False)
+# Smoke testing, a count (1000) or fraction (0.05 / 5%) of each edit set
+@click.option("--sample", required=False, callback=_validate_sample)
+@click.option("--sample-seed", default=0, type=int)
+# Cross validation, split the training set into k folds & train / trial each in parallel
+@click.option("--folds", required=False, type=click.IntRange(min=2))
+@click.option("--fold-seed", default=0, type=int)
+# Folds & shards run side by side, 0 for no limit. By default the quota less one for ourselves,
+# or as a coordinator job, less one for us & one for the run-edit-sets job
+@click.option("--job-slots", required=False, type=click.IntRange(min=0))
+# Split the training set into shards for the steps which can be run in parallel
+@click.option("--shards", required=False, type=click.IntRange(min=1))
+# Duplicate step jobs which are stuck waiting to be scheduled, taking whichever starts first (off by default)
+@click.option("--max-hedges", default=0, type=click.IntRange(min=0))
+# Keep a local mirror of each edit group, so only changed edits are fetched & written
+@click.option("--mirror-dir", required=False)
+# Sample the resource usage of each step job every n seconds, published alongside the logs
+@click.option("--telemetry-interval", required=False, type=click.IntRange(min=1))
+# Pass intermediates between steps on the tool's shared storage, rather than through the file api
+@click.option("--shared-workspace-dir", required=False)
+# Set by run-edit-sets when we are its coordinator job, so being deleted on purpose also deletes our step jobs
+@click.option("--coordinator-job-name", required=False)
 def run_edit_set(
     target_name: str,
     instance_name: str,
@@ -69,90 +186,46 @@ def run_edit_set(
     trainer_host: str,
     download_training: str,
     download_trial: Optional[str],
+    track_state: bool,
+    state_file: Optional[str],
+    sample: Optional[str],
+    sample_seed: int,
+    folds: Optional[int],
+    fold_seed: int,
+    job_slots: Optional[int],
+    shards: Optional[int],
+    max_hedges: int,
+    mirror_dir: Optional[str],
+    telemetry_interval: Optional[int],
+    shared_workspace_dir: Optional[str],
+    coordinator_job_name: Optional[str],
 ) -> None:
-    steps = Steps(
-        toolforge_user=toolforge_user,
+    if job_slots is None:
+        job_slots = TOOLFORGE_JOB_QUOTA - (2 if coordinator_job_name else 1)
+    configure_job_slots(job_slots)
+    configure_coordinator_job(toolforge_user, coordinator_job_name)
+    if not execute_edit_set(
         target_name=target_name,
+        instance_name=instance_name,
+        toolforge_user=toolforge_user,
         trainer_image_name=trainer_image_name,
         core_image_name=core_image_name,
-        upload_logs=calculate_target_path(trainer_host, target_name, instance_name, "logs"),
-    )
-
-    # Download the files
-    files_to_download = {
-        download_training: calculate_target_path(trainer_host, target_name, instance_name, "edit-sets", "train.xml")
-    }
-    if download_trial:
-        files_to_download |= {
-            download_trial: calculate_target_path(trainer_host, target_name, instance_name, "edit-sets", "trial.xml")
-        }
-
-    logger.info("Downloading files")
-    if not steps.store_edit_sets(mapping=files_to_download):
-        logger.error("Downloading files failed")
-        return
-
-    # Build
-    artifacts_url = calculate_target_path(trainer_host, target_name, instance_name, "artifacts")
-    logger.info("Running bayes train")
-    if not steps.run_bayes_train(
-        download_edit_set_url=files_to_download[download_training],
-        upload_files_url=artifacts_url,
-    ):
-        logger.error("Bayes train failed")
-        return
-
-    logger.info("Creating bayes databases")
-    with ThreadPoolExecutor(max_workers=2) as executor:
-        main_bayes_future = executor.submit(
-            steps.create_main_bayes_db,
-            download_edit_set_url=files_to_download[download_training],
-            upload_files_url=artifacts_url,
-        )
-        two_bayes_future = executor.submit(
-            steps.create_two_bayes_db,
-            download_edit_set_url=files_to_download[download_training],
-            upload_files_url=artifacts_url,
-        )
-    if not main_bayes_future.result():
-        logger.error("Main bayes db failed")
-        return
-    if not two_bayes_future.result():
-        logger.error("Two bayes db failed")
-        return
-
-    logger.info("Running ann train")
-    if not steps.run_ann_train(
-        download_edit_set_url=files_to_download[download_training],
-        upload_files_url=artifacts_url,
+        trainer_host=trainer_host,
+        download_training=download_training,
+        download_trial=download_trial,
+        track_state=track_state,
+        state_file=state_file,
+        sample=sample,
+        sample_seed=sample_seed,
+        folds=folds,
+        fold_seed=fold_seed,
+        shards=shards,
+        max_hedges=max_hedges,
+        mirror_dir=mirror_dir,
+        telemetry_interval=telemetry_interval,
+        shared_workspace_dir=shared_workspace_dir,
     ):
-        logger.error("Ann train failed")
-        return
-
-    logger.info("Running ann create")
-    if not steps.run_create_ann(
-        download_edit_set_url=files_to_download[download_training],
-        upload_files_url=artifacts_url,
-    ):
-        logger.error("Ann create failed")
-        return
-
-    # Run trial
-    if download_trial:
-        logger.info("Executing trial")
-        if not steps.run_trial_report(
-            download_edit_set_url=files_to_download[download_trial],
-            upload_report_url=calculate_target_path(trainer_host, target_name, instance_name, "trial"),
-        ):
-            logger.error("Trial report failed")
-            return
-
-        logger.info("Creating plots")
-        if not steps.create_plots(
-            upload_report_url=calculate_target_path(trainer_host, target_name, instance_name, "trial"),
-        ):
-            logger.error("Result plotting failed")
-            return
+        sys.exit(1)
 
 
 # "Job coordinator" - figures out which groups we need to perform a run for and creates a job for each
@@ -160,6 +233,21 @@ def run_edit_set(
 @click.option("--edit-set", multiple=True, default=None)
 @click.option("--print-only/--no-print-only", default=False)
 @click.option("--copy-credentials/--no-copy-credentials", default=True)
+# Pass a previous instance name to resume it, rather than starting a new run
+@click.option("--instance-name", required=False)
+# Coordinators default to one at a time, in process every target is started & the job slots bound the jobs
+@click.option("--concurrency", required=False, type=int)
+# Drive each target's pipeline from this process, rather than via a coordinator job per target
+@click.option("--in-process/--no-in-process", default=False)
+# Every job we start, less one for ourselves. Without --in-process, shared between the coordinators (a job each)
+@click.option("--job-slots", default=TOOLFORGE_JOB_QUOTA - 1, type=click.IntRange(min=0))
+@click.option("--sample", required=False, callback=_validate_sample)
+@click.option("--max-hedges", default=0, type=click.IntRange(min=0))
+# Only used with --in-process, the coordinator jobs have no persistent storage
+@click.option("--mirror-dir", required=False)
+@click.option("--telemetry-interval", required=False, type=click.IntRange(min=1))
+# Coordinator & step jobs mount the tool's storage, so this must be a path under it
+@click.option("--shared-workspace-dir", required=False)
 # These are essentially constants
 @click.option("--toolforge-user", default="cluebotng-trainer", required=True)
 @click.option(
@@ -174,6 +262,15 @@ def run_edit_sets(
     edit_set: List[str],
     print_only: bool,
     copy_credentials: bool,
+    instance_name: Optional[str],
+    concurrency: Optional[int],
+    in_process: bool,
+    job_slots: int,
+    sample: Optional[str],
+    max_hedges: int,
+    mirror_dir: Optional[str],
+    telemetry_interval: Optional[int],
+    shared_workspace_dir: Optional[str],
     toolforge_user: str,
     trainer_image_name: str,
     core_image_name: str,
@@ -181,83 +278,624 @@ def run_edit_sets(
     trainer_host: str,
 ) -> None:
     if copy_credentials and not print_only:
-        kubeconfig = Kubeconfig.load()
+        _copy_credentials(toolforge_user)
 
-        with kubeconfig.client_cert_file.open("r") as fh:
-            create_or_update_envvar(toolforge_user, "K8S_CLIENT_CRT", fh.read())
+    target_groups = get_target_edit_groups(review_host, edit_set)
 
-        with kubeconfig.client_key_file.open("r") as fh:
-            create_or_update_envvar(toolforge_user, "K8S_CLIENT_KEY", fh.read())
+    run_instance = instance_name or datetime.now(tz=timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+    runs = resolve_edit_set_runs(target_groups, review_host, run_instance)
+
+    if concurrency is None:
+        concurrency = len(runs) if in_process else 1
+
+    if print_only:
+        for run in runs:
+            print(
+                " ".join(
+                    _coordinator_script(
+                        run,
+                        trainer_image_name,
+                        core_image_name,
+                        trainer_host,
+                        sample=sample,
+                        max_hedges=max_hedges,
+                        telemetry_interval=telemetry_interval,
+                        shared_workspace_dir=shared_workspace_dir,
+                        job_slots=_coordinator_job_slots(job_slots, concurrency),
+                    )
+                )
+            )
+            print("")
+        return
 
-    target_groups = get_target_edit_groups(review_host, edit_set)
+    if in_process:
+        # Only the step jobs count against the quota, so we can fit many more targets
+        configure_job_slots(job_slots)
 
-    run_instance = datetime.now(tz=timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+    runner = _build_runner(
+        in_process,
+        job_slots=job_slots if in_process else _coordinator_job_slots(job_slots, concurrency),
+        toolforge_user=toolforge_user,
+        trainer_image_name=trainer_image_name,
+        core_image_name=core_image_name,
+        trainer_host=trainer_host,
+        sample=sample,
+        max_hedges=max_hedges,
+        mirror_dir=mirror_dir,
+        telemetry_interval=telemetry_interval,
+        shared_workspace_dir=shared_workspace_dir,
+    )
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        for future in [executor.submit(runner, run) for run in runs]:
+            future.result()
+
+
+# "Planner" - resolves what run-edit-sets would do, without credentials or creating any jobs
+@cli.command()
+@click.option("--edit-set", multiple=True, default=None)
+# A saved copy of the review api's edit groups listing, to plan offline
+@click.option("--listing-file", required=False, type=click.File("r"))
+# Pass a previous instance name to see what a resume would skip
+@click.option("--instance-name", required=False)
+# Look up each step's state, otherwise nothing is reported as cached (and no requests are made)
+# Defaults to only when resuming an --instance-name online, so a --listing-file plan stays offline
+@click.option("--check-state/--no-check-state", default=None)
+@click.option("--in-process/--no-in-process", default=False)
+@click.option("--sample", required=False, callback=_validate_sample)
+@click.option("--mirror-dir", required=False)
+@click.option("--shared-workspace-dir", required=False)
+@click.option("--output", default="-", type=click.File("w"))
+# These are essentially constants
+@click.option("--toolforge-user", default="cluebotng-trainer", required=True)
+@click.option(
+    "--trainer-image-name", default="tools-harbor.wmcloud.org/tool-cluebotng-trainer/coordinator:latest", required=True
+)
+@click.option("--core-image-name", default="tools-harbor.wmcloud.org/tool-cluebotng/core:latest", required=True)
+@click.option(
+    "--review-host", default="http://cluebotng-reviewer.tool-cluebotng-review.svc.tools.local:8000", required=True
+)
+@click.option("--trainer-host", default="http://file-api.tool-cluebotng-trainer.svc.tools.local:8000", required=True)
+def plan(
+    edit_set: List[str],
+    listing_file: Optional[TextIO],
+    instance_name: Optional[str],
+    check_state: Optional[bool],
+    in_process: bool,
+    sample: Optional[str],
+    mirror_dir: Optional[str],
+    shared_workspace_dir: Optional[str],
+    output: TextIO,
+    toolforge_user: str,
+    trainer_image_name: str,
+    core_image_name: str,
+    review_host: str,
+    trainer_host: str,
+) -> None:
+    if check_state is None:
+        # A fresh instance has no state to find
+        check_state = listing_file is None and instance_name is not None
+
+    if listing_file:
+        target_groups = map_target_edit_groups(json.load(listing_file), edit_set)
+    else:
+        target_groups = get_target_edit_groups(review_host, edit_set)
+
+    run_instance = instance_name or datetime.now(tz=timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
 
     targets = []
-    for target_name, groups in target_groups.items():
-        if ("Training" in groups or "Reported False Positives" in groups) and "Trial" not in groups:
-            if group_id := target_groups.get("Original Testing Training Set - Random Edits 50/50", {}).get("Trial"):
-                logger.info(f"Using original training set as fallback trial group for {target_name}")
-                groups["Trial"] = group_id
-
-        for group_name, group_id in groups.items():
-            # We will use the training set, no need to download the redundant file
-            if group_name == "Generic" and "Training" in groups:
-                logger.warning(f"Ignoring generic group in place of training for {target_name}")
-                continue
-
-            if group_name == "Generic" and "Reported False Positives" in groups:
-                logger.warning(f"Ignoring generic group in place of reported false positives for {target_name}")
-                continue
-
-            if group_name == "Trial":
-                logger.debug("Ignoring trial group")
-                continue
-
-            script = [
-                "launcher",
-                "./deployment/entrypoint.sh",
-                "run-edit-set",
-                f'--trainer-image-name="{trainer_image_name}"',
-                f'--core-image-name="{core_image_name}"',
-                f'--target-name="{target_name}"',
-                f'--instance-name="{run_instance}"',
-                f'--trainer-host="{trainer_host}"',
-            ]
-            if group_name in {"Generic", "Reported False Positives", "Training"}:
-                script.append(
-                    f'--download-training="{review_host.rstrip("/")}/api/v1/edit-groups/{group_id}/dump-editset/"'
-                )
-            if "Trial" in groups:
-                script.append(
-                    f'--download-trial="{review_host.rstrip("/")}/api/v1/edit-groups/{groups["Trial"]}/dump-editset/"'
-                )
+    for run in resolve_edit_set_runs(target_groups, review_host, run_instance):
+        target = run | {"coordinator": None, "steps": []}
+        if not in_process:
+            target["coordinator"] = {
+                "job_name": clean_job_name(run["target_name"], prefix="coord", instance=run["instance_name"]),
+                "image_name": trainer_image_name,
+                "cached": check_state
+                and RunState(
+                    target_name=run["target_name"],
+                    instance_name=run["instance_name"],
+                    state_url=calculate_target_path(trainer_host, run["target_name"], run["instance_name"], "state"),
+                ).is_completed("run-edit-set"),
+            }
+
+        if not run["download_training"]:
+            logger.warning(f"No training edit set for {run['target_name']}, nothing to plan")
+        else:
+            step_plan = StepPlan()
+            execute_edit_set(
+                target_name=run["target_name"],
+                instance_name=run["instance_name"],
+                toolforge_user=toolforge_user,
+                trainer_image_name=trainer_image_name,
+                core_image_name=core_image_name,
+                trainer_host=trainer_host,
+                download_training=run["download_training"],
+                download_trial=run["download_trial"],
+                track_state=check_state,
+                sample=sample,
+                mirror_dir=mirror_dir if in_process else None,
+                shared_workspace_dir=shared_workspace_dir,
+                plan=step_plan,
+            )
+            target["steps"] = step_plan.steps()
+        targets.append(target)
+
+    json.dump({"instance_name": run_instance, "targets": targets}, output, indent=2)
+    output.write("\n")
+
+
+# "Watcher" - long running, queues a run for each target once its edit groups change
+@cli.command()
+@click.option("--edit-set", multiple=True, default=None)
+@click.option("--copy-credentials/--no-copy-credentials", default=True)
+@click.option("--poll-interval", default=60, type=click.IntRange(min=1))
+# Bursts of review activity are collapsed into a single run, once quiet for this long (or the max delay has passed)
+@click.option("--debounce", default=300, type=click.IntRange(min=0))
+@click.option("--max-delay", default=1800, type=click.IntRange(min=0))
+# Without this, whatever exists when we start is taken as already trained
+@click.option("--run-on-start/--no-run-on-start", default=False)
+@click.option("--state-file", required=False)
+# Coordinators default to one at a time, in process every target is started & the job slots bound the jobs
+@click.option("--concurrency", required=False, type=int)
+@click.option("--in-process/--no-in-process", default=False)
+# Every job we start, less one for ourselves. Without --in-process, shared between the coordinators (a job each)
+@click.option("--job-slots", default=TOOLFORGE_JOB_QUOTA - 1, type=click.IntRange(min=0))
+@click.option("--sample", required=False, callback=_validate_sample)
+@click.option("--max-hedges", default=0, type=click.IntRange(min=0))
+# Only used with --in-process, the coordinator jobs have no persistent storage
+@click.option("--mirror-dir", required=False)
+@click.option("--telemetry-interval", required=False, type=click.IntRange(min=1))
+# Coordinator & step jobs mount the tool's storage, so this must be a path under it
+@click.option("--shared-workspace-dir", required=False)
+# These are essentially constants
+@click.option("--toolforge-user", default="cluebotng-trainer", required=True)
+@click.option(
+    "--trainer-image-name", default="tools-harbor.wmcloud.org/tool-cluebotng-trainer/coordinator:latest", required=True
+)
+@click.option("--core-image-name", default="tools-harbor.wmcloud.org/tool-cluebotng/core:latest", required=True)
+@click.option(
+    "--review-host", default="http://cluebotng-reviewer.tool-cluebotng-review.svc.tools.local:8000", required=True
+)
+@click.option("--trainer-host", default="http://file-api.tool-cluebotng-trainer.svc.tools.local:8000", required=True)
+def watch(
+    edit_set: List[str],
+    copy_credentials: bool,
+    poll_interval: int,
+    debounce: int,
+    max_delay: int,
+    run_on_start: bool,
+    state_file: Optional[str],
+    concurrency: Optional[int],
+    in_process: bool,
+    job_slots: int,
+    sample: Optional[str],
+    max_hedges: int,
+    mirror_dir: Optional[str],
+    telemetry_interval: Optional[int],
+    shared_workspace_dir: Optional[str],
+    toolforge_user: str,
+    trainer_image_name: str,
+    core_image_name: str,
+    review_host: str,
+    trainer_host: str,
+) -> None:
+    if copy_credentials:
+        _copy_credentials(toolforge_user)
+
+    if concurrency is None:
+        # Targets are only known as they change, a worker per slot is enough to keep every slot busy
+        concurrency = job_slots if in_process else 1
 
-            if print_only:
-                print(" ".join(script))
-                print("")
-            else:
-                targets.append(
-                    (
-                        clean_job_name(target_name, prefix="coord"),
-                        " ".join(script),
+    if in_process:
+        configure_job_slots(job_slots)
+
+    runner = _build_runner(
+        in_process,
+        job_slots=job_slots if in_process else _coordinator_job_slots(job_slots, concurrency),
+        toolforge_user=toolforge_user,
+        trainer_image_name=trainer_image_name,
+        core_image_name=core_image_name,
+        trainer_host=trainer_host,
+        sample=sample,
+        max_hedges=max_hedges,
+        mirror_dir=mirror_dir,
+        telemetry_interval=telemetry_interval,
+        shared_workspace_dir=shared_workspace_dir,
+    )
+    watcher = EditGroupWatcher(review_host, edit_set, debounce=debounce, max_delay=max_delay, state_file=state_file)
+    # Target -> runs (one per training group) which have not yet finished
+    in_flight: Dict[str, List[Future]] = {}
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        while not shutdown_requested():
+            watcher.poll(run_on_start=run_on_start)
+
+            for target_name, futures in list(in_flight.items()):
+                if all(future.done() for future in futures):
+                    del in_flight[target_name]
+                    watcher.mark_done(
+                        target_name, all(future.exception() is None and future.result() for future in futures)
                     )
+
+            ready = watcher.pop_ready()
+            if ready:
+                run_instance = datetime.now(tz=timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+                # Resolved against every target, as the trial group may fall back to another target's
+                for run in resolve_edit_set_runs(copy.deepcopy(watcher.target_groups), review_host, run_instance):
+                    if run["target_name"] not in ready:
+                        continue
+                    logger.info(f"Queueing run for {run['target_name']} ({run['instance_name']})")
+                    in_flight.setdefault(run["target_name"], []).append(executor.submit(runner, run))
+
+                # Nothing to train (e.g. only a trial group), so there is nothing to wait on either
+                for target_name in ready:
+                    if target_name not in in_flight:
+                        watcher.mark_done(target_name, True)
+
+            for _ in range(poll_interval):
+                if shutdown_requested():
+                    break
+                time.sleep(1)
+
+
+def _build_runner(
+    in_process: bool, mirror_dir: Optional[str], job_slots: int, **kwargs
+) -> Callable[[Dict[str, Optional[str]]], bool]:
+    if in_process:
+        # The job slots are shared by every target, so are configured for the whole process
+        return functools.partial(_run_in_process, mirror_dir=mirror_dir, **kwargs)
+
+    if mirror_dir:
+        logger.warning("Ignoring --mirror-dir, it is only used with --in-process")
+    return functools.partial(_run_coordinator, job_slots=job_slots, **kwargs)
+
+
+def _coordinator_job_slots(job_slots: int, concurrency: int) -> int:
+    if not job_slots:
+        return 0
+
+    # Each coordinator is a job itself, the rest of its share is for its step jobs
+    coordinator_job_slots = job_slots // max(1, concurrency) - 1
+    if coordinator_job_slots < 1:
+        raise click.BadParameter(
+            f"{job_slots} is not enough for {concurrency} coordinators, each needs 2 (itself & a step job)",
+            param_hint="--job-slots",
+        )
+    return coordinator_job_slots
+
+
+def _copy_credentials(toolforge_user: str) -> None:
+    from toolforge_weld.kubernetes_config import Kubeconfig
+
+    kubeconfig = Kubeconfig.load()
+
+    with kubeconfig.client_cert_file.open("r") as fh:
+        create_or_update_envvar(toolforge_user, "K8S_CLIENT_CRT", fh.read())
+
+    with kubeconfig.client_key_file.open("r") as fh:
+        create_or_update_envvar(toolforge_user, "K8S_CLIENT_KEY", fh.read())
+
+
+def _run_coordinator(
+    run: Dict[str, Optional[str]],
+    toolforge_user: str,
+    trainer_image_name: str,
+    core_image_name: str,
+    trainer_host: str,
+    sample: Optional[str],
+    max_hedges: int,
+    job_slots: int,
+    telemetry_interval: Optional[int] = None,
+    shared_workspace_dir: Optional[str] = None,
+) -> bool:
+    # We get 15 total one-off jobs, less 1 for ourselves, the rest are split between the coordinators running at once,
+    # each of which is a job itself & runs its step jobs (including any hedges) within its share
+    # Job names are unique per instance, so running coords side by side is safe
+    container_name = clean_job_name(run["target_name"], prefix="coord", instance=run["instance_name"])
+    run_state = RunState(
+        target_name=run["target_name"],
+        instance_name=run["instance_name"],
+        state_url=calculate_target_path(trainer_host, run["target_name"], run["instance_name"], "state"),
+    )
+    if run_state.is_completed("run-edit-set"):
+        logger.info(f"Skipping {run['target_name']}, already completed for {run['instance_name']}")
+        return True
+
+    logger.info(f"[{container_name}] Coordinating {run['target_name']} ({run['instance_name']})")
+    run_state.record_started("run-edit-set", container_name)
+    success, _ = run_job(
+        target_user=toolforge_user,
+        job_name=container_name,
+        image_name=trainer_image_name,
+        run_commands=[
+            " ".join(
+                _coordinator_script(
+                    run,
+                    trainer_image_name,
+                    core_image_name,
+                    trainer_host,
+                    sample=sample,
+                    max_hedges=max_hedges,
+                    telemetry_interval=telemetry_interval,
+                    shared_workspace_dir=shared_workspace_dir,
+                    job_slots=job_slots,
+                    coordinator_job_name=container_name,
                 )
+            )
+        ],
+        wait_for_completion=True,
+        wait_for_job_logs_marker=False,
+        adopt_existing=True,
+        job_identity=f"{run['target_name']}\0{run['instance_name']}\0run-edit-set",
+        # Local steps (splits & merges) read & write the shared workspace too
+        mount="all" if shared_workspace_dir else "none",
+        # Deleting it on purpose (SIGINT / --cancel-on-exit) cancels its step jobs too, unlike an eviction
+        propagate_cancel=True,
+    )
+    run_state.record_completed("run-edit-set", success)
+    if not success:
+        logger.warning(f"Job failed for {container_name}")
+    return success
 
-    # We get 15 total one-off jobs
-    # Each coord will spawn 1 child at a time, so each job counts for 2
-    # We also need 1 for ourselves so 15 - 1 = 14, 14/2 = 7...
-    for container_name, script in targets:
-        success, _ = run_job(
-            target_user=toolforge_user,
-            job_name=container_name,
-            image_name=trainer_image_name,
-            run_commands=[script],
-            wait_for_completion=True,
-            wait_for_job_logs_marker=False,
+
+def _run_in_process(
+    run: Dict[str, Optional[str]],
+    toolforge_user: str,
+    trainer_image_name: str,
+    core_image_name: str,
+    trainer_host: str,
+    sample: Optional[str],
+    max_hedges: int,
+    mirror_dir: Optional[str] = None,
+    telemetry_interval: Optional[int] = None,
+    shared_workspace_dir: Optional[str] = None,
+) -> bool:
+    if not run["download_training"]:
+        logger.warning(f"No training edit set for {run['target_name']}, skipping")
+        return True
+
+    # Failures (including unexpected ones) are contained to the target
+    try:
+        success = execute_edit_set(
+            target_name=run["target_name"],
+            instance_name=run["instance_name"],
+            toolforge_user=toolforge_user,
+            trainer_image_name=trainer_image_name,
+            core_image_name=core_image_name,
+            trainer_host=trainer_host,
+            download_training=run["download_training"],
+            download_trial=run["download_trial"],
+            sample=sample,
+            max_hedges=max_hedges,
+            mirror_dir=mirror_dir,
+            telemetry_interval=telemetry_interval,
+            shared_workspace_dir=shared_workspace_dir,
         )
-        if not success:
-            logger.warning(f"Job failed for {container_name}")
+    except Exception as e:
+        logger.exception(f"[{run['target_name']}] Run failed: {e}")
+        success = False
+
+    if not success:
+        logger.warning(f"Run failed for {run['target_name']} ({run['instance_name']})")
+    return success
+
+
+def _coordinator_script(
+    run: Dict[str, Optional[str]],
+    trainer_image_name: str,
+    core_image_name: str,
+    trainer_host: str,
+    sample: Optional[str] = None,
+    max_hedges: Optional[int] = None,
+    telemetry_interval: Optional[int] = None,
+    shared_workspace_dir: Optional[str] = None,
+    job_slots: Optional[int] = None,
+    coordinator_job_name: Optional[str] = None,
+) -> List[str]:
+    script = [
+        "launcher",
+        "./deployment/entrypoint.sh",
+        "run-edit-set",
+        f'--trainer-image-name="{trainer_image_name}"',
+        f'--core-image-name="{core_image_name}"',
+        f'--target-name="{run["target_name"]}"',
+        f'--instance-name="{run["instance_name"]}"',
+        f'--trainer-host="{trainer_host}"',
+    ]
+    if run["download_training"]:
+        script.append(f'--download-training="{run["download_training"]}"')
+    if sample:
+        script.append(f'--sample="{sample}"')
+    if max_hedges is not None:
+        script.append(f"--max-hedges={max_hedges}")
+    if telemetry_interval:
+        script.append(f"--telemetry-interval={telemetry_interval}")
+    if shared_workspace_dir:
+        script.append(f'--shared-workspace-dir="{shared_workspace_dir}"')
+    if job_slots is not None:
+        script.append(f"--job-slots={job_slots}")
+    if coordinator_job_name:
+        script.append(f'--coordinator-job-name="{coordinator_job_name}"')
+    if run["download_trial"]:
+        script.append(f'--download-trial="{run["download_trial"]}"')
+    return script
+
+
+# "Trial evaluation" - trials one instance's artifacts against many edit sets, in a single job
+@cli.command()
+@click.option("--target-name", required=True)
+@click.option("--instance-name", required=True)
+# NAME=URL of an edit set dump, or the name of a target whose trial group should be used
+@click.option("--trial", "trial_specs", multiple=True)
+@click.option("--trial-edit-set", multiple=True)
+@click.option("--evaluation-name", required=False)
+@click.option("--parallelism", default=2, type=click.IntRange(min=1))
+@click.option("--track-state/--no-track-state", default=True)
+@click.option("--state-file", required=False)
+@click.option("--max-hedges", default=0, type=click.IntRange(min=0))
+@click.option("--telemetry-interval", required=False, type=click.IntRange(min=1))
+@click.option("--toolforge-user", default="cluebotng-trainer", required=True)
+@click.option(
+    "--trainer-image-name", default="tools-harbor.wmcloud.org/tool-cluebotng-trainer/coordinator:latest", required=True
+)
+@click.option("--core-image-name", default="tools-harbor.wmcloud.org/tool-cluebotng/core:latest", required=True)
+@click.option(
+    "--review-host", default="http://cluebotng-reviewer.tool-cluebotng-review.svc.tools.local:8000", required=True
+)
+@click.option("--trainer-host", default="http://file-api.tool-cluebotng-trainer.svc.tools.local:8000", required=True)
+def evaluate(
+    target_name: str,
+    instance_name: str,
+    trial_specs: List[str],
+    trial_edit_set: List[str],
+    evaluation_name: Optional[str],
+    parallelism: int,
+    track_state: bool,
+    state_file: Optional[str],
+    max_hedges: int,
+    telemetry_interval: Optional[int],
+    toolforge_user: str,
+    trainer_image_name: str,
+    core_image_name: str,
+    review_host: str,
+    trainer_host: str,
+) -> None:
+    trials: Dict[str, str] = {}
+
+    def _add_trial(name: str, url: str, param_hint: str) -> None:
+        # The cleaned name is the trial's report path, so must be unique & non-empty
+        if not (trial_name := clean_trial_name(name)):
+            raise click.BadParameter(f"{name!r} is not a usable trial name", param_hint=param_hint)
+        if trial_name in trials:
+            raise click.BadParameter(f"{name!r} clashes with another trial named {trial_name}", param_hint=param_hint)
+        trials[trial_name] = url
+
+    for trial_spec in trial_specs:
+        name, _, url = trial_spec.partition("=")
+        if not url:
+            raise click.BadParameter(f"Expected NAME=URL, got {trial_spec}", param_hint="--trial")
+        _add_trial(name, url, "--trial")
+
+    if trial_edit_set:
+        target_groups = get_target_edit_groups(review_host, trial_edit_set)
+        for edit_set in trial_edit_set:
+            if not (group_id := target_groups.get(edit_set, {}).get("Trial")):
+                logger.error(f"No trial group found for {edit_set}")
+                sys.exit(1)
+            _add_trial(
+                edit_set,
+                f'{review_host.rstrip("/")}/api/v1/edit-groups/{group_id}/dump-editset/',
+                "--trial-edit-set",
+            )
+
+    if not trials:
+        raise click.UsageError("At least one --trial or --trial-edit-set is required")
+
+    evaluation_name = evaluation_name or datetime.now(tz=timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+    logger.info(f"Evaluating {target_name} ({instance_name}) as {evaluation_name}")
+    if not execute_evaluation(
+        target_name=target_name,
+        instance_name=instance_name,
+        evaluation_name=evaluation_name,
+        toolforge_user=toolforge_user,
+        trainer_image_name=trainer_image_name,
+        core_image_name=core_image_name,
+        trainer_host=trainer_host,
+        trials=trials,
+        parallelism=parallelism,
+        track_state=track_state,
+        state_file=state_file,
+        max_hedges=max_hedges,
+        telemetry_interval=telemetry_interval,
+    ):
+        sys.exit(1)
+
+
+# "Model fetch" - downloads, verifies & unpacks a target's latest good (or a specific instance's) model bundle
+@cli.command()
+@click.option("--target-name", required=True)
+@click.option("--instance-name", required=False)
+@click.option("--output-dir", required=True)
+@click.option("--trainer-host", default="http://file-api.tool-cluebotng-trainer.svc.tools.local:8000", required=True)
+def fetch_model(
+    target_name: str,
+    instance_name: Optional[str],
+    output_dir: str,
+    trainer_host: str,
+) -> None:
+    pointer = None
+    if instance_name:
+        manifest_url = calculate_target_path(trainer_host, target_name, instance_name, "bundle", BUNDLE_MANIFEST_FILE)
+    else:
+        if not (pointer := read_pointer(calculate_pointer_path(trainer_host, target_name))):
+            logger.error(f"No latest good model for {target_name}")
+            sys.exit(1)
+        logger.info(f"Latest good model for {target_name} is {pointer['instance_name']} ({pointer['published_at']})")
+        manifest_url = pointer["manifest_url"]
+
+    # Only the published manifest can hold the checksum of the bundle itself, not the copy inside it
+    if not (published_manifest := read_bundle_manifest(manifest_url)):
+        sys.exit(1)
+    bundle = published_manifest["bundle"]
+    if pointer and pointer["bundle"]["sha256"] != bundle["sha256"]:
+        logger.error(f"Latest good pointer for {target_name} does not match {manifest_url}")
+        sys.exit(1)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        bundle_path = (Path(tmp_dir) / BUNDLE_FILE).as_posix()
+        with open(bundle_path, "wb") as fh:
+            if not download_file(bundle["url"], fh):
+                sys.exit(1)
+
+        if sha256_file(bundle_path) != bundle["sha256"]:
+            logger.error(f"Checksum mismatch for {bundle['url']}")
+            sys.exit(1)
+
+        try:
+            manifest = extract_bundle(bundle_path, output_dir)
+        except (ValueError, tarfile.TarError) as e:
+            logger.error(f"Failed to unpack {bundle['url']}: {e}")
+            sys.exit(1)
+
+    logger.info(f"Unpacked {', '.join(manifest['files'])} from {manifest['instance_name']} to {output_dir}")
+
+
+# "Trial comparison" - lists the edits whose outcome differs between two trial runs
+@cli.command()
+@click.option("--target-name", required=True)
+@click.option("--instance-name", required=True)
+@click.option("--other-instance-name", required=True)
+@click.option("--other-target-name", required=False)
+@click.option("--trainer-host", default="http://file-api.tool-cluebotng-trainer.svc.tools.local:8000", required=True)
+def compare_trials(
+    target_name: str,
+    instance_name: str,
+    other_instance_name: str,
+    other_target_name: Optional[str],
+    trainer_host: str,
+) -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        index_paths = []
+        for index, (name, instance) in enumerate(
+            [(target_name, instance_name), (other_target_name or target_name, other_instance_name)]
+        ):
+            index_path = Path(tmp_dir) / f"{index}-{TRIAL_INDEX_FILE}"
+            with index_path.open("wb") as fh:
+                if not download_file(
+                    calculate_target_path(trainer_host, name, instance, "trial", TRIAL_INDEX_FILE), fh
+                ):
+                    logger.error(f"Failed to download trial index for {name} ({instance})")
+                    sys.exit(1)
+            index_paths.append(index_path.as_posix())
+
+        try:
+            rows = list(compare_trial_indexes(*index_paths))
+        except sqlite3.DatabaseError as e:
+            logger.error(f"Failed to read trial indexes: {e}")
+            sys.exit(1)
+
+        print("edit_id\tis_vandalism\toutcome\tother_outcome\tscore\tother_score")
+        for row in rows:
+            print("\t".join("" if value is None else str(value) for value in row))
 
 
 if __name__ == "__main__":
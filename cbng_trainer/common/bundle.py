@@ -0,0 +1,154 @@
+"""
+MIT License
+
+Copyright (c) 2025 Damian Zaremba
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import hashlib
+import io
+import json
+import logging
+import tarfile
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Optional
+from urllib.parse import quote
+
+from cbng_trainer.common import http_client
+from cbng_trainer.common.files import open_file, upload_file
+
+logger = logging.getLogger(__name__)
+
+# What the bot needs to run, everything else under artifacts/ is only used whilst training
+BUNDLE_FILES = ["bayes.db", "two_bayes.db", "main_ann.fann"]
+BUNDLE_FILE = "model.tar.gz"
+BUNDLE_MANIFEST_FILE = "manifest.json"
+# Attempts at claiming the next pointer generation, each is only lost to a concurrent publish
+_POINTER_ATTEMPTS = 5
+
+
+def sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        while chunk := fh.read(1024 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def sha256_url(url: str, timeout: int = 600) -> Optional[str]:
+    # Streamed, edit sets can be larger than we want to hold in memory
+    with open_file(url, timeout=timeout) as fh:
+        if fh is None:
+            logger.warning(f"Failed to hash {url}")
+            return None
+        digest = hashlib.sha256()
+        while chunk := fh.read(1024 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def build_bundle(files: Dict[str, str], manifest: Dict[str, Any], target: BinaryIO) -> None:
+    with tarfile.open(fileobj=target, mode="w:gz") as tar:
+        # Manifest first, so it can be read without decompressing the models
+        manifest_data = json.dumps(manifest, indent=2).encode("utf-8")
+        info = tarfile.TarInfo(BUNDLE_MANIFEST_FILE)
+        info.size = len(manifest_data)
+        tar.addfile(info, io.BytesIO(manifest_data))
+
+        for name, path in files.items():
+            tar.add(path, arcname=name)
+
+
+def extract_bundle(source: str, target_dir: str) -> Dict[str, Any]:
+    with tarfile.open(source, mode="r:gz") as tar:
+        try:
+            manifest_fh = tar.extractfile(BUNDLE_MANIFEST_FILE)
+        except KeyError:
+            manifest_fh = None
+        if manifest_fh is None:
+            raise ValueError(f"{source} has no {BUNDLE_MANIFEST_FILE}")
+        manifest = json.load(manifest_fh)
+        try:
+            members = [tar.getmember(name) for name in manifest["files"]]
+        except KeyError as e:
+            raise ValueError(f"{source} is missing {e}")
+        tar.extractall(target_dir, members=members, filter="data")
+
+    for name, details in manifest["files"].items():
+        if sha256_file((Path(target_dir) / name).as_posix()) != details["sha256"]:
+            raise ValueError(f"Checksum mismatch for {name} in {source}")
+    return manifest
+
+
+def read_bundle_manifest(manifest_url: str) -> Optional[Dict[str, Any]]:
+    r = http_client.get(manifest_url, timeout=60)
+    if r.status_code != 200:
+        logger.warning(f"Failed to read {manifest_url}: {r.status_code}")
+        return None
+    return r.json()
+
+
+def calculate_pointer_path(base_url: str, target_group: str, generation: Optional[int] = None) -> str:
+    # Per target, rather than per instance like `calculate_target_path`
+    endpoint = f'{base_url.rstrip("/")}/{quote(target_group)}/latest-good'
+    if generation is not None:
+        endpoint += f"/{generation}.json"
+    return endpoint
+
+
+def _pointer_exists(pointer_url: str, generation: int) -> bool:
+    r = http_client.get(f"{pointer_url}/{generation}.json", timeout=10)
+    return r.status_code == 200
+
+
+def next_pointer_generation(pointer_url: str) -> int:
+    # Objects can not be replaced, so each publish is a new generation & the highest one is current.
+    # Generations are contiguous, so find the first missing one by doubling then bisecting.
+    if not _pointer_exists(pointer_url, 0):
+        return 0
+    lower, upper = 0, 1
+    while _pointer_exists(pointer_url, upper):
+        lower, upper = upper, upper * 2
+    while upper - lower > 1:
+        middle = (lower + upper) // 2
+        if _pointer_exists(pointer_url, middle):
+            lower = middle
+        else:
+            upper = middle
+    return upper
+
+
+def read_pointer(pointer_url: str) -> Optional[Dict[str, Any]]:
+    generation = next_pointer_generation(pointer_url) - 1
+    if generation < 0:
+        return None
+    r = http_client.get(f"{pointer_url}/{generation}.json", timeout=10)
+    if r.status_code != 200:
+        logger.warning(f"Failed to read {pointer_url}/{generation}.json: {r.status_code}")
+        return None
+    return r.json() | {"generation": generation}
+
+
+def publish_pointer(pointer_url: str, record: Dict[str, Any], api_key: str) -> Optional[int]:
+    for _ in range(_POINTER_ATTEMPTS):
+        generation = next_pointer_generation(pointer_url)
+        if upload_file(f"{pointer_url}/{generation}.json", json.dumps(record, indent=2), api_key, timeout=60):
+            return generation
+    return None
@@ -23,3 +23,14 @@ plot 'thresholdtable.txt' using 1:2 title 'Correct Positive %' with lines, 'thre
 """  #  noqa
 
 JOB_LOGS_END_MARKER = "## JOB FINISHED MARKER ##"
+# Prefixes the (json) resource samples emitted by the optional in-job sampler
+JOB_TELEMETRY_MARKER = "## JOB TELEMETRY ##"
+
+# Element names used by the core in edit sets & trial debug output
+EDIT_SET_EDIT_TAG = "WPEdit"
+EDIT_SET_EDIT_ID_TAG = "EditID"
+EDIT_SET_IS_VANDALISM_TAG = "isVandalism"
+TRIAL_SCORE_TAGS = ("score", "main_ann_score", "ann_score")
+
+# One-off jobs we are allowed to run at any one time
+TOOLFORGE_JOB_QUOTA = 15
@@ -0,0 +1,93 @@
+"""
+MIT License
+
+Copyright (c) 2025 Damian Zaremba
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import contextlib
+import statistics
+from typing import BinaryIO, Dict, Iterable, List, Tuple
+
+from cbng_trainer.common.editsets import EditSetWriter, assign_partition, edit_id, iter_edits, serialise_edit
+
+
+def split_edit_set_folds(
+    source: BinaryIO, train_targets: List[BinaryIO], trial_targets: List[BinaryIO], seed: int = 0
+) -> List[int]:
+    folds = len(trial_targets)
+    counts = [0] * folds
+    with contextlib.ExitStack() as stack:
+        train_writers = [stack.enter_context(EditSetWriter(target)) for target in train_targets]
+        trial_writers = [stack.enter_context(EditSetWriter(target)) for target in trial_targets]
+
+        for position, element in enumerate(iter_edits(source)):
+            fold = assign_partition(edit_id(element), position, folds, seed)
+            edit = serialise_edit(element)
+
+            # Each edit is trialled in exactly one fold & trained on in all the others
+            trial_writers[fold].write(edit)
+            for index, writer in enumerate(train_writers):
+                if index != fold:
+                    writer.write(edit)
+            counts[fold] += 1
+    return counts
+
+
+def parse_threshold_table(lines: Iterable[str]) -> Dict[str, List[float]]:
+    table = {}
+    for line in lines:
+        columns = line.split()
+        try:
+            table[columns[0]] = [float(value) for value in columns[1:]]
+        except (IndexError, ValueError):
+            # Blank / header lines
+            continue
+    return table
+
+
+def aggregate_threshold_tables(tables: List[Dict[str, List[float]]]) -> List[Tuple[str, List[float], List[float]]]:
+    thresholds = set(tables[0])
+    for table in tables[1:]:
+        thresholds &= set(table)
+
+    rows = []
+    for threshold in sorted(thresholds, key=float):
+        columns = list(zip(*[table[threshold] for table in tables]))
+        rows.append(
+            (
+                threshold,
+                [statistics.mean(values) for values in columns],
+                [statistics.variance(values) if len(values) > 1 else 0.0 for values in columns],
+            )
+        )
+    return rows
+
+
+def format_threshold_tables(rows: List[Tuple[str, List[float], List[float]]]) -> Tuple[str, str]:
+    # Means keep the layout of a single thresholdtable.txt, so the existing plots work as-is
+    means = "".join(f"{threshold} {' '.join(f'{value:.6f}' for value in mean)}\n" for threshold, mean, _ in rows)
+
+    columns = len(rows[0][1]) if rows else 0
+    stats = "# threshold " + " ".join(f"mean_{index + 2} variance_{index + 2}" for index in range(columns)) + "\n"
+    for threshold, mean, variance in rows:
+        # Variances of rates (fractions) are tiny, so are kept to significant figures
+        stats += f"{threshold} " + " ".join(f"{m:.6f} {v:.6g}" for m, v in zip(mean, variance)) + "\n"
+    return means, stats
@@ -0,0 +1,118 @@
+"""
+MIT License
+
+Copyright (c) 2025 Damian Zaremba
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import contextlib
+import hashlib
+import xml.etree.ElementTree as ET  # nosec: B405
+from typing import BinaryIO, Iterator, List, Optional
+
+from cbng_trainer.common.consts import (
+    EDIT_SET_EDIT_TAG,
+    EDIT_SET_EDIT_ID_TAG,
+    EDIT_SET_IS_VANDALISM_TAG,
+)
+
+EDIT_SET_ROOT_TAG = "WPEditSet"
+
+
+def local_name(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def parse_bool(value: Optional[str]) -> Optional[bool]:
+    if value is None:
+        return None
+    return value.strip().lower() in {"true", "1", "yes", "y"}
+
+
+def iter_edits(source: BinaryIO) -> Iterator[ET.Element]:
+    root = None
+    for event, element in ET.iterparse(source, events=("start", "end")):  # nosec: B314
+        if root is None:
+            root = element
+        if event != "end" or local_name(element.tag) != EDIT_SET_EDIT_TAG:
+            continue
+
+        yield element
+
+        # Drop everything parsed so far, memory is then bounded by a single edit
+        element.clear()
+        root.clear()
+
+
+def _child_text(element: ET.Element, name: str) -> Optional[str]:
+    for child in element:
+        if local_name(child.tag) == name:
+            return child.text
+    return None
+
+
+def edit_id(element: ET.Element) -> Optional[int]:
+    value = _child_text(element, EDIT_SET_EDIT_ID_TAG)
+    return int(value.strip()) if value and value.strip().isdigit() else None
+
+
+def is_vandalism(element: ET.Element) -> Optional[bool]:
+    return parse_bool(_child_text(element, EDIT_SET_IS_VANDALISM_TAG))
+
+
+class EditSetWriter:
+    def __init__(self, target: BinaryIO):
+        self.target = target
+        self.edits = 0
+
+    def __enter__(self) -> "EditSetWriter":
+        self.target.write(f'<?xml version="1.0" encoding="utf-8"?>\n<{EDIT_SET_ROOT_TAG}>\n'.encode("utf-8"))
+        return self
+
+    def write(self, edit: bytes) -> None:
+        self.target.write(edit)
+        self.target.write(b"\n")
+        self.edits += 1
+
+    def __exit__(self, *args) -> None:
+        self.target.write(f"</{EDIT_SET_ROOT_TAG}>\n".encode("utf-8"))
+
+
+def serialise_edit(element: ET.Element) -> bytes:
+    # Note: clear out the tail, the whitespace between edits is re-added by the writer
+    element.tail = None
+    return ET.tostring(element, encoding="utf-8", xml_declaration=False)
+
+
+def assign_partition(edit_id: Optional[int], position: int, partitions: int, seed: int = 0) -> int:
+    # Stable for a given edit, so re-runs (and resumed runs) produce identical partitions
+    key = edit_id if edit_id is not None else f"position-{position}"
+    return int.from_bytes(hashlib.sha256(f"{seed}:{key}".encode("utf-8")).digest()[:8], "big") % partitions
+
+
+def split_edit_set(source: BinaryIO, targets: List[BinaryIO], seed: int = 0) -> List[int]:
+    counts = [0] * len(targets)
+    with contextlib.ExitStack() as stack:
+        writers = [stack.enter_context(EditSetWriter(target)) for target in targets]
+        for position, element in enumerate(iter_edits(source)):
+            partition = assign_partition(edit_id(element), position, len(targets), seed)
+            writers[partition].write(serialise_edit(element))
+            counts[partition] += 1
+    return counts
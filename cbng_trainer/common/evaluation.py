@@ -0,0 +1,73 @@
+"""
+MIT License
+
+Copyright (c) 2025 Damian Zaremba
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import re
+from typing import Any, Dict, List, Optional
+
+# False positive rates (fractions, as in thresholdtable.txt) to report the best detection rate within
+EVALUATION_FALSE_POSITIVE_BUDGETS = (0.001, 0.0025, 0.005, 0.01)
+
+
+def clean_trial_name(name: str) -> str:
+    return re.sub(r"-{2,}", "-", re.sub(r"[^A-Za-z0-9._-]", "-", name)).strip("-").lower()
+
+
+def best_threshold_within(table: Dict[str, List[float]], false_positive_budget: float) -> Optional[Dict[str, Any]]:
+    # Columns are "<threshold> <detection rate> <false positive rate>", the rates being fractions (0 - 1)
+    candidates = [
+        (values[0], -values[1], threshold)
+        for threshold, values in table.items()
+        if len(values) >= 2 and values[1] <= false_positive_budget
+    ]
+    if not candidates:
+        return None
+    detection_rate, false_positive_rate, threshold = max(candidates)
+    return {"threshold": threshold, "detection_rate": detection_rate, "false_positive_rate": -false_positive_rate}
+
+
+def summarise_threshold_table(table: Dict[str, List[float]]) -> Dict[str, Optional[Dict[str, Any]]]:
+    return {f"{budget:g}": best_threshold_within(table, budget) for budget in EVALUATION_FALSE_POSITIVE_BUDGETS}
+
+
+def build_evaluation_matrix(tables: Dict[str, Optional[Dict[str, List[float]]]]) -> Dict[str, Any]:
+    matrix = {
+        trial_name: None if table is None else summarise_threshold_table(table) for trial_name, table in tables.items()
+    }
+    return {"false_positive_budgets": list(EVALUATION_FALSE_POSITIVE_BUDGETS), "trials": matrix}
+
+
+def format_evaluation_matrix(matrix: Dict[str, Any]) -> str:
+    budgets = matrix["false_positive_budgets"]
+    text = "trial\t" + "\t".join(f"detection@fp<={budget * 100:g}%" for budget in budgets) + "\n"
+    for trial_name, results in matrix["trials"].items():
+        cells = []
+        for budget in (f"{budget:g}" for budget in budgets):
+            if results is None:
+                cells.append("failed")
+            elif (result := results[budget]) is None:
+                cells.append("-")
+            else:
+                cells.append(f"{result['detection_rate'] * 100:.2f}% ({result['threshold']})")
+        text += f"{trial_name}\t" + "\t".join(cells) + "\n"
+    return text
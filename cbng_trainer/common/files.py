@@ -1,6 +1,30 @@
-from typing import Optional
+import contextlib
+import fnmatch
+import hashlib
+import logging
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import BinaryIO, Iterator, List, NamedTuple, Optional, Union
 from urllib.parse import quote
 
+import requests
+
+from cbng_trainer.common import http_client
+from cbng_trainer.common.tracing import traced
+
+logger = logging.getLogger(__name__)
+
+# Intermediates which only ever live in a shared workspace, everything else is also published to the file api
+SHARED_WORKSPACE_ONLY_PATTERNS = ("*/edit-sets/*", "*.dat")
+# What later steps read back, logs, state & reports only go to the file api
+SHARED_WORKSPACE_PATTERNS = SHARED_WORKSPACE_ONLY_PATTERNS + ("*/artifacts/*",)
+
+
+def calculate_instance_path(base_url: str, target_group: str, target_instance: str) -> str:
+    return f'{base_url.rstrip("/")}/{quote(target_group)}/{quote(target_instance)}'
+
 
 def calculate_target_path(
     base_url: str,
@@ -9,8 +33,171 @@ def calculate_target_path(
     target_type: str,
     target_file: Optional[str] = None,
 ) -> str:
-    endpoint = f'{base_url.rstrip("/")}'
-    endpoint += f"/{quote(target_group)}/{quote(target_instance)}/{quote(target_type)}"
+    endpoint = f"{calculate_instance_path(base_url, target_group, target_instance)}/{quote(target_type)}"
     if target_file:
         endpoint += f"/{quote(target_file)}"
     return endpoint
+
+
+class SharedWorkspace(NamedTuple):
+    # Objects under `url_prefix` are kept at the same relative path under `directory`, on the tool's shared storage
+    url_prefix: str
+    directory: str
+
+    def path_for(self, url: str) -> Optional[Path]:
+        if not url.startswith(f"{self.url_prefix}/"):
+            return None
+        if not any(fnmatch.fnmatch(url, pattern) for pattern in SHARED_WORKSPACE_PATTERNS):
+            return None
+        return Path(self.directory) / url[len(self.url_prefix) + 1 :]
+
+    def is_published(self, url: str) -> bool:
+        return not any(fnmatch.fnmatch(url, pattern) for pattern in SHARED_WORKSPACE_ONLY_PATTERNS)
+
+
+def shared_workspace_for(shared_workspace_dir: str, url_prefix: str) -> SharedWorkspace:
+    # Instance names are free text, so key the directory on the (stable) prefix
+    directory = Path(shared_workspace_dir) / hashlib.sha256(url_prefix.encode("utf-8")).hexdigest()[:16]
+    return SharedWorkspace(url_prefix=url_prefix, directory=directory.as_posix())
+
+
+# Workspaces of the instances this process is running, consulted by `open_file` & `upload_file`
+_shared_workspaces: List[SharedWorkspace] = []
+_shared_workspaces_lock = threading.Lock()
+
+
+def register_shared_workspace(workspace: SharedWorkspace) -> None:
+    with _shared_workspaces_lock:
+        _shared_workspaces.append(workspace)
+
+
+def unregister_shared_workspace(workspace: SharedWorkspace) -> None:
+    with _shared_workspaces_lock:
+        _shared_workspaces.remove(workspace)
+
+
+@contextlib.contextmanager
+def shared_workspace_registered(workspace: Optional[SharedWorkspace]) -> Iterator[None]:
+    if workspace is None:
+        yield
+        return
+
+    register_shared_workspace(workspace)
+    try:
+        yield
+    finally:
+        unregister_shared_workspace(workspace)
+
+
+def _find_shared_workspace(url: str) -> Optional[SharedWorkspace]:
+    with _shared_workspaces_lock:
+        return next((workspace for workspace in _shared_workspaces if workspace.path_for(url)), None)
+
+
+def is_published(url: str) -> bool:
+    # Whether the object can be read back from the file api, rather than only from a shared workspace
+    return (workspace := _find_shared_workspace(url)) is None or workspace.is_published(url)
+
+
+@contextlib.contextmanager
+def open_file(source_url: str, timeout: int = 600) -> Iterator[Optional[BinaryIO]]:
+    # Prefer the shared workspace copy, anything not (yet) there is fetched from the file api
+    if (workspace := _find_shared_workspace(source_url)) and (path := workspace.path_for(source_url)).exists():
+        with path.open("rb") as fh:
+            yield fh
+        return
+
+    with http_client.get(source_url, stream=True, timeout=timeout) as r:
+        if r.status_code != 200:
+            logger.warning(f"Failed to download {source_url}: {r.status_code}")
+            yield None
+            return
+        r.raw.decode_content = True
+        yield r.raw
+
+
+@traced("download-file", "file-api", arg_names=("source_url",))
+def download_file(source_url: str, target: BinaryIO, timeout: int = 600) -> bool:
+    # Streamed so we never hold the (potentially huge) object in memory
+    with open_file(source_url, timeout=timeout) as fh:
+        if fh is None:
+            return False
+        shutil.copyfileobj(fh, target)
+    return True
+
+
+def _write_shared_workspace_file(path: Path, data: Union[str, bytes, BinaryIO]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with tmp_path.open("wb") as fh:
+        if isinstance(data, str):
+            fh.write(data.encode("utf-8"))
+        elif isinstance(data, bytes):
+            fh.write(data)
+        else:
+            shutil.copyfileobj(data, fh)
+    tmp_path.replace(path)
+
+
+@traced("upload-file", "file-api", arg_names=("target_url",))
+def upload_file(target_url: str, data: Union[str, bytes, BinaryIO], api_key: str, timeout: int = 300) -> bool:
+    # Note: we are not in a container at this point, so access the API directly,
+    #       this logic is the equivalent to `upload_file` in bash
+    if workspace := _find_shared_workspace(target_url):
+        path = workspace.path_for(target_url)
+        logger.info(f"Writing {target_url} to {path}")
+        _write_shared_workspace_file(path, data)
+        if not workspace.is_published(target_url):
+            return True
+        with path.open("rb") as fh:
+            return _post_file(target_url, fh, api_key, timeout)
+    return _post_file(target_url, data, api_key, timeout)
+
+
+def _post_file(target_url: str, data: Union[str, bytes, BinaryIO], api_key: str, timeout: int) -> bool:
+    if not api_key:
+        logger.error(f"Failed to find api key, skipping upload to {target_url}")
+        return False
+
+    logger.info(f"Uploading to {target_url}")
+    r = http_client.post(
+        target_url,
+        headers={"Authorization": f"Bearer {api_key}"},
+        data=data,
+        timeout=timeout,
+    )
+    if r.status_code != 201:
+        # Objects can not be replaced, so a retried step re-uploading what is already there is not a failure
+        if _matches_existing(target_url, data, timeout):
+            logger.info(f"Skipping upload to {target_url}, already uploaded")
+            return True
+        logger.warning(f"Failed to upload to {target_url}: {r.status_code} ({r.text})")
+        return False
+    return True
+
+
+def _matches_existing(target_url: str, data: Union[str, bytes, BinaryIO], timeout: int) -> bool:
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    if isinstance(data, bytes):
+        expected = hashlib.sha256(data).hexdigest()
+    else:
+        if not data.seekable():
+            return False
+        data.seek(0)
+        digest = hashlib.sha256()
+        while chunk := data.read(1024 * 1024):
+            digest.update(chunk)
+        expected = digest.hexdigest()
+
+    try:
+        with http_client.get(target_url, stream=True, timeout=timeout) as r:
+            if r.status_code != 200:
+                return False
+            digest = hashlib.sha256()
+            for chunk in r.iter_content(chunk_size=1024 * 1024):
+                digest.update(chunk)
+    except requests.exceptions.RequestException as e:
+        logger.warning(f"Failed to compare {target_url}: {e}")
+        return False
+    return digest.hexdigest() == expected
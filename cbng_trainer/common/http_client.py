@@ -0,0 +1,43 @@
+"""
+MIT License
+
+Copyright (c) 2025 Damian Zaremba
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+from urllib.parse import urlsplit
+
+import requests
+
+from cbng_trainer.common.tracing import span
+
+# Shared by every direct request (the file api, review api & state), so connections are reused between requests
+# and each request is a span when tracing, as the toolforge api calls are
+_session = requests.Session()
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    with span(f"GET {urlsplit(url).netloc}", "api", url=url):
+        return _session.get(url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    with span(f"POST {urlsplit(url).netloc}", "api", url=url):
+        return _session.post(url, **kwargs)
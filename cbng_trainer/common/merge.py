@@ -0,0 +1,171 @@
+"""
+MIT License
+
+Copyright (c) 2025 Damian Zaremba
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import heapq
+import itertools
+import logging
+import shutil
+import tempfile
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from cbng_trainer.common.files import open_file
+
+logger = logging.getLogger(__name__)
+
+
+def _read_fann_header(source_url: str) -> Optional[Tuple[int, int, int]]:
+    with open_file(source_url) as fh:
+        if fh is None:
+            logger.error(f"Failed to read {source_url}")
+            return None
+        header = fh.readline().split()
+
+    if len(header) != 3:
+        logger.error(f"Invalid training data header in {source_url}: {header}")
+        return None
+    return int(header[0]), int(header[1]), int(header[2])
+
+
+def merge_fann_training_files(source_urls: List[str], target: BinaryIO) -> bool:
+    # Header is "<num rows> <num inputs> <num outputs>", followed by input/output line pairs per row
+    headers = []
+    for source_url in source_urls:
+        if (header := _read_fann_header(source_url)) is None:
+            return False
+        headers.append(header)
+
+    if len({(inputs, outputs) for _, inputs, outputs in headers}) != 1:
+        logger.error(f"Mismatched training data shapes: {headers}")
+        return False
+
+    target.write(f"{sum(header[0] for header in headers)} {headers[0][1]} {headers[0][2]}\n".encode("utf-8"))
+    for source_url in source_urls:
+        with open_file(source_url) as fh:
+            if fh is None:
+                logger.error(f"Failed to read {source_url}")
+                return False
+            fh.readline()
+
+            # Rows are only ever appended, so ensure the last one is terminated before the next shard
+            shutil.copyfileobj(fh, target)
+            target.seek(-1, 1)
+            if target.read(1) != b"\n":
+                target.write(b"\n")
+
+    logger.info(f"Merged {sum(header[0] for header in headers)} training rows from {len(source_urls)} shards")
+    return True
+
+
+def _parse_count_line(line: bytes, delimiter: bytes, columns: int) -> Tuple[bytes, List[int]]:
+    key, *counts = line.rstrip(b"\r\n").rsplit(delimiter, columns)
+    return key, [int(count) for count in counts]
+
+
+def _format_count_line(key: bytes, counts: List[int], delimiter: bytes) -> bytes:
+    return delimiter.join([key] + [str(count).encode("utf-8") for count in counts]) + b"\n"
+
+
+def _sniff_count_format(line: bytes) -> Tuple[bytes, int]:
+    # Lines are "<key><delimiter><count>[<delimiter><count>...]", the key itself may contain spaces
+    delimiter = b"\t" if b"\t" in line else b" "
+    fields = line.rstrip(b"\r\n").split(delimiter)
+    columns = 0
+    for field in reversed(fields[1:]):
+        if not field.lstrip(b"-").isdigit():
+            break
+        columns += 1
+    return delimiter, max(columns, 1)
+
+
+def _write_sorted_run(chunk: Dict[bytes, List[int]], delimiter: bytes) -> BinaryIO:
+    run = tempfile.TemporaryFile()
+    for key in sorted(chunk):
+        run.write(_format_count_line(key, chunk[key], delimiter))
+    run.seek(0)
+    return run
+
+
+def _iter_run(run: BinaryIO, delimiter: bytes, columns: int) -> Iterator[Tuple[bytes, List[int]]]:
+    for line in run:
+        yield _parse_count_line(line, delimiter, columns)
+
+
+def merge_count_files(source_urls: List[str], target: BinaryIO, chunk_size: int = 500_000) -> bool:
+    # External sort, each source is aggregated into sorted runs of at most `chunk_size` keys on disk,
+    # which are then k-way merged with the counts summed per key, so memory is bounded by the chunk not the vocabulary
+    delimiter, columns = None, 0
+    runs: List[BinaryIO] = []
+    try:
+        chunk: Dict[bytes, List[int]] = {}
+        for source_url in source_urls:
+            with open_file(source_url) as fh:
+                if fh is None:
+                    logger.error(f"Failed to read {source_url}")
+                    return False
+
+                for line in fh:
+                    if not line.strip():
+                        continue
+                    if delimiter is None:
+                        delimiter, columns = _sniff_count_format(line)
+
+                    try:
+                        key, counts = _parse_count_line(line, delimiter, columns)
+                    except ValueError:
+                        logger.error(f"Invalid training data line in {source_url}: {line!r}")
+                        return False
+                    if len(counts) != columns:
+                        logger.error(f"Mismatched training data columns in {source_url}: {line!r}")
+                        return False
+
+                    if (existing := chunk.get(key)) is None:
+                        chunk[key] = counts
+                    else:
+                        chunk[key] = [a + b for a, b in zip(existing, counts)]
+
+                    if len(chunk) >= chunk_size:
+                        runs.append(_write_sorted_run(chunk, delimiter))
+                        chunk = {}
+
+        if delimiter is None:
+            logger.warning("No training data found to merge")
+            return True
+
+        if chunk:
+            runs.append(_write_sorted_run(chunk, delimiter))
+
+        keys = 0
+        merged = heapq.merge(*[_iter_run(run, delimiter, columns) for run in runs], key=lambda row: row[0])
+        for key, rows in itertools.groupby(merged, key=lambda row: row[0]):
+            totals = [0] * columns
+            for _, counts in rows:
+                totals = [a + b for a, b in zip(totals, counts)]
+            target.write(_format_count_line(key, totals, delimiter))
+            keys += 1
+
+        logger.info(f"Merged {keys} keys from {len(source_urls)} shards ({len(runs)} sorted runs)")
+        return True
+    finally:
+        for run in runs:
+            run.close()
@@ -0,0 +1,157 @@
+"""
+MIT License
+
+Copyright (c) 2025 Damian Zaremba
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import contextlib
+import hashlib
+import logging
+import sqlite3
+import threading
+import zlib
+from pathlib import Path
+from typing import BinaryIO, Dict, Optional
+
+from cbng_trainer.common import http_client
+from cbng_trainer.common.editsets import EditSetWriter, edit_id, iter_edits, serialise_edit
+
+logger = logging.getLogger(__name__)
+
+# Local copy of an edit group's dump, one compressed row per edit keyed by the edit id, kept in sync with the review api
+MIRROR_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS edits (
+    edit_key TEXT PRIMARY KEY,
+    position INTEGER,
+    digest BLOB,
+    data BLOB
+);
+CREATE INDEX IF NOT EXISTS edits_position ON edits (position);
+CREATE TEMPORARY TABLE seen (edit_key TEXT PRIMARY KEY);
+"""
+
+# Groups can be shared between targets (e.g. the fallback trial group), which may be synced side by side
+_mirror_locks: Dict[str, threading.Lock] = {}
+_mirror_locks_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def mirror_lock(mirror_path: str):
+    with _mirror_locks_lock:
+        lock = _mirror_locks.setdefault(Path(mirror_path).resolve().as_posix(), threading.Lock())
+    with lock:
+        yield
+
+
+def mirror_path_for(mirror_dir: str, source_url: str) -> str:
+    return (Path(mirror_dir) / f"{hashlib.sha256(source_url.encode('utf-8')).hexdigest()[:16]}.sqlite").as_posix()
+
+
+def _get_meta(connection: sqlite3.Connection, key: str) -> Optional[str]:
+    row = connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+
+def sync_edit_set_mirror(source_url: str, mirror_path: str) -> Optional[Dict[str, int]]:
+    connection = sqlite3.connect(mirror_path)
+    try:
+        connection.executescript(MIRROR_SCHEMA)
+
+        headers = {}
+        if _get_meta(connection, "source_url") == source_url:
+            if etag := _get_meta(connection, "etag"):
+                headers["If-None-Match"] = etag
+            if last_modified := _get_meta(connection, "last_modified"):
+                headers["If-Modified-Since"] = last_modified
+
+        stats = {"added": 0, "changed": 0, "removed": 0, "unchanged": 0}
+        with http_client.get(source_url, headers=headers, stream=True, timeout=600) as r:
+            if r.status_code == 304:
+                logger.info(f"Mirror of {source_url} is up to date")
+                stats["unchanged"] = connection.execute("SELECT COUNT(*) FROM edits").fetchone()[0]
+                return stats
+
+            if r.status_code != 200:
+                logger.error(f"Failed to download {source_url}: {r.status_code}")
+                return None
+            r.raw.decode_content = True
+
+            # Diff as we stream, only edits which are new or differ are (re-)compressed & written
+            for position, element in enumerate(iter_edits(r.raw)):
+                element_id = edit_id(element)
+                edit_key = str(element_id) if element_id is not None else f"position-{position}"
+                data = serialise_edit(element)
+                digest = hashlib.sha256(data).digest()
+
+                row = connection.execute(
+                    "SELECT position, digest FROM edits WHERE edit_key = ?", (edit_key,)
+                ).fetchone()
+                if row is None:
+                    connection.execute(
+                        "INSERT INTO edits (edit_key, position, digest, data) VALUES (?, ?, ?, ?)",
+                        (edit_key, position, digest, zlib.compress(data)),
+                    )
+                    stats["added"] += 1
+                elif row[1] != digest:
+                    connection.execute(
+                        "UPDATE edits SET position = ?, digest = ?, data = ? WHERE edit_key = ?",
+                        (position, digest, zlib.compress(data), edit_key),
+                    )
+                    stats["changed"] += 1
+                else:
+                    if row[0] != position:
+                        connection.execute("UPDATE edits SET position = ? WHERE edit_key = ?", (position, edit_key))
+                    stats["unchanged"] += 1
+                connection.execute("INSERT OR IGNORE INTO seen (edit_key) VALUES (?)", (edit_key,))
+
+            stats["removed"] = connection.execute(
+                "DELETE FROM edits WHERE edit_key NOT IN (SELECT edit_key FROM seen)"
+            ).rowcount
+
+            connection.executemany(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                [
+                    ("source_url", source_url),
+                    ("etag", r.headers.get("ETag")),
+                    ("last_modified", r.headers.get("Last-Modified")),
+                ],
+            )
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+    logger.info(f"Synced mirror of {source_url} ({stats})")
+    return stats
+
+
+def materialise_edit_set_mirror(mirror_path: str, target: BinaryIO) -> int:
+    connection = sqlite3.connect(mirror_path)
+    try:
+        with EditSetWriter(target) as writer:
+            for (data,) in connection.execute("SELECT data FROM edits ORDER BY position"):
+                writer.write(zlib.decompress(data))
+    finally:
+        connection.close()
+    return writer.edits
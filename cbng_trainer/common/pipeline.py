@@ -0,0 +1,612 @@
+"""
+MIT License
+
+Copyright (c) 2025 Damian Zaremba
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import contextlib
+import functools
+import logging
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional
+
+import requests
+
+from cbng_trainer.common.bundle import calculate_pointer_path, publish_pointer, read_pointer
+from cbng_trainer.common.files import (
+    SharedWorkspace,
+    calculate_instance_path,
+    calculate_target_path,
+    shared_workspace_for,
+    shared_workspace_registered,
+)
+from cbng_trainer.common.plan import StepPlan
+from cbng_trainer.common.sampling import parse_sample_spec
+from cbng_trainer.common.state import RunState, calculate_start_latencies_path
+from cbng_trainer.common.steps import Steps
+from cbng_trainer.common.toolforge import load_start_latencies, start_latencies
+from cbng_trainer.common.tracing import traced
+
+logger = logging.getLogger(__name__)
+
+
+class TargetLoggerAdapter(logging.LoggerAdapter):
+    # Multiple targets may share a process, so prefix everything with the target
+    def process(self, msg, kwargs):
+        return f"[{self.extra['target_name']}] {msg}", kwargs
+
+
+def resolve_edit_set_runs(
+    target_groups: Dict[str, Dict[str, int]], review_host: str, instance_name: str
+) -> List[Dict[str, Optional[str]]]:
+    runs = []
+    for target_name, groups in target_groups.items():
+        if ("Training" in groups or "Reported False Positives" in groups) and "Trial" not in groups:
+            if group_id := target_groups.get("Original Testing Training Set - Random Edits 50/50", {}).get("Trial"):
+                logger.info(f"Using original training set as fallback trial group for {target_name}")
+                groups["Trial"] = group_id
+
+        target_runs = []
+        for group_name, group_id in groups.items():
+            # We will use the training set, no need to download the redundant file
+            if group_name == "Generic" and "Training" in groups:
+                logger.warning(f"Ignoring generic group in place of training for {target_name}")
+                continue
+
+            if group_name == "Generic" and "Reported False Positives" in groups:
+                logger.warning(f"Ignoring generic group in place of reported false positives for {target_name}")
+                continue
+
+            if group_name == "Trial":
+                logger.debug("Ignoring trial group")
+                continue
+
+            target_runs.append(
+                {
+                    "target_name": target_name,
+                    "group_name": group_name,
+                    "instance_name": instance_name,
+                    "download_training": (
+                        f'{review_host.rstrip("/")}/api/v1/edit-groups/{group_id}/dump-editset/'
+                        if group_name in {"Generic", "Reported False Positives", "Training"}
+                        else None
+                    ),
+                    "download_trial": (
+                        f'{review_host.rstrip("/")}/api/v1/edit-groups/{groups["Trial"]}/dump-editset/'
+                        if "Trial" in groups
+                        else None
+                    ),
+                }
+            )
+
+        # Each run needs its own instance, otherwise they would share (and skip) each other's state & files
+        if len(target_runs) > 1:
+            for run in target_runs:
+                run["instance_name"] = f'{instance_name} {run["group_name"]}'
+        runs.extend(target_runs)
+    return runs
+
+
+def _build_steps(
+    target_name: str,
+    instance_name: str,
+    toolforge_user: str,
+    trainer_image_name: str,
+    core_image_name: str,
+    trainer_host: str,
+    track_state: bool = True,
+    state_file: Optional[str] = None,
+    max_hedges: int = 0,
+    telemetry_interval: Optional[int] = None,
+    shared_workspace: Optional[SharedWorkspace] = None,
+    plan: Optional[StepPlan] = None,
+) -> Steps:
+    return Steps(
+        toolforge_user=toolforge_user,
+        target_name=target_name,
+        trainer_image_name=trainer_image_name,
+        core_image_name=core_image_name,
+        upload_logs=calculate_target_path(trainer_host, target_name, instance_name, "logs"),
+        instance_name=instance_name,
+        run_state=(
+            RunState(
+                target_name=target_name,
+                instance_name=instance_name,
+                state_url=calculate_target_path(trainer_host, target_name, instance_name, "state"),
+                state_file=state_file,
+            )
+            if track_state
+            else None
+        ),
+        max_hedges=max_hedges,
+        telemetry_interval=telemetry_interval,
+        shared_workspace=shared_workspace,
+        plan=plan,
+    )
+
+
+def _shard_urls(trainer_host: str, target_name: str, instance_name: str, shards: Optional[int]) -> List[str]:
+    if not shards or shards < 2:
+        return []
+    return [
+        calculate_target_path(trainer_host, target_name, instance_name, "edit-sets", f"shards/train-{shard}.xml")
+        for shard in range(shards)
+    ]
+
+
+def _run_group(tasks: List[Callable[[], bool]], cancel: Callable[[], None]) -> List[bool]:
+    # Runs the tasks in parallel, the first failure cancels the rest rather than waiting on them to finish
+    with ThreadPoolExecutor(max_workers=len(tasks)) as executor:
+        futures = [executor.submit(task) for task in tasks]
+        for future in as_completed(futures):
+            if future.exception() is not None or not future.result():
+                cancel()
+                break
+    # An exception counts as a failure (the caller only deals in success or not), but is still logged
+    for future in futures:
+        if (e := future.exception()) is not None:
+            logger.error(f"Task failed: {e}", exc_info=e)
+    return [future.exception() is None and future.result() for future in futures]
+
+
+def _run_shards(steps: Steps, shard_urls: List[str], func: Callable[[int], bool]) -> bool:
+    return all(_run_group([functools.partial(func, shard) for shard in range(len(shard_urls))], steps.cancel))
+
+
+def _run_training(
+    steps: Steps,
+    log: logging.LoggerAdapter,
+    training_url: str,
+    artifacts_url: str,
+    shard_urls: Optional[List[str]] = None,
+) -> bool:
+    if shard_urls:
+        log.info(f"Splitting training set into {len(shard_urls)} shards")
+        if not steps.split_edit_set_shards(training_url, shard_urls):
+            log.error("Splitting shards failed")
+            return False
+
+        # Map over the shards, then reduce the word counts back into a single training file per db
+        log.info(f"Running bayes train over {len(shard_urls)} shards")
+        if not _run_shards(
+            steps,
+            shard_urls,
+            lambda shard: steps.run_bayes_train(
+                download_edit_set_url=shard_urls[shard],
+                upload_files_url=artifacts_url,
+                shard=shard,
+            ),
+        ):
+            log.error("Bayes train failed")
+            return False
+
+        log.info("Merging bayes train shards")
+        if not steps.merge_bayes_train_shards(artifacts_url, len(shard_urls)):
+            log.error("Merging bayes train shards failed")
+            return False
+
+    else:
+        log.info("Running bayes train")
+        if not steps.run_bayes_train(
+            download_edit_set_url=training_url,
+            upload_files_url=artifacts_url,
+        ):
+            log.error("Bayes train failed")
+            return False
+
+    log.info("Creating bayes databases")
+    main_bayes_result, two_bayes_result = _run_group(
+        [
+            functools.partial(
+                steps.create_main_bayes_db,
+                download_edit_set_url=training_url,
+                upload_files_url=artifacts_url,
+            ),
+            functools.partial(
+                steps.create_two_bayes_db,
+                download_edit_set_url=training_url,
+                upload_files_url=artifacts_url,
+            ),
+        ],
+        steps.cancel,
+    )
+    if not main_bayes_result:
+        log.error("Main bayes db failed")
+        return False
+    if not two_bayes_result:
+        log.error("Two bayes db failed")
+        return False
+
+    if shard_urls:
+        # Each edit's feature row is independent, so the shards can be trained side by side & concatenated
+        log.info(f"Running ann train over {len(shard_urls)} shards")
+        if not _run_shards(
+            steps,
+            shard_urls,
+            lambda shard: steps.run_ann_train(
+                download_edit_set_url=shard_urls[shard],
+                upload_files_url=artifacts_url,
+                shard=shard,
+            ),
+        ):
+            log.error("Ann train failed")
+            return False
+
+        log.info("Merging ann train shards")
+        if not steps.merge_ann_train_shards(artifacts_url, len(shard_urls)):
+            log.error("Merging ann train shards failed")
+            return False
+
+    else:
+        log.info("Running ann train")
+        if not steps.run_ann_train(
+            download_edit_set_url=training_url,
+            upload_files_url=artifacts_url,
+        ):
+            log.error("Ann train failed")
+            return False
+
+    log.info("Running ann create")
+    if not steps.run_create_ann(
+        download_edit_set_url=training_url,
+        upload_files_url=artifacts_url,
+    ):
+        log.error("Ann create failed")
+        return False
+
+    return True
+
+
+def _run_trial(steps: Steps, log: logging.LoggerAdapter, trial_url: str, report_url: str) -> bool:
+    log.info("Executing trial")
+    if not steps.run_trial_report(
+        download_edit_set_url=trial_url,
+        upload_report_url=report_url,
+    ):
+        log.error("Trial report failed")
+        return False
+
+    log.info("Creating plots")
+    if not steps.create_plots(upload_report_url=report_url):
+        log.error("Result plotting failed")
+        return False
+
+    log.info("Indexing trial results")
+    if not steps.create_trial_index(upload_report_url=report_url):
+        log.error("Trial indexing failed")
+        return False
+
+    return True
+
+
+def _run_cross_validation(
+    steps: Steps,
+    log: logging.LoggerAdapter,
+    training_url: str,
+    folds: int,
+    fold_seed: int,
+    shards: Optional[int],
+    **steps_kwargs,
+) -> bool:
+    target_name, instance_name, trainer_host = (
+        steps_kwargs["target_name"],
+        steps_kwargs["instance_name"],
+        steps_kwargs["trainer_host"],
+    )
+    # Each fold is a run of its own, nested under our instance
+    fold_instances = [f"{instance_name}/fold-{fold}" for fold in range(folds)]
+    fold_edit_sets = [
+        (
+            calculate_target_path(trainer_host, target_name, fold_instance, "edit-sets", "train.xml"),
+            calculate_target_path(trainer_host, target_name, fold_instance, "edit-sets", "trial.xml"),
+        )
+        for fold_instance in fold_instances
+    ]
+
+    log.info(f"Splitting training set into {folds} folds")
+    if not steps.split_edit_set_folds(training_url, fold_edit_sets, seed=fold_seed):
+        log.error("Splitting folds failed")
+        return False
+
+    all_fold_steps = [
+        _build_steps(**(steps_kwargs | {"instance_name": fold_instance, "state_file": None}))
+        for fold_instance in fold_instances
+    ]
+
+    def _run_fold(fold: int) -> bool:
+        fold_log = TargetLoggerAdapter(logger, {"target_name": f"{target_name} fold {fold}"})
+        fold_steps = all_fold_steps[fold]
+        train_url, trial_url = fold_edit_sets[fold]
+        return _run_training(
+            fold_steps,
+            fold_log,
+            train_url,
+            calculate_target_path(trainer_host, target_name, fold_instances[fold], "artifacts"),
+            _shard_urls(trainer_host, target_name, fold_instances[fold], shards),
+        ) and _run_trial(
+            fold_steps,
+            fold_log,
+            trial_url,
+            calculate_target_path(trainer_host, target_name, fold_instances[fold], "trial"),
+        )
+
+    # Folds are independent, the job slots (if configured) keep us within the quota
+    log.info(f"Running {folds} folds")
+    results = _run_group(
+        [functools.partial(_run_fold, fold) for fold in range(folds)],
+        lambda: [fold_steps.cancel() for fold_steps in all_fold_steps],
+    )
+    if not all(results):
+        log.error(f"Folds failed: {[fold for fold, success in enumerate(results) if not success]}")
+        return False
+
+    report_url = calculate_target_path(trainer_host, target_name, instance_name, "trial")
+    log.info("Aggregating fold reports")
+    if not steps.aggregate_fold_reports(
+        [calculate_target_path(trainer_host, target_name, fold_instance, "trial") for fold_instance in fold_instances],
+        report_url,
+    ):
+        log.error("Aggregating fold reports failed")
+        return False
+
+    log.info("Creating plots")
+    if not steps.create_plots(upload_report_url=report_url):
+        log.error("Result plotting failed")
+        return False
+
+    return True
+
+
+@contextlib.contextmanager
+def _carried_start_latencies(history_url: str, log: logging.LoggerAdapter):
+    # A coordinator job only starts a handful of steps, never enough to hedge on by itself,
+    # so pick up the history of previous runs & publish it with what we add
+    try:
+        if (record := read_pointer(history_url)) is not None:
+            load_start_latencies(record.get("latencies", []))
+    except requests.exceptions.RequestException as e:
+        log.warning(f"Failed to read start latencies: {e}")
+    recorded, _ = start_latencies()
+
+    try:
+        yield
+    finally:
+        now_recorded, latencies = start_latencies()
+        if now_recorded != recorded:
+            try:
+                published = publish_pointer(history_url, {"latencies": latencies}, os.environ.get("FILE_API_KEY", ""))
+            except requests.exceptions.RequestException as e:
+                log.warning(f"Failed to publish start latencies: {e}")
+            else:
+                if published is None:
+                    log.warning("Failed to publish start latencies")
+
+
+@traced("execute_edit_set", "pipeline", arg_names=("target_name", "instance_name"))
+def execute_edit_set(
+    target_name: str,
+    instance_name: str,
+    toolforge_user: str,
+    trainer_image_name: str,
+    core_image_name: str,
+    trainer_host: str,
+    download_training: str,
+    download_trial: Optional[str] = None,
+    track_state: bool = True,
+    state_file: Optional[str] = None,
+    sample: Optional[str] = None,
+    sample_seed: int = 0,
+    folds: Optional[int] = None,
+    fold_seed: int = 0,
+    shards: Optional[int] = None,
+    max_hedges: int = 0,
+    mirror_dir: Optional[str] = None,
+    telemetry_interval: Optional[int] = None,
+    shared_workspace_dir: Optional[str] = None,
+    plan: Optional[StepPlan] = None,
+) -> bool:
+    log = TargetLoggerAdapter(logger, {"target_name": target_name})
+    shared_workspace = (
+        shared_workspace_for(shared_workspace_dir, calculate_instance_path(trainer_host, target_name, instance_name))
+        if shared_workspace_dir
+        else None
+    )
+    steps_kwargs = {
+        "target_name": target_name,
+        "instance_name": instance_name,
+        "toolforge_user": toolforge_user,
+        "trainer_image_name": trainer_image_name,
+        "core_image_name": core_image_name,
+        "trainer_host": trainer_host,
+        "track_state": track_state,
+        "state_file": state_file,
+        "max_hedges": max_hedges,
+        "telemetry_interval": telemetry_interval,
+        "shared_workspace": shared_workspace,
+        "plan": plan,
+    }
+    steps = _build_steps(**steps_kwargs)
+
+    with contextlib.ExitStack() as stack:
+        stack.enter_context(shared_workspace_registered(shared_workspace))
+        if max_hedges and plan is None:
+            stack.enter_context(
+                _carried_start_latencies(calculate_start_latencies_path(trainer_host, target_name), log)
+            )
+
+        if folds and download_trial:
+            # Cross validation trials against the held out fold, rather than the trial set
+            log.info("Ignoring trial set in favour of cross validation")
+            download_trial = None
+
+        # Download the files
+        files_to_download = {
+            download_training: calculate_target_path(trainer_host, target_name, instance_name, "edit-sets", "train.xml")
+        }
+        if download_trial:
+            files_to_download |= {
+                download_trial: calculate_target_path(
+                    trainer_host, target_name, instance_name, "edit-sets", "trial.xml"
+                )
+            }
+
+        if sample:
+            log.info(f"Sampling files ({sample})")
+            if not steps.store_sampled_edit_sets(
+                mapping=files_to_download, spec=parse_sample_spec(sample), seed=sample_seed
+            ):
+                log.error("Sampling files failed")
+                return False
+
+        elif mirror_dir:
+            log.info(f"Syncing files via mirror ({mirror_dir})")
+            if not steps.store_mirrored_edit_sets(mapping=files_to_download, mirror_dir=mirror_dir):
+                log.error("Syncing files failed")
+                return False
+
+        else:
+            log.info("Downloading files")
+            if not steps.store_edit_sets(mapping=files_to_download):
+                log.error("Downloading files failed")
+                return False
+
+        if folds:
+            if not _run_cross_validation(
+                steps, log, files_to_download[download_training], folds, fold_seed, shards, **steps_kwargs
+            ):
+                return False
+
+        else:
+            # Build
+            if not _run_training(
+                steps,
+                log,
+                files_to_download[download_training],
+                calculate_target_path(trainer_host, target_name, instance_name, "artifacts"),
+                _shard_urls(trainer_host, target_name, instance_name, shards),
+            ):
+                return False
+
+            # Run trial
+            if download_trial and not _run_trial(
+                steps,
+                log,
+                files_to_download[download_trial],
+                calculate_target_path(trainer_host, target_name, instance_name, "trial"),
+            ):
+                return False
+
+            # Package
+            log.info("Creating model bundle")
+            bundle_url = calculate_target_path(trainer_host, target_name, instance_name, "bundle")
+            if not steps.create_model_bundle(
+                calculate_target_path(trainer_host, target_name, instance_name, "artifacts"),
+                bundle_url,
+                {
+                    name: files_to_download[download_url]
+                    for name, download_url in [("train", download_training), ("trial", download_trial)]
+                    if download_url
+                },
+                {
+                    "download_training": download_training,
+                    "download_trial": download_trial,
+                    "sample": sample,
+                    "sample_seed": sample_seed,
+                    "shards": shards,
+                },
+                calculate_target_path(trainer_host, target_name, instance_name, "trial") if download_trial else None,
+            ):
+                log.error("Creating model bundle failed")
+                return False
+
+            # Only a full build which made it through a trial is deployable
+            if download_trial and not sample:
+                log.info("Publishing latest good pointer")
+                if not steps.publish_latest_good(bundle_url, calculate_pointer_path(trainer_host, target_name)):
+                    log.error("Publishing latest good pointer failed")
+                    return False
+
+        if sample and (download_trial or folds):
+            log.info("Marking trial as a smoke result")
+            if not steps.mark_smoke_result(
+                calculate_target_path(trainer_host, target_name, instance_name, "trial"), sample, sample_seed
+            ):
+                log.error("Marking smoke result failed")
+                return False
+
+        if shared_workspace and plan is None:
+            # Everything worth keeping was published, only a failed run needs its intermediates to resume
+            log.info(f"Removing shared workspace {shared_workspace.directory}")
+            shutil.rmtree(shared_workspace.directory, ignore_errors=True)
+        return True
+
+
+@traced("execute_evaluation", "pipeline", arg_names=("target_name", "instance_name"))
+def execute_evaluation(
+    target_name: str,
+    instance_name: str,
+    evaluation_name: str,
+    toolforge_user: str,
+    trainer_image_name: str,
+    core_image_name: str,
+    trainer_host: str,
+    trials: Dict[str, str],
+    parallelism: int = 2,
+    track_state: bool = True,
+    state_file: Optional[str] = None,
+    max_hedges: int = 0,
+    telemetry_interval: Optional[int] = None,
+) -> bool:
+    log = TargetLoggerAdapter(logger, {"target_name": target_name})
+    # Evaluations are nested under the instance whose artifacts they use, so they never clobber its trial
+    evaluation_instance = f"{instance_name}/evaluation/{evaluation_name}"
+    steps = _build_steps(
+        target_name,
+        evaluation_instance,
+        toolforge_user,
+        trainer_image_name,
+        core_image_name,
+        trainer_host,
+        track_state=track_state,
+        state_file=state_file,
+        max_hedges=max_hedges,
+        telemetry_interval=telemetry_interval,
+    )
+    report_url = calculate_target_path(trainer_host, target_name, evaluation_instance, "trial")
+
+    log.info(f"Evaluating {len(trials)} trial sets against {instance_name}")
+    trials_success = steps.run_trial_evaluation(
+        calculate_target_path(trainer_host, target_name, instance_name, "artifacts"),
+        trials,
+        report_url,
+        parallelism,
+    )
+    if not trials_success:
+        log.error("Running trial evaluation failed, summarising what completed")
+
+    # Partial results are still worth having, failed trials are marked as such in the matrix
+    if not steps.create_evaluation_summary(report_url, list(trials.keys())):
+        log.error("Creating evaluation summary failed")
+        return False
+
+    return trials_success
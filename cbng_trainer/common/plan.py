@@ -0,0 +1,103 @@
+"""
+MIT License
+
+Copyright (c) 2025 Damian Zaremba
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import re
+import threading
+from typing import Any, Dict, List, Optional
+
+# Matches the `upload_file` helper calls in a step's run commands, see `generate_execution_script`
+_UPLOAD_FILE_RE = re.compile(r'upload_file "[^"]+" "([^"]+)"')
+
+
+def parse_job_outputs(run_commands: List[str]) -> List[str]:
+    return [url for command in run_commands for url in _UPLOAD_FILE_RE.findall(command)]
+
+
+class StepPlan:
+    # Collects what a run would do, when set on `Steps` every step is recorded here rather than executed
+    def __init__(self):
+        self._steps: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        target_name: str,
+        instance_name: Optional[str],
+        identifier: str,
+        kind: str,
+        cached: bool,
+        inputs: List[str],
+        outputs: List[str],
+        job_name: Optional[str] = None,
+        image_name: Optional[str] = None,
+    ) -> None:
+        with self._lock:
+            self._steps.append(
+                {
+                    "target_name": target_name,
+                    "instance_name": instance_name,
+                    "identifier": identifier,
+                    "kind": kind,
+                    "job_name": job_name,
+                    "image_name": image_name,
+                    "cached": cached,
+                    "inputs": inputs,
+                    "outputs": outputs,
+                }
+            )
+
+    def steps(self) -> List[Dict[str, Any]]:
+        # Parallel steps are recorded in whatever order their threads got here,
+        # so order by stage (the longest chain of inputs produced by other steps) for a stable plan
+        with self._lock:
+            steps = [dict(step) for step in self._steps]
+
+        producers = {url: index for index, step in enumerate(steps) for url in step["outputs"]}
+        for index, step in enumerate(steps):
+            step["depends_on"] = sorted(
+                {producers[url] for url in step["inputs"] if url in producers and producers[url] != index}
+            )
+
+        stages: Dict[int, int] = {}
+
+        def _stage(index: int) -> int:
+            if index not in stages:
+                stages[index] = 1 + max((_stage(dependency) for dependency in steps[index]["depends_on"]), default=-1)
+            return stages[index]
+
+        for index, step in enumerate(steps):
+            step["stage"] = _stage(index)
+
+        # Dependencies refer to positions in the returned plan, as identifiers repeat across (fold) instances
+        order = sorted(
+            range(len(steps)),
+            key=lambda index: (steps[index]["stage"], steps[index]["instance_name"] or "", steps[index]["identifier"]),
+        )
+        position = {index: planned_index for planned_index, index in enumerate(order)}
+        planned = []
+        for index in order:
+            step = steps[index]
+            step["depends_on"] = sorted(position[dependency] for dependency in step["depends_on"])
+            planned.append(step)
+        return planned
@@ -0,0 +1,151 @@
+"""
+MIT License
+
+Copyright (c) 2025 Damian Zaremba
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import logging
+import re
+import sqlite3
+import xml.etree.ElementTree as ET  # nosec: B405
+from typing import BinaryIO, Iterable, Iterator, Optional, Tuple
+
+from cbng_trainer.common import http_client
+from cbng_trainer.common.consts import (
+    EDIT_SET_EDIT_ID_TAG,
+    EDIT_SET_IS_VANDALISM_TAG,
+    TRIAL_SCORE_TAGS,
+)
+from cbng_trainer.common.editsets import iter_edits, local_name, parse_bool
+
+logger = logging.getLogger(__name__)
+
+TRIAL_INDEX_FILE = "index.sqlite"
+TRIAL_INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS edits (
+    edit_id INTEGER PRIMARY KEY,
+    score REAL,
+    is_vandalism INTEGER,
+    outcome TEXT
+);
+CREATE TEMPORARY TABLE misclassified (edit_id INTEGER, kind TEXT, PRIMARY KEY (edit_id, kind));
+"""
+TRIAL_INDEX_OUTCOMES = """
+INSERT OR IGNORE INTO edits (edit_id) SELECT edit_id FROM misclassified;
+UPDATE edits SET outcome = CASE
+    WHEN edit_id IN (SELECT edit_id FROM misclassified WHERE kind = 'false_positive') THEN 'false_positive'
+    WHEN edit_id IN (SELECT edit_id FROM misclassified WHERE kind = 'false_negative') THEN 'false_negative'
+    WHEN is_vandalism = 1 THEN 'true_positive'
+    WHEN is_vandalism = 0 THEN 'true_negative'
+END;
+CREATE INDEX IF NOT EXISTS edits_outcome ON edits (outcome);
+"""
+
+# One edit per line, led by its id (or a diff link to it), optionally followed by its score
+_LISTED_EDIT_RE = re.compile(rb"(?:https?://\S+[?&]diff=)?(\d+)(?:\s+\S+)*")
+
+
+def iter_trial_results(source: BinaryIO) -> Iterator[Tuple[int, Optional[float], Optional[bool]]]:
+    for element in iter_edits(source):
+        edit_id, score, is_vandalism = None, None, None
+        try:
+            for child in element.iter():
+                name = local_name(child.tag)
+                if name == EDIT_SET_EDIT_ID_TAG and edit_id is None and child.text:
+                    edit_id = int(child.text.strip())
+                elif name == EDIT_SET_IS_VANDALISM_TAG and is_vandalism is None:
+                    is_vandalism = parse_bool(child.text)
+                elif name in TRIAL_SCORE_TAGS and score is None and child.text:
+                    score = float(child.text.strip())
+        except ValueError as e:
+            logger.warning(f"Skipping malformed trial result (edit {edit_id}): {e}")
+            continue
+
+        if edit_id is None:
+            logger.warning("Skipping trial result without an edit id")
+            continue
+        yield edit_id, score, is_vandalism
+
+
+def iter_listed_edit_ids(lines: Iterable[bytes]) -> Iterator[int]:
+    for line in lines:
+        if not (line := line.strip()):
+            continue
+        if not (match := _LISTED_EDIT_RE.fullmatch(line)):
+            logger.debug(f"Skipping unrecognised listed edit: {line!r}")
+            continue
+        yield int(match.group(1))
+
+
+def build_trial_index(report_url: str, target_path: str) -> bool:
+    connection = sqlite3.connect(target_path)
+    try:
+        connection.executescript(TRIAL_INDEX_SCHEMA)
+        connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('report_url', ?)", (report_url,))
+
+        with http_client.get(f"{report_url}/debug.xml", stream=True, timeout=600) as r:
+            if r.status_code != 200:
+                logger.error(f"Failed to read trial debug output: {r.status_code}")
+                return False
+            r.raw.decode_content = True
+            try:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO edits (edit_id, score, is_vandalism) VALUES (?, ?, ?)",
+                    iter_trial_results(r.raw),
+                )
+            except ET.ParseError as e:
+                logger.error(f"Failed to parse trial debug output: {e}")
+                return False
+
+        for kind, file_name in {
+            "false_positive": "falsepositives.txt",
+            "false_negative": "falsenegatives.txt",
+        }.items():
+            with http_client.get(f"{report_url}/{file_name}", stream=True, timeout=600) as r:
+                if r.status_code != 200:
+                    logger.error(f"Failed to read {file_name}: {r.status_code}")
+                    return False
+                connection.executemany(
+                    "INSERT OR IGNORE INTO misclassified (edit_id, kind) VALUES (?, ?)",
+                    ((edit_id, kind) for edit_id in iter_listed_edit_ids(r.iter_lines())),
+                )
+
+        connection.executescript(TRIAL_INDEX_OUTCOMES)
+        connection.commit()
+    finally:
+        connection.close()
+    return True
+
+
+def compare_trial_indexes(
+    path: str, other_path: str
+) -> Iterator[Tuple[int, Optional[int], Optional[str], Optional[str], Optional[float], Optional[float]]]:
+    connection = sqlite3.connect(path)
+    try:
+        connection.execute("ATTACH DATABASE ? AS other", (other_path,))
+        yield from connection.execute(
+            "SELECT a.edit_id, a.is_vandalism, a.outcome, b.outcome, a.score, b.score "
+            "FROM edits a JOIN other.edits b USING (edit_id) "
+            "WHERE a.outcome IS NOT b.outcome ORDER BY a.edit_id"
+        )
+    finally:
+        connection.close()
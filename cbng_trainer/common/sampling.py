@@ -0,0 +1,101 @@
+"""
+MIT License
+
+Copyright (c) 2025 Damian Zaremba
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import logging
+import random
+from typing import BinaryIO, Dict, List, NamedTuple, Optional, Tuple
+
+from cbng_trainer.common.editsets import EditSetWriter, is_vandalism, iter_edits, serialise_edit
+
+logger = logging.getLogger(__name__)
+
+
+class SampleSpec(NamedTuple):
+    size: Optional[int] = None
+    fraction: Optional[float] = None
+
+
+def parse_sample_spec(value: str) -> SampleSpec:
+    value = value.strip()
+    if value.endswith("%"):
+        spec = SampleSpec(fraction=float(value[:-1]) / 100)
+    elif "." in value:
+        spec = SampleSpec(fraction=float(value))
+    else:
+        spec = SampleSpec(size=int(value))
+
+    if spec.size is not None and spec.size <= 0:
+        raise ValueError(f"Sample size must be positive, got {value}")
+    if spec.fraction is not None and not 0 < spec.fraction <= 1:
+        raise ValueError(f"Sample fraction must be above 0 & at most 1 (100%), got {value}")
+    return spec
+
+
+def _label(is_vandal: Optional[bool]) -> str:
+    if is_vandal is None:
+        return "unknown"
+    return "vandalism" if is_vandal else "constructive"
+
+
+def sample_edit_set(source: BinaryIO, target: BinaryIO, spec: SampleSpec, seed: int = 0) -> Dict[str, Dict[str, int]]:
+    rng = random.Random(seed)  # nosec: B311
+    seen: Dict[str, int] = {}
+    kept: Dict[str, int] = {}
+
+    with EditSetWriter(target) as writer:
+        if spec.fraction is not None:
+            # Bernoulli sampling keeps each label's share without knowing the totals up front
+            for element in iter_edits(source):
+                label = _label(is_vandalism(element))
+                seen[label] = seen.get(label, 0) + 1
+                if rng.random() < spec.fraction:
+                    kept[label] = kept.get(label, 0) + 1
+                    writer.write(serialise_edit(element))
+
+        else:
+            # Reservoir per label, each large enough to cover the whole sample,
+            # then trimmed to the label's share once the totals are known
+            reservoirs: Dict[str, List[Tuple[int, bytes]]] = {}
+            for position, element in enumerate(iter_edits(source)):
+                label = _label(is_vandalism(element))
+                seen[label] = seen.get(label, 0) + 1
+                reservoir = reservoirs.setdefault(label, [])
+                if len(reservoir) < spec.size:
+                    reservoir.append((position, serialise_edit(element)))
+                elif (index := rng.randrange(seen[label])) < spec.size:
+                    reservoir[index] = (position, serialise_edit(element))
+
+            total = sum(seen.values())
+            selected: List[Tuple[int, bytes]] = []
+            for label, reservoir in reservoirs.items():
+                share = min(len(reservoir), round(spec.size * seen[label] / total))
+                kept[label] = share
+                selected.extend(rng.sample(reservoir, share))
+
+            # Keep the original ordering of the edit set
+            for _, edit in sorted(selected, key=lambda x: x[0]):
+                writer.write(edit)
+
+    logger.info(f"Sampled {sum(kept.values())} of {sum(seen.values())} edits ({kept})")
+    return {"seen": seen, "kept": kept}
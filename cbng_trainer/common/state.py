@@ -0,0 +1,132 @@
+"""
+MIT License
+
+Copyright (c) 2025 Damian Zaremba
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Optional
+from urllib.parse import quote
+
+import requests
+
+from cbng_trainer.common import http_client
+from cbng_trainer.common.files import upload_file
+
+logger = logging.getLogger(__name__)
+
+
+def calculate_start_latencies_path(base_url: str, target_group: str) -> str:
+    # Per target (like the latest good pointer), each run which started jobs publishes a new generation
+    return f'{base_url.rstrip("/")}/{quote(target_group)}/start-latencies'
+
+
+# Durable record of which steps an instance has started & completed, so a re-run can pick up where we left off.
+# Backed by a local json file (rewritten on every change) and/or the file api,
+# where each record is a separate object as existing objects can not be replaced.
+class RunState:
+    def __init__(
+        self,
+        target_name: str,
+        instance_name: str,
+        state_url: Optional[str] = None,
+        state_file: Optional[str] = None,
+    ):
+        self.target_name = target_name
+        self.instance_name = instance_name
+        self.state_url = state_url.rstrip("/") if state_url else None
+        self.state_file = Path(state_file) if state_file else None
+        self._file_api_key = os.environ.get("FILE_API_KEY", "")
+        self._lock = threading.Lock()
+        self._steps: Dict[str, Dict[str, Any]] = {}
+
+        if self.state_file and self.state_file.exists():
+            data = json.loads(self.state_file.read_text())
+            if data.get("target_name") == target_name and data.get("instance_name") == instance_name:
+                self._steps = data.get("steps", {})
+            else:
+                logger.warning(f"Ignoring state in {self.state_file}, it belongs to a different instance")
+
+    def _fetch_record(self, step: str) -> Optional[Dict[str, Any]]:
+        if not self.state_url:
+            return None
+
+        try:
+            r = http_client.get(f"{self.state_url}/{step}.json", timeout=10)
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"Failed to read state for {step}: {e}")
+            return None
+
+        if r.status_code != 200:
+            return None
+        return r.json()
+
+    def _write(self, step: str, record: Dict[str, Any], object_name: Optional[str]) -> None:
+        self._steps[step] = record
+        if self.state_file:
+            tmp_path = self.state_file.with_suffix(".tmp")
+            tmp_path.write_text(
+                json.dumps(
+                    {"target_name": self.target_name, "instance_name": self.instance_name, "steps": self._steps},
+                    indent=2,
+                )
+            )
+            tmp_path.replace(self.state_file)
+
+        if self.state_url and object_name:
+            upload_file(f"{self.state_url}/{object_name}", json.dumps(record), self._file_api_key, timeout=30)
+
+    def get(self, step: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if step not in self._steps or not self._steps[step].get("completed_at"):
+                if record := self._fetch_record(step):
+                    self._steps[step] = record
+            return self._steps.get(step)
+
+    def is_completed(self, step: str) -> bool:
+        record = self.get(step)
+        return record is not None and record.get("success") is True
+
+    def record_started(self, step: str, job_name: Optional[str] = None) -> None:
+        with self._lock:
+            self._write(
+                step,
+                {
+                    "target_name": self.target_name,
+                    "instance_name": self.instance_name,
+                    "step": step,
+                    "job_name": job_name,
+                    "started_at": datetime.now(tz=timezone.utc).isoformat(),
+                },
+                f"{step}.started.json",
+            )
+
+    def record_completed(self, step: str, success: bool) -> None:
+        with self._lock:
+            record = dict(self._steps.get(step, {"step": step}))
+            record |= {"completed_at": datetime.now(tz=timezone.utc).isoformat(), "success": success}
+            # Failures are not persisted to the file api, so the step can be retried
+            self._write(step, record, f"{step}.json" if success else None)
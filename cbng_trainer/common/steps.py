@@ -24,24 +24,73 @@ SOFTWARE.
 """
 
 import base64
+import contextlib
+import json
 import logging
 import os
+import tempfile
+import threading
 import uuid
-from datetime import datetime
-from typing import Dict, List, Tuple
-
-import requests
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
+from cbng_trainer.common import http_client
+from cbng_trainer.common.bundle import (
+    BUNDLE_FILE,
+    BUNDLE_FILES,
+    BUNDLE_MANIFEST_FILE,
+    build_bundle,
+    publish_pointer,
+    sha256_file,
+    sha256_url,
+)
 from cbng_trainer.common.consts import (
     THREASHOLDS_PLOT,
     FALSE_POSITIVES_PLOT,
     JOB_LOGS_END_MARKER,
 )
+from cbng_trainer.common.crossval import (
+    aggregate_threshold_tables,
+    format_threshold_tables,
+    parse_threshold_table,
+    split_edit_set_folds,
+)
+from cbng_trainer.common.editsets import split_edit_set
+from cbng_trainer.common.evaluation import (
+    build_evaluation_matrix,
+    format_evaluation_matrix,
+    summarise_threshold_table,
+)
+from cbng_trainer.common.files import SharedWorkspace, download_file, is_published, open_file, upload_file
+from cbng_trainer.common.mirror import (
+    materialise_edit_set_mirror,
+    mirror_lock,
+    mirror_path_for,
+    sync_edit_set_mirror,
+)
+from cbng_trainer.common.merge import merge_count_files, merge_fann_training_files
+from cbng_trainer.common.plan import StepPlan, parse_job_outputs
+from cbng_trainer.common.reports import TRIAL_INDEX_FILE, build_trial_index
+from cbng_trainer.common.sampling import SampleSpec, sample_edit_set
+from cbng_trainer.common.state import RunState
+from cbng_trainer.common.telemetry import build_telemetry_timeline, is_telemetry_line
 from cbng_trainer.common.toolforge import run_job
+from cbng_trainer.common.tracing import span, traced
 from cbng_trainer.common.utils import clean_job_name
 
 logger = logging.getLogger(__name__)
 
+# Everything `trial_run` writes to trialreport/
+TRIAL_REPORT_FILES = [
+    "debug.xml",
+    "details.txt",
+    "falsenegatives.txt",
+    "falsepositives.txt",
+    "report.txt",
+    "thresholdtable.txt",
+]
+
 
 class Steps:
     def __init__(
@@ -51,19 +100,40 @@ class Steps:
         trainer_image_name: str,
         core_image_name: str,
         upload_logs: str,
+        instance_name: Optional[str] = None,
+        run_state: Optional[RunState] = None,
+        max_hedges: int = 0,
+        telemetry_interval: Optional[int] = None,
+        shared_workspace: Optional[SharedWorkspace] = None,
+        plan: Optional[StepPlan] = None,
     ):
         self.target_name = target_name
+        self.instance_name = instance_name
         self.toolforge_user = toolforge_user
         self.trainer_image_name = trainer_image_name
         self.core_image_name = core_image_name
         self.upload_logs = upload_logs
+        self.run_state = run_state
+        # Every step only downloads inputs & uploads (create only) outputs, so a duplicate job is harmless
+        self.max_hedges = max_hedges
+        self.cancel_event = threading.Event()
+        self.telemetry_interval = telemetry_interval
+        # Intermediates are passed between steps on the tool's shared storage, rather than via the file api
+        self.shared_workspace = shared_workspace
+        # Nothing is executed (or recorded as state) when planning, each step is only added to the plan
+        self.plan = plan
         self._file_api_key = os.environ.get("FILE_API_KEY", "")
 
+    def cancel(self) -> None:
+        # Anything running is deleted by `run_job`, anything not yet started is skipped
+        self.cancel_event.set()
+
+    @traced("clean-log-lines", "step")
     def _clean_log_lines(self, logs: List[Tuple[datetime, str]]) -> List[str]:
         clean_lines = []
         for _, line in sorted(logs, key=lambda x: (x[0], x[1])):
-            # Remove the internal marker
-            if line.strip().endswith(f": {JOB_LOGS_END_MARKER}"):
+            # Remove the internal markers
+            if line.strip().endswith(f": {JOB_LOGS_END_MARKER}") or is_telemetry_line(line):
                 continue
 
             # This shouldn't happen as we load the headers in from disk, but just in case
@@ -74,32 +144,108 @@ class Steps:
 
         return clean_lines
 
+    @traced("upload-logs", "step", arg_names=("identifier",))
     def _upload_logs(self, identifier: str, logs: List[Tuple[datetime, str]]) -> None:
         if not logs:
             logger.debug(f"No logs to upload for {identifier}")
             return
 
-        if not self._file_api_key:
-            logger.error("Failed to find api key, skipping log upload")
-            return
-
-        # Note: we are not in a container at this point, so access the API directly,
-        #       this logic is the equivalent to `upload_file` in bash
         target_url = f'{self.upload_logs.rstrip("/")}/{identifier}.log'
         logger.info(f"Publishing logs to {target_url}")
-        r = requests.post(
-            target_url,
-            headers={"Authorization": f"Bearer {self._file_api_key}"},
-            data="\n".join(self._clean_log_lines(logs)),
-            timeout=60,
-        )
-        if r.status_code != 201:
-            logger.warning(f"Failed to upload logs for {identifier}: {r.status_code} ({r.text})")
+        if not upload_file(target_url, "\n".join(self._clean_log_lines(logs)), self._file_api_key, timeout=60):
+            logger.warning(f"Failed to upload logs for {identifier}")
+
+        if self.telemetry_interval:
+            telemetry = build_telemetry_timeline(logs)
+            logger.info(f"Resource usage for {identifier}: {telemetry['summary']}")
+            if not self.publish_json(f'{self.upload_logs.rstrip("/")}/{identifier}.telemetry.json', telemetry):
+                logger.warning(f"Failed to upload telemetry for {identifier}")
+
+    def _run_step(self, identifier: str, inputs: Optional[List[str]] = None, **kwargs) -> bool:
+        completed = self.run_state is not None and self.run_state.is_completed(identifier)
+        job_name = clean_job_name(self.target_name, postfix=identifier, instance=self.instance_name)
+        if self.plan is not None:
+            self.plan.record(
+                self.target_name,
+                self.instance_name,
+                identifier,
+                "job",
+                completed,
+                inputs=inputs or list(kwargs.get("download_file_urls", {}).values()),
+                outputs=parse_job_outputs(kwargs.get("run_commands", [])),
+                job_name=job_name,
+                image_name=kwargs.get("image_name"),
+            )
+            return True
+
+        if completed:
+            logger.info(f"Skipping {identifier}, already completed for {self.run_state.instance_name}")
+            return True
+
+        if self.cancel_event.is_set():
+            logger.warning(f"Skipping {identifier}, cancelled")
+            return False
+
+        logger.info(f"[{job_name}] Running {identifier} for {self.target_name} ({self.instance_name})")
+        if self.run_state:
+            self.run_state.record_started(identifier, job_name)
+
+        with span(identifier, "step", target_name=self.target_name, instance_name=self.instance_name):
+            success, logs = run_job(
+                target_user=self.toolforge_user,
+                job_name=job_name,
+                adopt_existing=self.run_state is not None,
+                job_identity=f"{self.target_name}\0{self.instance_name}\0{identifier}",
+                max_hedges=self.max_hedges,
+                cancel_event=self.cancel_event,
+                telemetry_interval=self.telemetry_interval,
+                mount="all" if self.shared_workspace else "none",
+                shared_workspace=self.shared_workspace,
+                **kwargs,
+            )
+            self._upload_logs(identifier, logs)
+
+        if self.run_state:
+            self.run_state.record_completed(identifier, success)
+        return success
+
+    def _run_local_step(
+        self,
+        identifier: str,
+        func: Callable[[], bool],
+        inputs: Optional[List[str]] = None,
+        outputs: Optional[List[str]] = None,
+    ) -> bool:
+        completed = self.run_state is not None and self.run_state.is_completed(identifier)
+        if self.plan is not None:
+            self.plan.record(
+                self.target_name, self.instance_name, identifier, "local", completed, inputs or [], outputs or []
+            )
+            return True
+
+        if completed:
+            logger.info(f"Skipping {identifier}, already completed for {self.run_state.instance_name}")
+            return True
+
+        if self.cancel_event.is_set():
+            logger.warning(f"Skipping {identifier}, cancelled")
+            return False
+
+        if self.run_state:
+            self.run_state.record_started(identifier)
+
+        with span(identifier, "step", target_name=self.target_name, instance_name=self.instance_name):
+            success = func()
+
+        if self.run_state:
+            self.run_state.record_completed(identifier, success)
+        return success
 
     def store_edit_sets(self, mapping: Dict[str, str]) -> bool:
         commands = []
         for download_url, upload_url in mapping.items():
-            tmp_path = f"/tmp/{uuid.uuid4().hex}"  # nosec: B108
+            # Stable between runs, so an adopted job matches what we would have created
+            tmp_path = f"/tmp/{uuid.uuid5(uuid.NAMESPACE_URL, download_url).hex}"  # nosec: B108
             commands.extend(
                 [
                     f"echo 'Downloading {download_url} to {tmp_path}'",
@@ -108,23 +254,157 @@ class Steps:
                 ]
             )
 
-        success, logs = run_job(
-            target_user=self.toolforge_user,
-            job_name=clean_job_name(self.target_name, postfix="store-edit-sets"),
+        return self._run_step(
+            "store-edit-sets",
+            inputs=list(mapping.keys()),
             image_name=self.core_image_name,
             run_commands=commands,
         )
-        self._upload_logs("store-edit-sets", logs)
-        return success
+
+    def store_mirrored_edit_sets(self, mapping: Dict[str, str], mirror_dir: str) -> bool:
+        # Note: this runs locally, syncing a mirror per group so only changed edits are written, then rebuilding the set
+        def _store_mirrored_edit_sets() -> bool:
+            Path(mirror_dir).mkdir(parents=True, exist_ok=True)
+            for download_url, upload_url in mapping.items():
+                mirror_path = mirror_path_for(mirror_dir, download_url)
+                with tempfile.TemporaryFile() as fh:
+                    with mirror_lock(mirror_path):
+                        if sync_edit_set_mirror(download_url, mirror_path) is None:
+                            return False
+                        edits = materialise_edit_set_mirror(mirror_path, fh)
+
+                    logger.info(f"Materialised {edits} edits from {mirror_path}")
+                    fh.seek(0)
+                    if not upload_file(upload_url, fh, self._file_api_key):
+                        return False
+            return True
+
+        return self._run_local_step(
+            "store-mirrored-edit-sets",
+            _store_mirrored_edit_sets,
+            inputs=list(mapping.keys()),
+            outputs=list(mapping.values()),
+        )
+
+    def store_sampled_edit_sets(self, mapping: Dict[str, str], spec: SampleSpec, seed: int) -> bool:
+        # Note: this runs locally, streaming the edit set from the review api & only holding the sample
+        def _store_sampled_edit_sets() -> bool:
+            for download_url, upload_url in mapping.items():
+                logger.info(f"Sampling {download_url} ({spec})")
+                with tempfile.TemporaryFile() as fh:
+                    with http_client.get(download_url, stream=True, timeout=600) as r:
+                        if r.status_code != 200:
+                            logger.error(f"Failed to download {download_url}: {r.status_code}")
+                            return False
+                        r.raw.decode_content = True
+                        summary = sample_edit_set(r.raw, fh, spec, seed)
+
+                    fh.seek(0)
+                    if not upload_file(upload_url, fh, self._file_api_key):
+                        return False
+
+                if not self.publish_json(
+                    f"{upload_url}.sample.json",
+                    {"source": download_url, "spec": spec._asdict(), "seed": seed} | summary,
+                ):
+                    return False
+            return True
+
+        return self._run_local_step(
+            "store-sampled-edit-sets",
+            _store_sampled_edit_sets,
+            inputs=list(mapping.keys()),
+            outputs=[url for upload_url in mapping.values() for url in (upload_url, f"{upload_url}.sample.json")],
+        )
+
+    def split_edit_set_shards(self, download_edit_set_url: str, upload_shard_urls: List[str], seed: int = 0) -> bool:
+        # Note: this runs locally, streaming the edit set once & writing every shard as we go
+        def _split_edit_set_shards() -> bool:
+            with contextlib.ExitStack() as stack:
+                source = stack.enter_context(open_file(download_edit_set_url))
+                if source is None:
+                    logger.error(f"Failed to download {download_edit_set_url}")
+                    return False
+
+                shard_files = [stack.enter_context(tempfile.TemporaryFile()) for _ in upload_shard_urls]
+                counts = split_edit_set(source, shard_files, seed)
+                logger.info(f"Split {sum(counts)} edits into {len(counts)} shards ({counts})")
+
+                for url, fh in zip(upload_shard_urls, shard_files):
+                    fh.seek(0)
+                    if not upload_file(url, fh, self._file_api_key):
+                        return False
+            return True
+
+        return self._run_local_step(
+            "split-edit-set-shards", _split_edit_set_shards, inputs=[download_edit_set_url], outputs=upload_shard_urls
+        )
+
+    def split_edit_set_folds(
+        self, download_edit_set_url: str, upload_fold_urls: List[Tuple[str, str]], seed: int = 0
+    ) -> bool:
+        # Note: this runs locally, streaming the edit set once & writing every fold as we go
+        def _split_edit_set_folds() -> bool:
+            with contextlib.ExitStack() as stack:
+                source = stack.enter_context(open_file(download_edit_set_url))
+                if source is None:
+                    logger.error(f"Failed to download {download_edit_set_url}")
+                    return False
+
+                train_files = [stack.enter_context(tempfile.TemporaryFile()) for _ in upload_fold_urls]
+                trial_files = [stack.enter_context(tempfile.TemporaryFile()) for _ in upload_fold_urls]
+                counts = split_edit_set_folds(source, train_files, trial_files, seed)
+                logger.info(f"Split {sum(counts)} edits into {len(counts)} folds ({counts})")
+
+                for (train_url, trial_url), train_file, trial_file in zip(upload_fold_urls, train_files, trial_files):
+                    for url, fh in ((train_url, train_file), (trial_url, trial_file)):
+                        fh.seek(0)
+                        if not upload_file(url, fh, self._file_api_key):
+                            return False
+            return True
+
+        return self._run_local_step(
+            "split-edit-set-folds",
+            _split_edit_set_folds,
+            inputs=[download_edit_set_url],
+            outputs=[url for fold_urls in upload_fold_urls for url in fold_urls],
+        )
+
+    def aggregate_fold_reports(self, fold_report_urls: List[str], upload_report_url: str) -> bool:
+        def _aggregate_fold_reports() -> bool:
+            tables = []
+            for report_url in fold_report_urls:
+                r = http_client.get(f"{report_url}/thresholdtable.txt", timeout=60)
+                if r.status_code != 200:
+                    logger.error(f"Failed to read {report_url}/thresholdtable.txt: {r.status_code}")
+                    return False
+                tables.append(parse_threshold_table(r.text.splitlines()))
+
+            means, stats = format_threshold_tables(aggregate_threshold_tables(tables))
+            return upload_file(
+                f"{upload_report_url}/thresholdtable.txt", means, self._file_api_key, timeout=60
+            ) and upload_file(f"{upload_report_url}/thresholdtable-stats.txt", stats, self._file_api_key, timeout=60)
+
+        return self._run_local_step(
+            "aggregate-fold-reports",
+            _aggregate_fold_reports,
+            inputs=[f"{report_url}/thresholdtable.txt" for report_url in fold_report_urls],
+            outputs=[f"{upload_report_url}/thresholdtable.txt", f"{upload_report_url}/thresholdtable-stats.txt"],
+        )
+
+    def publish_json(self, target_url: str, data: Dict[str, Any]) -> bool:
+        return upload_file(target_url, json.dumps(data, indent=2), self._file_api_key, timeout=60)
 
     def run_bayes_train(
         self,
         download_edit_set_url: str,
         upload_files_url: str,
+        shard: Optional[int] = None,
     ) -> bool:
-        success, logs = run_job(
-            target_user=self.toolforge_user,
-            job_name=clean_job_name(self.target_name, postfix="bayes-train"),
+        # Shards each produce their own counts, which are merged by `merge_bayes_train_shards`
+        postfix = "" if shard is None else f"-{shard}"
+        return self._run_step(
+            f"bayes-train{postfix}",
             image_name=self.core_image_name,
             download_file_urls={"edits.xml": download_edit_set_url},
             run_commands=[
@@ -132,21 +412,41 @@ class Steps:
                 "test -d data/ || mkdir data/",
                 "sed -i s'/, \"train_outputs\"//g' conf/cluebotng.conf",
                 "./cluebotng -c conf -m bayes_train -f edits.xml",
-                f'upload_file "data/main_bayes_train.dat" "{upload_files_url}/main_bayes_train.dat"',
-                f'upload_file "data/two_bayes_train.dat" "{upload_files_url}/two_bayes_train.dat"',
+                f'upload_file "data/main_bayes_train.dat" "{upload_files_url}/main_bayes_train{postfix}.dat"',
+                f'upload_file "data/two_bayes_train.dat" "{upload_files_url}/two_bayes_train{postfix}.dat"',
             ],
         )
-        self._upload_logs("bayes-train", logs)
-        return success
+
+    def merge_bayes_train_shards(self, upload_files_url: str, shards: int) -> bool:
+        # Note: this runs locally, summing each shard's word counts into a single training file per db
+        def _merge_bayes_train_shards() -> bool:
+            for name in ["main_bayes_train", "two_bayes_train"]:
+                with tempfile.TemporaryFile() as fh:
+                    if not merge_count_files([f"{upload_files_url}/{name}-{shard}.dat" for shard in range(shards)], fh):
+                        return False
+                    fh.seek(0)
+                    if not upload_file(f"{upload_files_url}/{name}.dat", fh, self._file_api_key):
+                        return False
+            return True
+
+        return self._run_local_step(
+            "merge-bayes-train-shards",
+            _merge_bayes_train_shards,
+            inputs=[
+                f"{upload_files_url}/{name}-{shard}.dat"
+                for name in ["main_bayes_train", "two_bayes_train"]
+                for shard in range(shards)
+            ],
+            outputs=[f"{upload_files_url}/main_bayes_train.dat", f"{upload_files_url}/two_bayes_train.dat"],
+        )
 
     def create_main_bayes_db(
         self,
         download_edit_set_url: str,
         upload_files_url: str,
     ) -> bool:
-        success, logs = run_job(
-            target_user=self.toolforge_user,
-            job_name=clean_job_name(self.target_name, postfix="create-main-bayes-db"),
+        return self._run_step(
+            "create-main-bayes-db",
             image_name=self.core_image_name,
             download_file_urls={
                 # Produced by store_edit_sets
@@ -160,17 +460,14 @@ class Steps:
                 f'upload_file "data/bayes.db" "{upload_files_url}/bayes.db"',
             ],
         )
-        self._upload_logs("create-main-bayes-db", logs)
-        return success
 
     def create_two_bayes_db(
         self,
         download_edit_set_url: str,
         upload_files_url: str,
     ) -> bool:
-        success, logs = run_job(
-            target_user=self.toolforge_user,
-            job_name=clean_job_name(self.target_name, postfix="create-two-bayes-db"),
+        return self._run_step(
+            "create-two-bayes-db",
             image_name=self.core_image_name,
             download_file_urls={
                 # Produced by store_edit_sets
@@ -184,20 +481,20 @@ class Steps:
                 f'upload_file "data/two_bayes.db" "{upload_files_url}/two_bayes.db"',
             ],
         )
-        self._upload_logs("create-two-bayes-db", logs)
-        return success
 
     def run_ann_train(
         self,
         download_edit_set_url: str,
         upload_files_url: str,
+        shard: Optional[int] = None,
     ) -> bool:
-        success, logs = run_job(
-            target_user=self.toolforge_user,
-            job_name=clean_job_name(self.target_name, postfix="ann-train"),
+        # Shards each produce their own rows, which are merged by `merge_ann_train_shards`
+        postfix = "" if shard is None else f"-{shard}"
+        return self._run_step(
+            f"ann-train{postfix}",
             image_name=self.core_image_name,
             download_file_urls={
-                # Produced by store_edit_sets
+                # Produced by store_edit_sets (or split_edit_set_shards)
                 "edits.xml": download_edit_set_url,
                 # Produced by `create_main_bayes_db` & `create_two_bayes_db`
                 "data/bayes.db": f"{upload_files_url}/bayes.db",
@@ -207,20 +504,35 @@ class Steps:
                 'echo "Executing ann_train"',
                 "sed -i s'/, \"train_outputs\"//g' conf/cluebotng.conf",
                 "./cluebotng -c conf -m ann_train -f edits.xml",
-                f'upload_file "data/main_ann_train.dat" "{upload_files_url}/main_ann_train.dat"',
+                f'upload_file "data/main_ann_train.dat" "{upload_files_url}/main_ann_train{postfix}.dat"',
             ],
         )
-        self._upload_logs("ann-train", logs)
-        return success
+
+    def merge_ann_train_shards(self, upload_files_url: str, shards: int) -> bool:
+        # Note: this runs locally, streaming each shard's rows into a single training file
+        def _merge_ann_train_shards() -> bool:
+            with tempfile.TemporaryFile() as fh:
+                if not merge_fann_training_files(
+                    [f"{upload_files_url}/main_ann_train-{shard}.dat" for shard in range(shards)], fh
+                ):
+                    return False
+                fh.seek(0)
+                return upload_file(f"{upload_files_url}/main_ann_train.dat", fh, self._file_api_key)
+
+        return self._run_local_step(
+            "merge-ann-train-shards",
+            _merge_ann_train_shards,
+            inputs=[f"{upload_files_url}/main_ann_train-{shard}.dat" for shard in range(shards)],
+            outputs=[f"{upload_files_url}/main_ann_train.dat"],
+        )
 
     def run_create_ann(
         self,
         download_edit_set_url: str,
         upload_files_url: str,
     ) -> bool:
-        success, logs = run_job(
-            target_user=self.toolforge_user,
-            job_name=clean_job_name(self.target_name, postfix="create-ann"),
+        return self._run_step(
+            "create-ann",
             image_name=self.core_image_name,
             download_file_urls={
                 # Produced by store_edit_sets
@@ -234,8 +546,6 @@ class Steps:
                 f'upload_file "data/main_ann.fann" "{upload_files_url}/main_ann.fann"',
             ],
         )
-        self._upload_logs("create-ann", logs)
-        return success
 
     def run_trial_report(
         self,
@@ -247,25 +557,261 @@ class Steps:
             "test -d trialreport/ || mkdir trialreport/",
             "./cluebotng -c conf -m trial_run -f edits.xml",
         ]
-        for file_name in [
-            "debug.xml",
-            "details.txt",
-            "falsenegatives.txt",
-            "falsepositives.txt",
-            "report.txt",
-            "thresholdtable.txt",
-        ]:
+        for file_name in TRIAL_REPORT_FILES:
             run_commands.append(f'upload_file "trialreport/{file_name}" "{upload_report_url}/{file_name}"')
 
-        success, logs = run_job(
-            target_user=self.toolforge_user,
-            job_name=clean_job_name(self.target_name, postfix="trial-report"),
+        return self._run_step(
+            "trial-report",
             image_name=self.core_image_name,
             download_file_urls={"edits.xml": download_edit_set_url},
             run_commands=run_commands,
         )
-        self._upload_logs("trial-report", logs)
-        return success
+
+    def run_trial_evaluation(
+        self,
+        artifacts_url: str,
+        trials: Dict[str, str],
+        upload_reports_url: str,
+        parallelism: int = 2,
+    ) -> bool:
+        # One pod loads the artifacts once, then trials each set in its own directory (sharing conf & data)
+        run_commands = [
+            f'echo "Executing trial_run for {len(trials)} trial sets ({parallelism} at once)"',
+            "base_dir=$(pwd)",
+            """
+function run_trial() {
+    name=$1
+    (
+        set +e
+        set -o pipefail
+        cd "evaluation/${name}"
+        ln -sfn "${base_dir}/conf" conf
+        ln -sfn "${base_dir}/data" data
+        mkdir -p trialreport
+        "${base_dir}/cluebotng" -c conf -m trial_run -f edits.xml 2>&1 | sed -u "s/^/[${name}] /"
+        echo $? > exit_code
+    )
+}
+
+# Only our trials count, other background jobs (e.g. the telemetry sampler) never finish
+function running_trials() {
+    running=0
+    for pid in "${pids[@]}";
+    do
+        if kill -0 "${pid}" 2>/dev/null; then running=$((running + 1)); fi
+    done
+}
+""",
+            "pids=()",
+        ]
+        for name in trials:
+            run_commands.extend(
+                [
+                    f'run_trial "{name}" &',
+                    "pids+=($!)",
+                    "running_trials",
+                    f'while [ "${{running}}" -ge {parallelism} ]; do wait -n || true; running_trials; done',
+                ]
+            )
+        if trials:
+            run_commands.append('wait "${pids[@]}" || true')
+        run_commands.append("failed=0")
+
+        # Upload what succeeded, even if others failed
+        for name in trials:
+            run_commands.append(f'if [ "$(cat "evaluation/{name}/exit_code")" == "0" ]; then')
+            for file_name in TRIAL_REPORT_FILES:
+                run_commands.append(
+                    f'upload_file "evaluation/{name}/trialreport/{file_name}" "{upload_reports_url}/{name}/{file_name}"'
+                )
+            run_commands.extend([f'else echo "Trial {name} failed"; failed=1', "fi"])
+        run_commands.append('test "${failed}" == "0"')
+
+        return self._run_step(
+            "trial-evaluation",
+            image_name=self.core_image_name,
+            download_file_urls={
+                # Produced by `create_main_bayes_db`, `create_two_bayes_db` & `run_create_ann`
+                "data/bayes.db": f"{artifacts_url}/bayes.db",
+                "data/two_bayes.db": f"{artifacts_url}/two_bayes.db",
+                "data/main_ann.fann": f"{artifacts_url}/main_ann.fann",
+            }
+            | {f"evaluation/{name}/edits.xml": download_url for name, download_url in trials.items()},
+            run_commands=run_commands,
+            configure_upload_file_helper=True,
+        )
+
+    def create_evaluation_summary(self, upload_reports_url: str, trial_names: List[str]) -> bool:
+        # Note: this runs locally, reducing each trial's thresholdtable into a single matrix
+        def _create_evaluation_summary() -> bool:
+            tables = {}
+            for name in trial_names:
+                r = http_client.get(f"{upload_reports_url}/{name}/thresholdtable.txt", timeout=60)
+                if r.status_code != 200:
+                    logger.warning(f"No thresholdtable for {name}: {r.status_code}")
+                    tables[name] = None
+                    continue
+                tables[name] = parse_threshold_table(r.text.splitlines())
+
+            matrix = build_evaluation_matrix(tables)
+            logger.info(f"Evaluation summary:\n{format_evaluation_matrix(matrix)}")
+            return self.publish_json(f"{upload_reports_url}/summary.json", matrix) and upload_file(
+                f"{upload_reports_url}/summary.txt", format_evaluation_matrix(matrix), self._file_api_key, timeout=60
+            )
+
+        return self._run_local_step(
+            "evaluation-summary",
+            _create_evaluation_summary,
+            inputs=[f"{upload_reports_url}/{name}/thresholdtable.txt" for name in trial_names],
+            outputs=[f"{upload_reports_url}/summary.json", f"{upload_reports_url}/summary.txt"],
+        )
+
+    def create_model_bundle(
+        self,
+        artifacts_url: str,
+        upload_bundle_url: str,
+        edit_set_urls: Dict[str, str],
+        parameters: Dict[str, Any],
+        trial_report_url: Optional[str] = None,
+    ) -> bool:
+        # Note: this runs locally, packing the deployable artifacts into a single checksummed object
+        def _create_model_bundle() -> bool:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                files = {}
+                for name in BUNDLE_FILES:
+                    path = (Path(tmp_dir) / name).as_posix()
+                    with open(path, "wb") as fh:
+                        if not download_file(f"{artifacts_url}/{name}", fh):
+                            return False
+                    files[name] = path
+
+                edit_sets = {}
+                for name, url in edit_set_urls.items():
+                    if (digest := sha256_url(url)) is None:
+                        return False
+                    # Workspace only edit sets are removed with the workspace, so there is nothing to link to
+                    edit_sets[name] = (
+                        {"url": url, "sha256": digest}
+                        if is_published(url)
+                        else {"workspace_only": True, "sha256": digest}
+                    )
+
+                trial = None
+                if trial_report_url:
+                    r = http_client.get(f"{trial_report_url}/thresholdtable.txt", timeout=60)
+                    if r.status_code != 200:
+                        logger.error(f"Failed to read {trial_report_url}/thresholdtable.txt: {r.status_code}")
+                        return False
+                    trial = {
+                        "report_url": trial_report_url,
+                        "best_detection_within_false_positive": summarise_threshold_table(
+                            parse_threshold_table(r.text.splitlines())
+                        ),
+                    }
+
+                manifest = {
+                    "target_name": self.target_name,
+                    "instance_name": self.instance_name,
+                    "created_at": datetime.now(tz=timezone.utc).isoformat(),
+                    "core_image_name": self.core_image_name,
+                    "parameters": parameters,
+                    "edit_sets": edit_sets,
+                    "files": {
+                        name: {"sha256": sha256_file(path), "size": os.path.getsize(path)}
+                        for name, path in files.items()
+                    },
+                    "trial": trial,
+                }
+
+                bundle_path = (Path(tmp_dir) / BUNDLE_FILE).as_posix()
+                with open(bundle_path, "wb") as fh:
+                    build_bundle(files, manifest, fh)
+
+                # The published manifest also covers the bundle itself, which the inner one can not
+                manifest["bundle"] = {
+                    "url": f"{upload_bundle_url}/{BUNDLE_FILE}",
+                    "sha256": sha256_file(bundle_path),
+                    "size": os.path.getsize(bundle_path),
+                }
+                with open(bundle_path, "rb") as fh:
+                    if not upload_file(f"{upload_bundle_url}/{BUNDLE_FILE}", fh, self._file_api_key):
+                        return False
+                return self.publish_json(f"{upload_bundle_url}/{BUNDLE_MANIFEST_FILE}", manifest)
+
+        return self._run_local_step(
+            "model-bundle",
+            _create_model_bundle,
+            inputs=[f"{artifacts_url}/{name}" for name in BUNDLE_FILES]
+            + list(edit_set_urls.values())
+            + ([f"{trial_report_url}/thresholdtable.txt"] if trial_report_url else []),
+            outputs=[f"{upload_bundle_url}/{BUNDLE_FILE}", f"{upload_bundle_url}/{BUNDLE_MANIFEST_FILE}"],
+        )
+
+    def publish_latest_good(self, upload_bundle_url: str, pointer_url: str) -> bool:
+        # Note: this runs locally, pointing the target at this instance's bundle
+        def _publish_latest_good() -> bool:
+            r = http_client.get(f"{upload_bundle_url}/{BUNDLE_MANIFEST_FILE}", timeout=60)
+            if r.status_code != 200:
+                logger.error(f"Failed to read {upload_bundle_url}/{BUNDLE_MANIFEST_FILE}: {r.status_code}")
+                return False
+
+            manifest = r.json()
+            generation = publish_pointer(
+                pointer_url,
+                {
+                    "target_name": self.target_name,
+                    "instance_name": self.instance_name,
+                    "published_at": datetime.now(tz=timezone.utc).isoformat(),
+                    "manifest_url": f"{upload_bundle_url}/{BUNDLE_MANIFEST_FILE}",
+                    "bundle": manifest["bundle"],
+                },
+                self._file_api_key,
+            )
+            if generation is None:
+                logger.error(f"Failed to publish {pointer_url}")
+                return False
+            logger.info(f"Published {self.instance_name} as generation {generation} of {pointer_url}")
+            return True
+
+        return self._run_local_step(
+            "latest-good",
+            _publish_latest_good,
+            inputs=[f"{upload_bundle_url}/{BUNDLE_MANIFEST_FILE}"],
+            # The generation is only known once published
+            outputs=[pointer_url],
+        )
+
+    def create_trial_index(self, upload_report_url: str) -> bool:
+        # Note: this runs locally, streaming the trial outputs back from the file api
+        def _create_trial_index() -> bool:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                index_path = Path(tmp_dir) / TRIAL_INDEX_FILE
+                if not build_trial_index(upload_report_url, index_path.as_posix()):
+                    return False
+
+                with index_path.open("rb") as fh:
+                    return upload_file(f"{upload_report_url}/{TRIAL_INDEX_FILE}", fh, self._file_api_key)
+
+        return self._run_local_step(
+            "create-trial-index",
+            _create_trial_index,
+            inputs=[
+                f"{upload_report_url}/{file_name}"
+                for file_name in ["debug.xml", "falsepositives.txt", "falsenegatives.txt"]
+            ],
+            outputs=[f"{upload_report_url}/{TRIAL_INDEX_FILE}"],
+        )
+
+    def mark_smoke_result(self, upload_report_url: str, sample: str, sample_seed: int) -> bool:
+        # Note: this runs locally, flagging a sampled trial so it is never mistaken for a full one
+        return self._run_local_step(
+            "mark-smoke-result",
+            lambda: self.publish_json(
+                f"{upload_report_url}/smoke.json", {"smoke": True, "sample": sample, "sample_seed": sample_seed}
+            ),
+            inputs=[f"{upload_report_url}/thresholdtable.txt"],
+            outputs=[f"{upload_report_url}/smoke.json"],
+        )
 
     def create_plots(self, upload_report_url: str) -> bool:
         run_commands = []
@@ -288,9 +834,8 @@ class Steps:
                 ]
             )
 
-        success, logs = run_job(
-            target_user=self.toolforge_user,
-            job_name=clean_job_name(self.target_name, postfix="create-plots"),
+        return self._run_step(
+            "create-plots",
             image_name=self.trainer_image_name,  # Note: trainer image for gnuplot rather than core image
             download_file_urls={
                 "thresholdtable.txt": f"{upload_report_url}/thresholdtable.txt",
@@ -298,5 +843,3 @@ class Steps:
             run_commands=run_commands,
             configure_upload_file_helper=True,
         )
-        self._upload_logs("create-plots", logs)
-        return success
@@ -0,0 +1,98 @@
+"""
+MIT License
+
+Copyright (c) 2025 Damian Zaremba
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from cbng_trainer.common.consts import JOB_TELEMETRY_MARKER
+
+logger = logging.getLogger(__name__)
+
+
+def is_telemetry_line(line: str) -> bool:
+    return f"{JOB_TELEMETRY_MARKER} " in line
+
+
+def parse_telemetry_line(line: str) -> Optional[Dict[str, Any]]:
+    _, marker, payload = line.partition(f"{JOB_TELEMETRY_MARKER} ")
+    if not marker:
+        return None
+    try:
+        return json.loads(payload)
+    except ValueError:
+        logger.debug(f"Ignoring malformed telemetry: {payload}")
+        return None
+
+
+def _rate(current: Dict[str, Any], previous: Dict[str, Any], key: str, scale: float = 1) -> Optional[float]:
+    elapsed = current["time"] - previous["time"]
+    if elapsed <= 0 or current.get(key) is None or previous.get(key) is None:
+        return None
+    return (current[key] - previous[key]) / scale / elapsed
+
+
+def build_telemetry_timeline(logs: List[Tuple[datetime, str]]) -> Dict[str, Any]:
+    samples = sorted(
+        (sample for _, line in logs if (sample := parse_telemetry_line(line)) is not None),
+        key=lambda sample: sample["time"],
+    )
+
+    # The counters are cumulative, so each point carries the rate since the previous sample
+    timeline = []
+    for previous, current in zip([None] + samples[:-1], samples):
+        point = {
+            "time": current["time"],
+            "memory_bytes": current.get("memory_bytes"),
+            "disk_used_kb": current.get("disk_used_kb"),
+        }
+        if previous is not None:
+            point["cpu_cores"] = _rate(current, previous, "cpu_usec", scale=1_000_000)
+            point["rx_bytes_per_second"] = _rate(current, previous, "rx_bytes")
+            point["tx_bytes_per_second"] = _rate(current, previous, "tx_bytes")
+        timeline.append(point)
+
+    summary: Dict[str, Any] = {"samples": len(samples)}
+    if samples:
+        first, last = samples[0], samples[-1]
+        cpu_cores = [point["cpu_cores"] for point in timeline if point.get("cpu_cores") is not None]
+        memory = [
+            value
+            for sample in samples
+            for value in (sample.get("memory_bytes"), sample.get("memory_peak_bytes"))
+            if value is not None
+        ]
+        disk = [sample["disk_used_kb"] for sample in samples if sample.get("disk_used_kb") is not None]
+        summary |= {
+            "duration_seconds": last["time"] - first["time"],
+            "mean_cpu_cores": _rate(last, first, "cpu_usec", scale=1_000_000),
+            "max_cpu_cores": max(cpu_cores, default=None),
+            "peak_memory_bytes": max(memory, default=None),
+            "peak_disk_used_kb": max(disk, default=None),
+            "rx_bytes": last["rx_bytes"] - first["rx_bytes"],
+            "tx_bytes": last["tx_bytes"] - first["tx_bytes"],
+        }
+
+    return {"summary": summary, "timeline": timeline}
@@ -1,23 +1,213 @@
+import collections
+import contextlib
 import functools
+import hashlib
 import logging
+import math
 import re
+import threading
 import time
 from datetime import datetime, timedelta, timezone
-from typing import Optional, Dict, List, Any, Tuple, Union
+from typing import TYPE_CHECKING, Optional, Dict, List, Any, Tuple, Union
 
 from requests.exceptions import HTTPError, ReadTimeout
-from toolforge_weld.api_client import ToolforgeClient
-from toolforge_weld.config import load_config
-from toolforge_weld.kubernetes_config import Kubeconfig
 
 from cbng_trainer.common.consts import JOB_LOGS_END_MARKER
-from cbng_trainer.common.utils import generate_execution_script, generate_command_command
+from cbng_trainer.common.files import SharedWorkspace
+from cbng_trainer.common.tracing import span, traced, tracing_enabled
+from cbng_trainer.common.utils import (
+    generate_execution_script,
+    generate_command_command,
+    job_identity_label,
+    parse_job_identity_label,
+)
+
+if TYPE_CHECKING:
+    from toolforge_weld.api_client import ToolforgeClient
 
 logger = logging.getLogger(__name__)
 
+# Optional cap on the number of jobs this process has running at once
+_job_slots: Optional[threading.BoundedSemaphore] = None
+
+
+def configure_job_slots(slots: Optional[int]) -> None:
+    global _job_slots
+    _job_slots = threading.BoundedSemaphore(slots) if slots else None
+
+
+# Set from a signal handler, so plain flags rather than anything which takes a lock
+_shutdown_requested = False
+_delete_jobs_on_shutdown = False
+
+
+def _is_cancelled(cancel_event: Optional[threading.Event]) -> bool:
+    return _shutdown_requested or (cancel_event is not None and cancel_event.is_set())
+
+
+def request_shutdown(delete_jobs: bool) -> None:
+    # Only flags the workers, which stop waiting & (if asked to) delete their own jobs,
+    # otherwise running jobs are left for a resumed run to adopt (e.g. when we are evicted)
+    global _shutdown_requested, _delete_jobs_on_shutdown
+    _delete_jobs_on_shutdown = _delete_jobs_on_shutdown or delete_jobs
+    _shutdown_requested = True
+
+
+def shutdown_requested() -> bool:
+    return _shutdown_requested
+
+
+# When we are a coordinator job, deleting it is either the parent cancelling the run or an eviction (both a SIGTERM),
+# the parent flags a cancel (with the time) in an envvar named after the coordinator before deleting it
+_coordinator_job: Optional[Tuple[str, str, datetime]] = None
+_coordinator_cancelled: Optional[bool] = None
+_coordinator_cancelled_lock = threading.Lock()
+
+
+def configure_coordinator_job(target_user: str, job_name: Optional[str]) -> None:
+    global _coordinator_job, _coordinator_cancelled
+    with _coordinator_cancelled_lock:
+        _coordinator_job = (target_user, job_name, datetime.now(tz=timezone.utc)) if job_name else None
+        _coordinator_cancelled = None
+
+
+def _cancel_envvar_name(job_name: str) -> str:
+    return f"CBNG_TRAINER_CANCEL_{hashlib.sha256(job_name.encode('utf-8')).hexdigest()[:16].upper()}"
+
+
+def _flag_cancel(target_user: str, job_name: str) -> None:
+    create_or_update_envvar(target_user, _cancel_envvar_name(job_name), datetime.now(tz=timezone.utc).isoformat())
+
+
+def _was_cancelled_by_parent() -> bool:
+    global _coordinator_cancelled
+    # Checked by each worker as it notices the shutdown (never the signal handler), but only looked up once
+    with _coordinator_cancelled_lock:
+        if _coordinator_cancelled is None:
+            _coordinator_cancelled = False
+            if _coordinator_job is not None:
+                target_user, job_name, started = _coordinator_job
+                envvar_name = _cancel_envvar_name(job_name)
+                api = _client(target_user)
+                try:
+                    resp = api.get(f"/envvars/v1/tool/{target_user}/envvars/{envvar_name}")
+                except HTTPError as e:
+                    if e.response is None or e.response.status_code != 404:
+                        logger.error(f"Failed to get envvar: {e}")
+                else:
+                    # Anything older is left over from cancelling a previous coordinator of the same name
+                    try:
+                        _coordinator_cancelled = datetime.fromisoformat(resp["envvar"]["value"]) >= started
+                    except ValueError:
+                        pass
+                    if _coordinator_cancelled:
+                        _delete_envvar(target_user, envvar_name)
+        return _coordinator_cancelled
+
+
+def _cancel_job(target_user: str, name: str, propagate_cancel: bool = False) -> None:
+    if _shutdown_requested and not _delete_jobs_on_shutdown and not _was_cancelled_by_parent():
+        logger.warning(f"[{name}] Shutting down, leaving job to be adopted on resume")
+        return
+    if propagate_cancel:
+        # So the coordinator deletes its own jobs, rather than taking this as an eviction
+        _flag_cancel(target_user, name)
+    _delete_job(target_user, name)
+
+
+@contextlib.contextmanager
+def _job_slot(job_name: str, cancel_event: Optional[threading.Event] = None):
+    job_slots = _job_slots
+    if job_slots is None:
+        yield True
+        return
+
+    if not job_slots.acquire(blocking=False):
+        logger.info(f"[{job_name}] Waiting for a free job slot")
+        with span("wait-for-slot", "job", job_name=job_name):
+            acquired = False
+            while not acquired and not _is_cancelled(cancel_event):
+                acquired = job_slots.acquire(timeout=1)
+        if not acquired:
+            yield False
+            return
+    try:
+        yield True
+    finally:
+        job_slots.release()
+
+
+def _acquire_hedge_slot(hedge_slots: List[threading.BoundedSemaphore]) -> bool:
+    # Hedges hold quota like any other job, but only ever take a slot which is free right now
+    job_slots = _job_slots
+    if job_slots is None:
+        return True
+    if not job_slots.acquire(blocking=False):
+        return False
+    hedge_slots.append(job_slots)
+    return True
+
+
+def _release_hedge_slots(hedge_slots: List[threading.BoundedSemaphore]) -> None:
+    while hedge_slots:
+        hedge_slots.pop().release()
+
+
+# Recent time from job creation to the pod running, used to decide when a pending job is worth hedging.
+# Note: a coordinator job only runs a handful of steps, so the history is carried between runs by the pipeline
+_start_latencies: collections.deque = collections.deque(maxlen=200)
+_start_latencies_recorded = 0
+_start_latencies_lock = threading.Lock()
+_HEDGE_MIN_SAMPLES = 20
+_HEDGE_MIN_SECONDS = 30
+_HEDGE_FALLBACK_SECONDS = 120
+
+
+def _record_start_latency(seconds: float) -> None:
+    global _start_latencies_recorded
+    with _start_latencies_lock:
+        _start_latencies.append(seconds)
+        _start_latencies_recorded += 1
+
+
+def load_start_latencies(latencies: List[float]) -> None:
+    # Only tops up a process without enough history of its own, a long running one is more current
+    with _start_latencies_lock:
+        if len(_start_latencies) < _HEDGE_MIN_SAMPLES:
+            _start_latencies.extendleft(reversed(latencies[-(_start_latencies.maxlen - len(_start_latencies)) :]))
+
+
+def start_latencies() -> Tuple[int, List[float]]:
+    # How many have been recorded by this process (so a caller can tell if there are new ones) & the current history
+    with _start_latencies_lock:
+        return _start_latencies_recorded, list(_start_latencies)
+
+
+def _hedge_threshold() -> float:
+    with _start_latencies_lock:
+        latencies = sorted(_start_latencies)
+    if len(latencies) < _HEDGE_MIN_SAMPLES:
+        return _HEDGE_FALLBACK_SECONDS
+    # p95, but never so low that ordinary scheduling jitter triggers a duplicate
+    return max(latencies[math.ceil(len(latencies) * 0.95) - 1], _HEDGE_MIN_SECONDS)
+
+
+def _hedge_job_name(job_name: str, hedge: int) -> str:
+    suffix = f"-h{hedge}"
+    if len(job_name) + len(suffix) <= 50:
+        return f"{job_name}{suffix}"
+    # Keep the name unique when truncating, as the tail is usually the distinguishing part
+    job_hash = hashlib.sha256(job_name.encode("utf-8")).hexdigest()[:8]
+    return f"{job_name[:50 - len(suffix) - len(job_hash) - 1].rstrip('-')}-{job_hash}{suffix}"
+
 
 @functools.lru_cache(maxsize=None)
 def _client_config(target_user: str):
+    # Imported here as the kubernetes config machinery is slow to load & not needed to plan or complete commands
+    from toolforge_weld.api_client import ToolforgeClient
+    from toolforge_weld.config import load_config
+    from toolforge_weld.kubernetes_config import Kubeconfig
+
     config = load_config(target_user)
     return ToolforgeClient(
         server=f"{config.api_gateway.url}",
@@ -26,13 +216,33 @@ def _client_config(target_user: str):
     )
 
 
+class _TracedClient:
+    def __init__(self, api: "ToolforgeClient"):
+        self._api = api
+
+    def __getattr__(self, method: str):
+        func = getattr(self._api, method)
+
+        def _call(url: str, *args, **kwargs):
+            with span(f"{method.upper()} {url.split('/')[1]}", "api", url=url):
+                return func(url, *args, **kwargs)
+
+        return _call
+
+
+def _client(target_user: str):
+    api = _client_config(target_user)
+    return _TracedClient(api) if tracing_enabled() else api
+
+
 def _run_job(
     target_user: str,
     job_name: str,
     image: str,
     command: str,
+    mount: str = "none",
 ) -> bool:
-    api = _client_config(target_user)
+    api = _client(target_user)
     try:
         api.post(
             f"/jobs/v1/tool/{target_user}/jobs/",
@@ -40,7 +250,7 @@ def _run_job(
                 "name": job_name,
                 "imagename": image.replace("tools-harbor.wmcloud.org/", ""),  # host is implicit
                 "cmd": command,
-                "mount": "none",
+                "mount": mount,
             },
         )
     except HTTPError as e:
@@ -50,7 +260,7 @@ def _run_job(
 
 
 def _delete_job(target_user: str, name: str):
-    api = _client_config(target_user)
+    api = _client(target_user)
     try:
         api.delete(f"/jobs/v1/tool/{target_user}/jobs/{name}/")
     except HTTPError as e:
@@ -58,8 +268,54 @@ def _delete_job(target_user: str, name: str):
             logger.warning(f"Failed to delete {name}: {e}")
 
 
+def _get_job(target_user: str, name: str) -> Optional[Dict[str, Any]]:
+    api = _client(target_user)
+    try:
+        resp = api.get(f"/jobs/v1/tool/{target_user}/jobs/{name}/")
+    except HTTPError as e:
+        if e.response is None or e.response.status_code != 404:
+            logger.error(f"Failed to get {name}: {e}")
+        return None
+    return resp["job"]
+
+
+def _is_same_job(job: Dict[str, Any], command: str, job_identity: Optional[str]) -> bool:
+    # The same step of the same instance, even if how it is run has since changed (e.g. an updated image)
+    if job_identity is not None and parse_job_identity_label(job.get("cmd", "")) == job_identity_label(job_identity):
+        return True
+    return job.get("cmd", command) == command
+
+
+def _delete_job_and_wait(target_user: str, name: str, timeout: int = 120) -> bool:
+    # The name is only free once the job is gone, not as soon as the delete is accepted
+    _delete_job(target_user, name)
+    deleted_time = time.time()
+    while _get_job(target_user, name) is not None:
+        if deleted_time + timeout < time.time():
+            logger.error(f"[{name}] Timed out waiting for the job to be deleted")
+            return False
+        time.sleep(1)
+    return True
+
+
+def _get_existing_job(target_user: str, names: List[str]) -> Optional[Dict[str, Any]]:
+    for name in names:
+        if (job := _get_job(target_user, name)) is not None:
+            return job | {"name": name}
+    return None
+
+
+def _job_last_run_time(job: Dict[str, Any]) -> Optional[datetime]:
+    if match := re.match(r"^Last run at (\S+)\.\s", job["status_long"]):
+        try:
+            return datetime.fromisoformat(match.group(1))
+        except ValueError:
+            pass
+    return None
+
+
 def _job_was_successful(target_user: str, name: str) -> bool:
-    api = _client_config(target_user)
+    api = _client(target_user)
     try:
         resp = api.get(f"/jobs/v1/tool/{target_user}/jobs/{name}/")
     except HTTPError as e:
@@ -69,7 +325,7 @@ def _job_was_successful(target_user: str, name: str) -> bool:
 
 
 def _job_is_running(target_user: str, name: str) -> bool:
-    api = _client_config(target_user)
+    api = _client(target_user)
     try:
         resp = api.get(f"/jobs/v1/tool/{target_user}/jobs/{name}/")
     except HTTPError as e:
@@ -81,7 +337,7 @@ def _job_is_running(target_user: str, name: str) -> bool:
 
 
 def _wait_for_job_to_start(target_user: str, job_name: str) -> Optional[Union[datetime, bool]]:
-    api = _client_config(target_user)
+    api = _client(target_user)
     try:
         resp = api.get(f"/jobs/v1/tool/{target_user}/jobs/{job_name}/")
     except HTTPError as e:
@@ -98,7 +354,7 @@ def _wait_for_job_to_start(target_user: str, job_name: str) -> Optional[Union[da
 
 
 def _read_logs(target_user: str, job_name: str, start_time: datetime) -> List[Dict[str, Any]]:
-    api = _client_config(target_user)
+    api = _client(target_user)
 
     logs = []
     try:
@@ -114,25 +370,34 @@ def _read_logs(target_user: str, job_name: str, start_time: datetime) -> List[Di
 
 
 def _peak_at_logs(target_user: str, job_name: str, start_time: datetime, seen_logs: List[Tuple[datetime, str]]):
+    # Lookups against the list are linear, which is quadratic per poll on chatty jobs
+    seen = set(seen_logs)
     for log in _read_logs(target_user, job_name, start_time):
         # Work around T410055
         if log["pod"] == "nopod" and log["container"] == "nocontainer":
             continue
 
         log_line = f'{log["datetime"].isoformat()}: {log["message"]}'
-        if (log["datetime"], log_line) in seen_logs:
+        if (log["datetime"], log_line) in seen:
             continue
         # Emit what we have not yet emitted "sad streaming"
         logger.info(f"[{job_name}] {log['message']}")
+        seen.add((log["datetime"], log_line))
         seen_logs.append((log["datetime"], log_line))
 
 
+@traced("wait-for-logs-end-marker", "job", arg_names=("job_name",))
 def _wait_for_logs_end_marker(
-    target_user: str, job_name: str, start_time: datetime, seen_logs: List[Tuple[datetime, str]], timeout: int = 300
+    target_user: str,
+    job_name: str,
+    start_time: datetime,
+    seen_logs: List[Tuple[datetime, str]],
+    timeout: int = 300,
+    cancel_event: Optional[threading.Event] = None,
 ):
     waiting_start_time = time.time()
     checked_up_to = 0
-    while True:
+    while not _is_cancelled(cancel_event):
         _peak_at_logs(target_user, job_name, start_time, seen_logs)
 
         for _, line in seen_logs[checked_up_to:]:
@@ -159,47 +424,200 @@ def run_job(
     start_timeout: int = 300,
     wait_for_job_logs_marker: bool = True,
     configure_upload_file_helper: bool = None,
+    adopt_existing: bool = False,
+    max_hedges: int = 0,
+    hedge_after: Optional[float] = None,
+    cancel_event: Optional[threading.Event] = None,
+    telemetry_interval: Optional[int] = None,
+    mount: str = "none",
+    shared_workspace: Optional[SharedWorkspace] = None,
+    propagate_cancel: bool = False,
+    job_identity: Optional[str] = None,
 ) -> Tuple[bool, List[Tuple[datetime, str]]]:
-    execution_script = generate_execution_script(
-        download_file_urls=download_file_urls,
-        run_commands=run_commands,
-        configure_upload_file_helper=configure_upload_file_helper is True
-        or (
-            configure_upload_file_helper is None
-            and run_commands is not None
-            and any(run_command.strip().startswith("upload_file") for run_command in run_commands)
-        ),
-    )
+    with span("run_job", "job", job_name=job_name), _job_slot(job_name, cancel_event) as acquired:
+        if not acquired:
+            logger.warning(f"[{job_name}] Cancelled whilst waiting for a job slot")
+            return False, []
+        return _execute_job(
+            target_user=target_user,
+            job_name=job_name,
+            image_name=image_name,
+            download_file_urls=download_file_urls,
+            run_commands=run_commands,
+            wait_for_completion=wait_for_completion,
+            run_timeout=run_timeout,
+            start_timeout=start_timeout,
+            wait_for_job_logs_marker=wait_for_job_logs_marker,
+            configure_upload_file_helper=configure_upload_file_helper,
+            adopt_existing=adopt_existing,
+            max_hedges=max_hedges,
+            hedge_after=hedge_after,
+            cancel_event=cancel_event,
+            telemetry_interval=telemetry_interval,
+            mount=mount,
+            shared_workspace=shared_workspace,
+            propagate_cancel=propagate_cancel,
+            job_identity=job_identity,
+        )
 
-    logger.info(f"[{job_name}] Creating job")
-    job_request_time = datetime.now(timezone.utc)
-    if not _run_job(
-        target_user=target_user,
-        job_name=job_name,
-        image=image_name,
-        command=generate_command_command(execution_script, run_timeout),
-    ):
+
+def _execute_job(
+    target_user: str,
+    job_name: str,
+    image_name: str,
+    download_file_urls: Optional[Dict[str, str]] = None,
+    run_commands: Optional[List[str]] = None,
+    wait_for_completion: bool = True,
+    run_timeout: int = 7200,
+    start_timeout: int = 300,
+    wait_for_job_logs_marker: bool = True,
+    configure_upload_file_helper: bool = None,
+    adopt_existing: bool = False,
+    max_hedges: int = 0,
+    hedge_after: Optional[float] = None,
+    cancel_event: Optional[threading.Event] = None,
+    telemetry_interval: Optional[int] = None,
+    mount: str = "none",
+    shared_workspace: Optional[SharedWorkspace] = None,
+    propagate_cancel: bool = False,
+    job_identity: Optional[str] = None,
+) -> Tuple[bool, List[Tuple[datetime, str]]]:
+    if _is_cancelled(cancel_event):
+        logger.warning(f"[{job_name}] Cancelled before starting")
         return False, []
 
-    if not wait_for_completion:
-        return True, []
+    with span("generate-script", "job"):
+        execution_script = generate_execution_script(
+            download_file_urls=download_file_urls,
+            run_commands=run_commands,
+            configure_upload_file_helper=configure_upload_file_helper is True
+            or (
+                configure_upload_file_helper is None
+                and run_commands is not None
+                and any(run_command.strip().startswith("upload_file") for run_command in run_commands)
+            ),
+            telemetry_interval=telemetry_interval,
+            shared_workspace=shared_workspace,
+        )
+        command = generate_command_command(execution_script, run_timeout, job_identity)
+    job_request_time = datetime.now(timezone.utc)
+    hedge_names = [_hedge_job_name(job_name, hedge) for hedge in range(1, max_hedges + 1)]
+    existing_job = _get_existing_job(target_user, [job_name] + hedge_names) if adopt_existing else None
+    if existing_job is not None and not _is_same_job(existing_job, command, job_identity):
+        # Something else holds the name (e.g. a job of another instance with a truncated name), free it up for us
+        logger.warning(f"[{existing_job['name']}] Existing job is running something else, replacing it")
+        if not _delete_job_and_wait(target_user, existing_job["name"]):
+            return False, []
+        existing_job = None
+
+    if existing_job is not None:
+        job_name = existing_job["name"]
+        hedge_names = [name for name in hedge_names if name != job_name]
+        # Left over from a previous coordinator which went away, pick up where it left off
+        logger.info(f"[{job_name}] Adopting existing job ({existing_job['status_short']})")
+        job_request_time = _job_last_run_time(existing_job) or job_request_time - timedelta(seconds=run_timeout)
+
+        if existing_job["status_short"] == "Completed":
+            # Finished whilst nobody was watching, just collect the result
+            seen_logs = []
+            _peak_at_logs(target_user=target_user, job_name=job_name, start_time=job_request_time, seen_logs=seen_logs)
+            success = _job_was_successful(target_user, job_name)
+            _delete_job(target_user, job_name)
+            return success, seen_logs
 
-    logger.info(f"[{job_name}] Waiting for job to start")
-    waiting_start_time = datetime.now(tz=timezone.utc)
-    while True:
-        start_time = _wait_for_job_to_start(
+    else:
+        logger.info(f"[{job_name}] Creating job")
+        if not _run_job(
             target_user=target_user,
             job_name=job_name,
-        )
-
-        if start_time is not None:
-            break
-
-        if waiting_start_time + timedelta(seconds=start_timeout) < datetime.now(tz=timezone.utc):
-            logger.error(f"[{job_name}] Job failed to start within timeout")
+            image=image_name,
+            command=command,
+            mount=mount,
+        ):
             return False, []
 
-        time.sleep(0.5)
+    if not wait_for_completion:
+        return True, []
+
+    logger.info(f"[{job_name}] Waiting for job to start")
+    waiting_start_time = datetime.now(tz=timezone.utc)
+    # Pending jobs (including any hedges) & when they were submitted
+    candidates = {job_name: waiting_start_time}
+    hedge_after = _hedge_threshold() if hedge_after is None else hedge_after
+    # Released once the losing candidates are deleted, the winner runs in the slot we were started with
+    hedge_slots: List[threading.BoundedSemaphore] = []
+    waiting_for_hedge_slot = False
+    with span("wait-for-start", "job", job_name=job_name), contextlib.ExitStack() as stack:
+        stack.callback(_release_hedge_slots, hedge_slots)
+        while True:
+            for candidate in list(candidates):
+                start_time = _wait_for_job_to_start(
+                    target_user=target_user,
+                    job_name=candidate,
+                )
+                if start_time is False and len(candidates) > 1:
+                    # Only a failure once nothing else is left to start fails the step
+                    logger.warning(f"[{candidate}] Failed to start, continuing with the other hedged jobs")
+                    _delete_job(target_user, candidate)
+                    del candidates[candidate]
+                    start_time = None
+                    continue
+                if start_time is not None:
+                    break
+
+            if start_time is not None:
+                # First to start (or the last to fail) wins, the rest are just holding quota
+                for loser in candidates:
+                    if loser != candidate:
+                        logger.info(f"[{loser}] Deleting hedged job, {candidate} won")
+                        _delete_job(target_user, loser)
+
+                if candidate != job_name:
+                    logger.info(f"[{job_name}] Continuing with hedged job {candidate}")
+                if start_time is not False:
+                    _record_start_latency((datetime.now(tz=timezone.utc) - candidates[candidate]).total_seconds())
+                job_name = candidate
+                break
+
+            if _is_cancelled(cancel_event):
+                logger.warning(f"[{job_name}] Cancelled whilst waiting for job to start")
+                for candidate in candidates:
+                    _cancel_job(target_user, candidate, propagate_cancel)
+                return False, []
+
+            now = datetime.now(tz=timezone.utc)
+            last_submitted_time = max(candidates.values())
+            if last_submitted_time + timedelta(seconds=start_timeout) < now:
+                logger.error(f"[{job_name}] Job failed to start within timeout")
+                for candidate in candidates:
+                    _delete_job(target_user, candidate)
+                return False, []
+
+            if hedge_names and last_submitted_time + timedelta(seconds=hedge_after) < now:
+                # Likely stuck on a bad node, submit a duplicate & take whichever is scheduled first
+                if not _acquire_hedge_slot(hedge_slots):
+                    # Try again once a slot is free, rather than run over the quota
+                    if not waiting_for_hedge_slot:
+                        logger.info(f"[{job_name}] Not started after {hedge_after:.0f}s, waiting for a slot to hedge")
+                    waiting_for_hedge_slot = True
+                else:
+                    waiting_for_hedge_slot = False
+                    hedge_name = hedge_names.pop(0)
+                    logger.warning(f"[{job_name}] Not started after {hedge_after:.0f}s, hedging with {hedge_name}")
+                    if _run_job(
+                        target_user=target_user,
+                        job_name=hedge_name,
+                        image=image_name,
+                        command=command,
+                        mount=mount,
+                    ):
+                        candidates[hedge_name] = now
+                    else:
+                        # Most likely quota, carry on waiting for what we have
+                        hedge_slots.pop().release()
+                        hedge_names = []
+
+            time.sleep(0.5)
 
     seen_logs = []
     if start_time is False:
@@ -209,13 +627,19 @@ def run_job(
         return False, seen_logs
 
     logger.info(f"[{job_name}] Job started, waiting for job to finish")
-    while True:
-        _peak_at_logs(target_user=target_user, job_name=job_name, start_time=start_time, seen_logs=seen_logs)
+    with span("wait-for-completion", "job", job_name=job_name):
+        while True:
+            _peak_at_logs(target_user=target_user, job_name=job_name, start_time=start_time, seen_logs=seen_logs)
 
-        if not _job_is_running(target_user, job_name):
-            break
+            if not _job_is_running(target_user, job_name):
+                break
 
-        time.sleep(1)
+            if _is_cancelled(cancel_event):
+                logger.warning(f"[{job_name}] Cancelled")
+                _cancel_job(target_user, job_name, propagate_cancel)
+                return False, seen_logs
+
+            time.sleep(1)
 
     success = _job_was_successful(target_user, job_name)
     if success:
@@ -226,7 +650,11 @@ def run_job(
     if wait_for_job_logs_marker:
         # If we are a step, then we wait for the explicit end marker
         _wait_for_logs_end_marker(
-            target_user=target_user, job_name=job_name, start_time=waiting_start_time, seen_logs=seen_logs
+            target_user=target_user,
+            job_name=job_name,
+            start_time=waiting_start_time,
+            seen_logs=seen_logs,
+            cancel_event=cancel_event,
         )
     else:
         # If we are a coord job, then just grab what we have and exit
@@ -236,8 +664,17 @@ def run_job(
     return success, seen_logs
 
 
+def _delete_envvar(target_user: str, name: str) -> None:
+    api = _client(target_user)
+    try:
+        api.delete(f"/envvars/v1/tool/{target_user}/envvars/{name}")
+    except HTTPError as e:
+        if e.response is None or e.response.status_code != 404:
+            logger.warning(f"Failed to delete envvar {name}: {e}")
+
+
 def create_or_update_envvar(target_user: str, name: str, value: str) -> None:
-    api = _client_config(target_user)
+    api = _client(target_user)
 
     try:
         resp = api.get(f"/envvars/v1/tool/{target_user}/envvars/{name}")
@@ -0,0 +1,149 @@
+"""
+MIT License
+
+Copyright (c) 2025 Damian Zaremba
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import collections
+import contextlib
+import functools
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Completed spans, None when tracing is disabled (the default) so spans cost a single check
+_events: Optional[List[Dict[str, Any]]] = None
+_events_lock = threading.Lock()
+_thread_names: Dict[int, str] = {}
+_local = threading.local()
+_origin_ns = time.perf_counter_ns()
+
+
+def configure_tracing(enabled: bool) -> None:
+    global _events, _origin_ns
+    with _events_lock:
+        _events = [] if enabled else None
+        _thread_names.clear()
+        _origin_ns = time.perf_counter_ns()
+
+
+def tracing_enabled() -> bool:
+    return _events is not None
+
+
+@contextlib.contextmanager
+def span(name: str, category: str = "coordinator", **args: Any):
+    if _events is None:
+        yield
+        return
+
+    stack = _local.__dict__.setdefault("stack", [])
+    parent = stack[-1] if stack else None
+    stack.append(name)
+    start_ns = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        end_ns = time.perf_counter_ns()
+        stack.pop()
+        thread = threading.current_thread()
+        # Chrome trace "complete" event, nesting within a thread is implied by the timestamps
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": (start_ns - _origin_ns) / 1000,
+            "dur": (end_ns - start_ns) / 1000,
+            "pid": os.getpid(),
+            "tid": thread.ident,
+            "args": {key: str(value) for key, value in args.items()} | ({"parent": parent} if parent else {}),
+        }
+        with _events_lock:
+            if _events is not None:
+                _events.append(event)
+                _thread_names[thread.ident] = thread.name
+
+
+def traced(name: str, category: str = "coordinator", arg_names: Tuple[str, ...] = ()):
+    def decorator(func: Callable) -> Callable:
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _events is None:
+                return func(*args, **kwargs)
+            arguments = signature.bind_partial(*args, **kwargs).arguments
+            with span(name, category, **{key: arguments[key] for key in arg_names if key in arguments}):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def write_trace(path: str) -> int:
+    with _events_lock:
+        events = list(_events or [])
+        thread_names = dict(_thread_names)
+
+    # Loadable by chrome://tracing, Perfetto & speedscope (flame graph per thread)
+    metadata = [
+        {"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid, "args": {"name": thread_name}}
+        for tid, thread_name in thread_names.items()
+    ]
+    Path(path).write_text(json.dumps({"traceEvents": metadata + events, "displayTimeUnit": "ms"}))
+    return len(events)
+
+
+class StackSampler(threading.Thread):
+    # cProfile only sees the thread which enabled it (& only one may be active), whereas most of our work
+    # happens on executor threads, so sample every thread's stack instead
+    def __init__(self, interval: float = 0.01):
+        super().__init__(name="stack-sampler", daemon=True)
+        self.interval = interval
+        self.samples: Dict[str, int] = collections.Counter()
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for tid, frame in sys._current_frames().items():
+                if tid == self.ident:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(thread_names.get(tid, str(tid)))
+                self.samples[";".join(reversed(stack))] += 1
+
+    def stop(self, path: str) -> int:
+        self._stop_event.set()
+        self.join()
+        # "Collapsed" stacks, as consumed by flamegraph.pl & speedscope
+        Path(path).write_text("".join(f"{stack} {count}\n" for stack, count in sorted(self.samples.items())))
+        return sum(self.samples.values())
@@ -23,20 +23,23 @@ SOFTWARE.
 """
 
 import base64
+import hashlib
 import re
 from pathlib import PosixPath
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional
 
-import requests
-
-from cbng_trainer.common.consts import JOB_LOGS_END_MARKER
+from cbng_trainer.common import http_client
+from cbng_trainer.common.consts import JOB_LOGS_END_MARKER, JOB_TELEMETRY_MARKER
+from cbng_trainer.common.files import SHARED_WORKSPACE_ONLY_PATTERNS, SHARED_WORKSPACE_PATTERNS, SharedWorkspace
 
 
 def get_target_edit_groups(review_host: str, filter_edit_set: List[str]) -> Dict[str, Dict[str, int]]:
-    r = requests.get(f"{review_host}/api/v1/edit-groups/", params={"exclude_empty_editsets": "1"}, timeout=10)
+    r = http_client.get(f"{review_host}/api/v1/edit-groups/", params={"exclude_empty_editsets": "1"}, timeout=10)
     r.raise_for_status()
-    data = r.json()
+    return map_target_edit_groups(r.json(), filter_edit_set)
+
 
+def map_target_edit_groups(data: List[Dict[str, Any]], filter_edit_set: List[str]) -> Dict[str, Dict[str, int]]:
     edit_groups_by_id = {edit_group["id"]: edit_group for edit_group in data}
     mapped_edit_groups = {}
     for edit_group in data:
@@ -56,12 +59,19 @@ def generate_execution_script(
     download_file_urls: Optional[Dict[str, str]] = None,
     run_commands: Optional[List[str]] = None,
     configure_upload_file_helper: bool = False,
+    telemetry_interval: Optional[int] = None,
+    shared_workspace: Optional[SharedWorkspace] = None,
 ) -> str:
     setup_script = "#!/bin/bash\n"
     setup_script += "set -e\n"
 
     # Emit a know message on exit, so we can parse the logs later
-    setup_script += f"trap \"echo '{JOB_LOGS_END_MARKER}'\" EXIT\n"
+    if telemetry_interval:
+        # Also stop the sampler, so it can not hold the pod open
+        setup_script += 'trap "kill \\${telemetry_pid:-} 2>/dev/null || true; '
+        setup_script += f"echo '{JOB_LOGS_END_MARKER}'\" EXIT\n"
+    else:
+        setup_script += f"trap \"echo '{JOB_LOGS_END_MARKER}'\" EXIT\n"
 
     # Helper functions
     if configure_upload_file_helper:
@@ -76,9 +86,30 @@ function upload_file() {
     target_url=$2
     if [ -s "${source_path}" ];
     then
-        echo "Uploading ${source_path} to ${target_url}"
+"""
+        if shared_workspace:
+            # Kept at the same relative path as `SharedWorkspace.path_for`, intermediates stop there
+            setup_script += f"""\
+        if [[ "${{target_url}}" == '{shared_workspace.url_prefix}/'* ]];
+        then
+            case "${{target_url}}" in
+                {"|".join(SHARED_WORKSPACE_PATTERNS)})
+                    workspace_path='{shared_workspace.directory}/'"${{target_url#'{shared_workspace.url_prefix}/'}}"
+                    echo "Copying ${{source_path}} to ${{workspace_path}}"
+                    mkdir -p "$(dirname "${{workspace_path}}")"
+                    cp "${{source_path}}" "${{workspace_path}}.$$.tmp"
+                    mv "${{workspace_path}}.$$.tmp" "${{workspace_path}}"
+                    ;;
+            esac
+            case "${{target_url}}" in
+                {"|".join(SHARED_WORKSPACE_ONLY_PATTERNS)}) return 0 ;;
+            esac
+        fi
+
+"""
+        setup_script += """        echo "Uploading ${source_path} to ${target_url}"
 
-        curl \
+        if ! curl \
             --fail \
             --connect-timeout 300 \
             --max-time 300 \
@@ -86,13 +117,65 @@ function upload_file() {
             -s \
             -H@/tmp/file-api-headers \
              --upload-file "${source_path}" \
-            "${target_url}"
+            "${target_url}";
+        then
+            # Objects can not be replaced, re-uploading what is already there (a retried step) is fine
+            [ "$(curl -sfL "${target_url}" | sha256sum)" == "$(sha256sum < "${source_path}")" ] || return 1
+        fi
     else
         echo "Skipping upload of ${source_path} to ${target_url}"
     fi
 }
 """
 
+    if telemetry_interval:
+        # Raw counters only (cgroup v2, falling back to v1), rates are derived when the logs are collected
+        setup_script += """
+# Helper function, emits a resource sample every interval
+function telemetry_sampler() {
+    while true;
+    do
+        cpu_usec=""
+        if [ -f /sys/fs/cgroup/cpu.stat ];
+        then
+            while read -r key value;
+            do
+                [ "${key}" == "usage_usec" ] && cpu_usec="${value}"
+            done < /sys/fs/cgroup/cpu.stat
+        elif [ -f /sys/fs/cgroup/cpuacct/cpuacct.usage ];
+        then
+            cpu_usec=$(( $(cat /sys/fs/cgroup/cpuacct/cpuacct.usage) / 1000 ))
+        fi
+
+        memory_bytes=$(cat /sys/fs/cgroup/memory.current 2>/dev/null || \\
+                       cat /sys/fs/cgroup/memory/memory.usage_in_bytes 2>/dev/null)
+        memory_peak_bytes=$(cat /sys/fs/cgroup/memory.peak 2>/dev/null || \\
+                            cat /sys/fs/cgroup/memory/memory.max_usage_in_bytes 2>/dev/null)
+
+        disk_used_kb=""
+        read -r _ _ disk_used_kb _ < <(df -kP /workspace 2>/dev/null | tail -n 1)
+
+        rx_bytes=0
+        tx_bytes=0
+        while read -r line;
+        do
+            [[ "${line}" == *:* ]] || continue
+            [ "${line%%:*}" == "lo" ] && continue
+            read -r rx _ _ _ _ _ _ _ tx _ <<< "${line#*:}"
+            rx_bytes=$(( rx_bytes + rx ))
+            tx_bytes=$(( tx_bytes + tx ))
+        done < /proc/net/dev
+
+        echo "{marker} {\\"time\\": $(date +%s), \\"cpu_usec\\": ${cpu_usec:-null}, \\
+\\"memory_bytes\\": ${memory_bytes:-null}, \\"memory_peak_bytes\\": ${memory_peak_bytes:-null}, \\
+\\"disk_used_kb\\": ${disk_used_kb:-null}, \\"rx_bytes\\": ${rx_bytes}, \\"tx_bytes\\": ${tx_bytes}}"
+        sleep {interval}
+    done
+}
+""".replace("{marker}", JOB_TELEMETRY_MARKER).replace("{interval}", str(telemetry_interval))
+        setup_script += "(set +e; telemetry_sampler) &\n"
+        setup_script += "telemetry_pid=$!\n"
+
     setup_script += "set -x\n"
     if download_file_urls:
         base_dir = PosixPath("/workspace")
@@ -104,9 +187,18 @@ function upload_file() {
                 setup_script += f"test -d '{target_path.parent.as_posix()}' ||"
                 setup_script += f"mkdir -p '{target_path.parent.as_posix()}'\n"
 
+            workspace_path = shared_workspace.path_for(url) if shared_workspace else None
+            if workspace_path:
+                # Written by an earlier step, only fall back to the file api for what is published
+                setup_script += "# Link the file from the shared workspace into the target path\n"
+                setup_script += f"if [ -f '{workspace_path.as_posix()}' ]; then "
+                setup_script += f"ln -sf '{workspace_path.as_posix()}' '{target_path.as_posix()}'; else\n"
+
             setup_script += "# Download the file into the target path\n"
             setup_script += "curl --fail -s --connect-timeout 600 --max-time 600 "
             setup_script += f"--retry 5 -L --output '{target_path.as_posix()}' '{url}'\n"
+            if workspace_path:
+                setup_script += "fi\n"
 
     if run_commands:
         for command in run_commands:
@@ -114,21 +206,49 @@ function upload_file() {
     return setup_script
 
 
-def generate_command_command(setup_script: str, run_timeout: int) -> str:
+def generate_command_command(setup_script: str, run_timeout: int, job_identity: Optional[str] = None) -> str:
     encoded_script = base64.b64encode(setup_script.encode("utf-8")).decode("utf-8")
-    return (
+    command = (
         f"bash -c 'base64 -d <<<{encoded_script} > /tmp/setup.sh && "
         f"chmod 755 /tmp/setup.sh && "
         f"timeout {run_timeout} /tmp/setup.sh'"
     )
+    if job_identity:
+        # Passed as $0, so it is visible in the job's command without changing what is run
+        command += f" {job_identity_label(job_identity)}"
+    return command
 
 
-def clean_job_name(name: str, prefix: Optional[str] = None, postfix: Optional[str] = None) -> str:
+def job_identity_label(job_identity: str) -> str:
+    return f"cbng-job-{hashlib.sha256(job_identity.encode('utf-8')).hexdigest()[:16]}"
+
+
+def parse_job_identity_label(command: str) -> Optional[str]:
+    if match := re.search(r"' (cbng-job-[0-9a-f]{16})$", command):
+        return match.group(1)
+    return None
+
+
+def _clean_name(name: str) -> str:
+    name = re.sub(r"[^A-Za-z0-9]", "-", name).lower()
+    return re.sub(r"-{2,}", "-", name)
+
+
+def clean_job_name(
+    name: str, prefix: Optional[str] = None, postfix: Optional[str] = None, instance: Optional[str] = None
+) -> str:
     job_name = name
     if prefix:
         job_name = f"{prefix}-{job_name}"
+
+    if instance is None:
+        if postfix:
+            job_name = f"{job_name}-{postfix}"
+        return _clean_name(job_name)[0:50]
+
+    # The readable part may be truncated, so the hash (shared by every job of an instance) keeps names unique
+    instance_hash = hashlib.sha256(f"{name}\0{instance}".encode("utf-8")).hexdigest()[:8]
+    suffix = f"-{instance_hash}"
     if postfix:
-        job_name = f"{job_name}-{postfix}"
-    job_name = re.sub(r"[^A-Za-z0-9]", "-", job_name).lower()
-    job_name = re.sub(r"-{2,}", "-", job_name)
-    return job_name[0:50]
+        suffix += f"-{_clean_name(postfix)}"
+    return f"{_clean_name(job_name)[0:50 - len(suffix)].rstrip('-')}{suffix}"
@@ -0,0 +1,207 @@
+"""
+MIT License
+
+Copyright (c) 2025 Damian Zaremba
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import hashlib
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import requests
+
+from cbng_trainer.common import http_client
+from cbng_trainer.common.utils import map_target_edit_groups
+
+logger = logging.getLogger(__name__)
+
+
+# Watches the review api's edit groups, reporting targets whose groups changed once they have been quiet for
+# `debounce` seconds (or `max_delay` seconds after the first change, so constant activity can not starve a target).
+# The listing only has the group metadata, so each group's dump is also checked (conditionally, so an unchanged dump is
+# not downloaded), the per target hash catches changes when the server ignores the headers.
+class EditGroupWatcher:
+    def __init__(
+        self,
+        review_host: str,
+        filter_edit_set: List[str],
+        debounce: int = 300,
+        max_delay: int = 1800,
+        state_file: Optional[str] = None,
+    ):
+        self.review_host = review_host.rstrip("/")
+        self.filter_edit_set = filter_edit_set
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.state_file = Path(state_file) if state_file else None
+        self.target_groups: Dict[str, Dict[str, int]] = {}
+        self._etag: Optional[str] = None
+        self._last_modified: Optional[str] = None
+        self._edit_groups: List[Dict[str, Any]] = []
+        # Group id -> the validators (or a hash of the contents) of its dump, as of the last poll
+        self._dump_versions: Dict[int, Dict[str, Optional[str]]] = {}
+        # Hash of each target's groups, as of the last successful run (or first saw, when not running on start)
+        self._hashes: Dict[str, str] = {}
+        # Target -> first & latest change (monotonic) plus the hash we will have trained once run
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        # Target -> hash of the run in flight, only recorded as trained once `mark_done` reports it succeeded
+        self._running: Dict[str, str] = {}
+
+        if self.state_file and self.state_file.exists():
+            self._hashes = json.loads(self.state_file.read_text()).get("hashes", {})
+
+    def _save(self) -> None:
+        if self.state_file:
+            tmp_path = self.state_file.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps({"hashes": self._hashes}, indent=2))
+            tmp_path.replace(self.state_file)
+
+    def _fetch_listing(self) -> Optional[List[Dict[str, Any]]]:
+        headers = {}
+        if self._etag:
+            headers["If-None-Match"] = self._etag
+        if self._last_modified:
+            headers["If-Modified-Since"] = self._last_modified
+
+        try:
+            r = http_client.get(
+                f"{self.review_host}/api/v1/edit-groups/",
+                params={"exclude_empty_editsets": "1"},
+                headers=headers,
+                timeout=10,
+            )
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"Failed to poll edit groups: {e}")
+            return None
+
+        if r.status_code == 304:
+            logger.debug("Edit groups not modified")
+            return None
+        if r.status_code != 200:
+            logger.warning(f"Failed to poll edit groups: {r.status_code}")
+            return None
+
+        self._etag = r.headers.get("ETag")
+        self._last_modified = r.headers.get("Last-Modified")
+        return r.json()
+
+    def _fetch_dump_version(self, group_id: int) -> Optional[Dict[str, Optional[str]]]:
+        previous = self._dump_versions.get(group_id)
+        headers = {}
+        if previous and previous["etag"]:
+            headers["If-None-Match"] = previous["etag"]
+        if previous and previous["last_modified"]:
+            headers["If-Modified-Since"] = previous["last_modified"]
+
+        url = f"{self.review_host}/api/v1/edit-groups/{group_id}/dump-editset/"
+        try:
+            with http_client.get(url, headers=headers, stream=True, timeout=600) as r:
+                if r.status_code == 304:
+                    return previous
+                if r.status_code != 200:
+                    logger.warning(f"Failed to check edit group {group_id}: {r.status_code}")
+                    return None
+
+                version = {
+                    "etag": r.headers.get("ETag"),
+                    "last_modified": r.headers.get("Last-Modified"),
+                    "sha256": None,
+                }
+                if not version["etag"] and not version["last_modified"]:
+                    # Nothing to go on but the contents
+                    digest = hashlib.sha256()
+                    for chunk in r.iter_content(chunk_size=1024 * 1024):
+                        digest.update(chunk)
+                    version["sha256"] = digest.hexdigest()
+                return version
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"Failed to check edit group {group_id}: {e}")
+            return None
+
+    def poll(self, run_on_start: bool = False) -> None:
+        first_poll = not self.target_groups
+        if (data := self._fetch_listing()) is not None:
+            self._edit_groups = data
+            self.target_groups = map_target_edit_groups(data, self.filter_edit_set)
+        elif first_poll:
+            return
+
+        edit_groups_by_id = {edit_group["id"]: edit_group for edit_group in self._edit_groups}
+        for group_id in sorted({group_id for groups in self.target_groups.values() for group_id in groups.values()}):
+            if (version := self._fetch_dump_version(group_id)) is not None:
+                self._dump_versions[group_id] = version
+
+        now = time.monotonic()
+        for target_name, groups in self.target_groups.items():
+            group_ids = sorted(groups.values())
+            if any(group_id not in self._dump_versions for group_id in group_ids):
+                # Can not tell if it changed, so wait for the next poll
+                continue
+            contents = [
+                {"group": edit_groups_by_id[group_id], "dump": self._dump_versions[group_id]} for group_id in group_ids
+            ]
+            target_hash = hashlib.sha256(json.dumps(contents, sort_keys=True).encode("utf-8")).hexdigest()
+            if target_hash in (self._hashes.get(target_name), self._running.get(target_name)):
+                continue
+
+            if first_poll and target_name not in self._hashes and not run_on_start:
+                # Nothing to compare against, so take what exists as already trained
+                self._hashes[target_name] = target_hash
+                continue
+
+            if (pending := self._pending.get(target_name)) is None:
+                logger.info(f"Detected change to {target_name}")
+                pending = self._pending[target_name] = {"first_change": now}
+            pending["latest_change"] = now
+            pending["hash"] = target_hash
+        self._save()
+
+    def pop_ready(self) -> Dict[str, Dict[str, int]]:
+        now = time.monotonic()
+        ready = {}
+        for target_name, pending in list(self._pending.items()):
+            # A target is never run twice at once, changes whilst running are picked up once it is done
+            if target_name in self._running:
+                continue
+            if pending["latest_change"] + self.debounce > now and pending["first_change"] + self.max_delay > now:
+                continue
+
+            del self._pending[target_name]
+            if target_name in self.target_groups:
+                self._running[target_name] = pending["hash"]
+                ready[target_name] = self.target_groups[target_name]
+        return ready
+
+    def mark_done(self, target_name: str, success: bool) -> None:
+        target_hash = self._running.pop(target_name)
+        if success:
+            self._hashes[target_name] = target_hash
+            self._save()
+            return
+
+        # Retried once quiet again, rather than waiting on the next change to the groups
+        logger.warning(f"Run failed for {target_name}, retrying")
+        if target_name not in self._pending:
+            now = time.monotonic()
+            self._pending[target_name] = {"first_change": now, "latest_change": now, "hash": target_hash}
@@ -0,0 +1,83 @@
+"""
+MIT License
+
+Copyright (c) 2025 Damian Zaremba
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import hashlib
+import io
+import tarfile
+
+import pytest
+
+from benchmarks.fakes import TRAINER_HOST
+from cbng_trainer.common.bundle import (
+    build_bundle,
+    calculate_pointer_path,
+    extract_bundle,
+    publish_pointer,
+    read_pointer,
+)
+
+
+@pytest.mark.parametrize("generations", [0, 1, 2, 7, 1000])
+def test_publish_pointer(env, generations):
+    pointer_url = calculate_pointer_path(TRAINER_HOST, "Test")
+    for generation in range(generations):
+        env.file_api.objects[f"{pointer_url}/{generation}.json"] = b"{}"
+
+    assert publish_pointer(pointer_url, {"instance_name": "test"}, "test") == generations
+    assert read_pointer(pointer_url) == {"instance_name": "test", "generation": generations}
+
+
+def test_read_pointer_without_generations(env):
+    assert read_pointer(calculate_pointer_path(TRAINER_HOST, "Test")) is None
+
+
+def _build_bundle(tmp_path, sha256: str) -> str:
+    (tmp_path / "bayes.db").write_bytes(b"bayes")
+    with open(tmp_path / "bundle.tar.gz", "wb") as fh:
+        build_bundle(
+            {"bayes.db": (tmp_path / "bayes.db").as_posix()},
+            {"instance_name": "test", "files": {"bayes.db": {"sha256": sha256, "size": 5}}},
+            fh,
+        )
+    return (tmp_path / "bundle.tar.gz").as_posix()
+
+
+def test_bundle_round_trip(tmp_path):
+    bundle_path = _build_bundle(tmp_path, hashlib.sha256(b"bayes").hexdigest())
+    manifest = extract_bundle(bundle_path, (tmp_path / "out").as_posix())
+    assert manifest["instance_name"] == "test"
+    assert (tmp_path / "out" / "bayes.db").read_bytes() == b"bayes"
+
+
+def test_bundle_checksum_mismatch(tmp_path):
+    bundle_path = _build_bundle(tmp_path, hashlib.sha256(b"other").hexdigest())
+    with pytest.raises(ValueError):
+        extract_bundle(bundle_path, (tmp_path / "out").as_posix())
+
+
+def test_bundle_without_manifest(tmp_path):
+    with tarfile.open(tmp_path / "bundle.tar.gz", mode="w:gz") as tar:
+        tar.addfile(tarfile.TarInfo("bayes.db"), io.BytesIO(b""))
+    with pytest.raises(ValueError):
+        extract_bundle((tmp_path / "bundle.tar.gz").as_posix(), (tmp_path / "out").as_posix())
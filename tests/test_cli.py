@@ -0,0 +1,115 @@
+"""
+MIT License
+
+Copyright (c) 2025 Damian Zaremba
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import hashlib
+import io
+import json
+import re
+
+import click
+import pytest
+
+from benchmarks.fakes import REVIEW_HOST, TRAINER_HOST, FakeEnvironment, invoke
+from cbng_trainer import cli
+from cbng_trainer.common.bundle import BUNDLE_FILE, BUNDLE_MANIFEST_FILE, build_bundle
+from cbng_trainer.common.files import calculate_target_path
+
+
+@pytest.mark.parametrize(
+    "job_slots, concurrency, expected",
+    [(14, 1, 13), (14, 2, 6), (14, 7, 1), (0, 3, 0)],
+)
+def test_coordinator_job_slots(job_slots, concurrency, expected):
+    assert cli._coordinator_job_slots(job_slots, concurrency) == expected
+
+
+def test_coordinator_job_slots_too_few():
+    with pytest.raises(click.BadParameter):
+        cli._coordinator_job_slots(14, 8)
+
+
+def test_coordinators_are_given_their_share_of_job_slots(capsys):
+    with FakeEnvironment(targets=3):
+        invoke(
+            cli.run_edit_sets,
+            [
+                "--print-only",
+                "--concurrency=2",
+                f"--review-host={REVIEW_HOST}",
+                f"--trainer-host={TRAINER_HOST}",
+            ],
+        )
+    scripts = [line for line in capsys.readouterr().out.splitlines() if line]
+    assert len(scripts) == 3
+    # 14 between 2 coordinators, each of which is a job itself
+    assert all(re.search(r" --job-slots=6( |$)", script) for script in scripts)
+
+
+def _publish_bundle(env, tmp_path, bundle_sha256=None) -> None:
+    (tmp_path / "bayes.db").write_bytes(b"bayes")
+    files = {"bayes.db": {"sha256": hashlib.sha256(b"bayes").hexdigest(), "size": 5}}
+    bundle = io.BytesIO()
+    build_bundle({"bayes.db": (tmp_path / "bayes.db").as_posix()}, {"instance_name": "test", "files": files}, bundle)
+
+    bundle_url = calculate_target_path(TRAINER_HOST, "Test", "test", "bundle", BUNDLE_FILE)
+    env.file_api.objects[bundle_url] = bundle.getvalue()
+    env.file_api.objects[calculate_target_path(TRAINER_HOST, "Test", "test", "bundle", BUNDLE_MANIFEST_FILE)] = (
+        json.dumps(
+            {
+                "instance_name": "test",
+                "files": files,
+                "bundle": {"url": bundle_url, "sha256": bundle_sha256 or hashlib.sha256(bundle.getvalue()).hexdigest()},
+            }
+        ).encode("utf-8")
+    )
+
+
+def _fetch_model(tmp_path) -> None:
+    invoke(
+        cli.fetch_model,
+        [
+            "--target-name=Test",
+            "--instance-name=test",
+            f"--output-dir={(tmp_path / 'out').as_posix()}",
+            f"--trainer-host={TRAINER_HOST}",
+        ],
+    )
+
+
+def test_fetch_model_by_instance(env, tmp_path):
+    _publish_bundle(env, tmp_path)
+    _fetch_model(tmp_path)
+    assert (tmp_path / "out" / "bayes.db").read_bytes() == b"bayes"
+
+
+def test_fetch_model_checksum_mismatch(env, tmp_path):
+    _publish_bundle(env, tmp_path, bundle_sha256=hashlib.sha256(b"other").hexdigest())
+    with pytest.raises(SystemExit):
+        _fetch_model(tmp_path)
+    assert not (tmp_path / "out" / "bayes.db").exists()
+
+
+def test_fetch_model_without_manifest(env, tmp_path):
+    with pytest.raises(SystemExit):
+        _fetch_model(tmp_path)
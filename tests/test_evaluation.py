@@ -0,0 +1,123 @@
+"""
+MIT License
+
+Copyright (c) 2025 Damian Zaremba
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import json
+import os
+import shutil
+import subprocess  # nosec: B404
+from typing import List
+
+import click
+import pytest
+
+from benchmarks.fakes import REVIEW_HOST, TRAINER_HOST, invoke
+from cbng_trainer import cli
+from cbng_trainer.common.steps import TRIAL_REPORT_FILES, Steps
+from cbng_trainer.common.utils import generate_execution_script
+
+
+def _evaluate(trials: List[str]) -> None:
+    invoke(
+        cli.evaluate,
+        [
+            "--target-name=Benchmark",
+            "--instance-name=benchmark",
+            "--evaluation-name=test",
+            "--trainer-image-name=benchmark",
+            "--core-image-name=benchmark",
+            f"--trainer-host={TRAINER_HOST}",
+        ]
+        + [f"--trial={trial}" for trial in trials],
+    )
+
+
+def test_evaluate(env):
+    _evaluate([f"trial {i}={REVIEW_HOST}/api/v1/edit-groups/{i}/dump-editset/" for i in range(5)])
+    summary = json.loads(env.file_api.objects[f"{TRAINER_HOST}/Benchmark/benchmark/evaluation/test/trial/summary.json"])
+    assert set(summary["trials"]) == {f"trial-{i}" for i in range(5)}
+    assert all(summary["trials"].values())
+    # Rates are fractions, the false positive rate falling by 0.0002 per 0.01 of threshold
+    assert summary["false_positive_budgets"] == [0.001, 0.0025, 0.005, 0.01]
+    assert summary["trials"]["trial-0"]["0.001"] == {
+        "threshold": "0.95",
+        "detection_rate": pytest.approx(0.525),
+        "false_positive_rate": pytest.approx(0.001),
+    }
+    assert summary["trials"]["trial-0"]["0.01"]["threshold"] == "0.50"
+
+    text = env.file_api.objects[f"{TRAINER_HOST}/Benchmark/benchmark/evaluation/test/trial/summary.txt"].decode()
+    assert (
+        text.splitlines()[0] == "trial\tdetection@fp<=0.1%\tdetection@fp<=0.25%\tdetection@fp<=0.5%\tdetection@fp<=1%"
+    )
+    assert text.splitlines()[1].split("\t")[1] == "52.50% (0.95)"
+
+
+@pytest.mark.parametrize(
+    "trials",
+    [
+        # Cleans to nothing
+        [f"!!!={REVIEW_HOST}/1"],
+        # Cleans to the same report path
+        [f"Trial A={REVIEW_HOST}/1", f"trial-a={REVIEW_HOST}/2"],
+        # Not NAME=URL
+        ["trial"],
+    ],
+)
+def test_evaluate_rejects_bad_trial_names(env, trials):
+    with pytest.raises(click.BadParameter):
+        _evaluate(trials)
+    assert not env.toolforge.calls
+
+
+@pytest.mark.skipif(shutil.which("bash") is None, reason="needs bash")
+@pytest.mark.parametrize("parallelism", [1, 2])
+def test_evaluation_script_with_telemetry(tmp_path, parallelism):
+    # Runs the generated evaluation script, the telemetry sampler must not hold up or take a slot from trials
+    steps = Steps("Benchmark", "benchmark", "benchmark", "benchmark", TRAINER_HOST, instance_name="benchmark")
+    trials = [f"trial-{index}" for index in range(3)]
+    step_kwargs = {}
+    steps._run_step = lambda identifier, **kwargs: step_kwargs.update(kwargs) or True
+    steps.run_trial_evaluation(TRAINER_HOST, {name: "" for name in trials}, f"file://{tmp_path}/reports", parallelism)
+
+    for name in trials:
+        os.makedirs(tmp_path / "evaluation" / name)
+        os.makedirs(tmp_path / "reports" / name)
+    (tmp_path / "cluebotng").write_text(
+        "#!/bin/bash\n" + "".join(f"echo {name} > trialreport/{name}\n" for name in TRIAL_REPORT_FILES)
+    )
+    (tmp_path / "cluebotng").chmod(0o755)
+    (tmp_path / "script.sh").write_text(
+        generate_execution_script(
+            run_commands=step_kwargs["run_commands"],
+            configure_upload_file_helper=True,
+            telemetry_interval=1,
+        )
+    )
+
+    result = subprocess.run(  # nosec: B603 B607
+        ["timeout", "60", "bash", "script.sh"], cwd=tmp_path, capture_output=True, env={"FILE_API_KEY": ""}
+    )
+    assert result.returncode == 0, result.stderr.decode("utf-8")[-2000:]
+    for name in trials:
+        assert (tmp_path / "reports" / name / "thresholdtable.txt").exists()
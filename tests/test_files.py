@@ -0,0 +1,70 @@
+"""
+MIT License
+
+Copyright (c) 2025 Damian Zaremba
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import io
+import shutil
+import subprocess  # nosec: B404
+
+import pytest
+
+from benchmarks.fakes import TRAINER_HOST
+from cbng_trainer.common.files import upload_file
+from cbng_trainer.common.utils import generate_execution_script
+
+URL = f"{TRAINER_HOST}/Benchmark/benchmark/artifacts/bayes.db"
+
+
+@pytest.mark.parametrize("data", [b"contents", "contents", io.BytesIO(b"contents")])
+def test_identical_reupload_is_not_a_failure(env, data):
+    env.file_api.objects[URL] = b"contents"
+    assert upload_file(URL, data, "test")
+
+
+def test_different_reupload_fails(env):
+    env.file_api.objects[URL] = b"contents"
+    assert not upload_file(URL, b"other contents", "test")
+    assert env.file_api.objects[URL] == b"contents"
+
+
+@pytest.mark.skipif(shutil.which("bash") is None, reason="needs bash")
+@pytest.mark.parametrize("contents, returncode", [("contents", 0), ("other contents", 1)])
+def test_job_reupload(tmp_path, contents, returncode):
+    # A file api which already has the object, so refuses the upload & serves what it has
+    (tmp_path / "bin").mkdir()
+    (tmp_path / "bin" / "curl").write_text(
+        '#!/bin/bash\n[[ " $* " == *" --upload-file "* ]] && exit 22\necho "contents"\n'
+    )
+    (tmp_path / "bin" / "curl").chmod(0o755)
+    (tmp_path / "bayes.db").write_text(f"{contents}\n")
+    (tmp_path / "script.sh").write_text(
+        generate_execution_script(run_commands=[f'upload_file "bayes.db" "{URL}"'], configure_upload_file_helper=True)
+    )
+
+    result = subprocess.run(  # nosec: B603 B607
+        ["timeout", "60", "bash", "script.sh"],
+        cwd=tmp_path,
+        capture_output=True,
+        env={"FILE_API_KEY": "", "PATH": f"{tmp_path / 'bin'}:/usr/bin:/bin"},
+    )
+    assert result.returncode == returncode, result.stdout.decode("utf-8")[-2000:]
@@ -0,0 +1,63 @@
+"""
+MIT License
+
+Copyright (c) 2025 Damian Zaremba
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import io
+
+from benchmarks.fakes import TRAINING_DUMP_URL, synthetic_edit_set
+from cbng_trainer.common.mirror import materialise_edit_set_mirror, sync_edit_set_mirror
+
+
+def test_mirror_sync(env, tmp_path):
+    mirror_path = (tmp_path / "mirror.sqlite").as_posix()
+    dump = synthetic_edit_set(100)
+    env.file_api.objects[TRAINING_DUMP_URL] = dump
+    assert sync_edit_set_mirror(TRAINING_DUMP_URL, mirror_path) == {
+        "added": 100,
+        "changed": 0,
+        "removed": 0,
+        "unchanged": 0,
+    }
+
+    # A re-label, an edit removed & a batch of new ones
+    env.file_api.objects[TRAINING_DUMP_URL] = (
+        dump.replace(b"<EditID>5</EditID><isVandalism>true", b"<EditID>5</EditID><isVandalism>false")
+        .replace(b"<WPEdit><EditID>6</EditID><isVandalism>false</isVandalism></WPEdit>", b"")
+        .replace(b"</WPEditSet>", synthetic_edit_set(10, first_edit_id=100)[len(b"<WPEditSet>") :])
+    )
+    assert sync_edit_set_mirror(TRAINING_DUMP_URL, mirror_path) == {
+        "added": 10,
+        "changed": 1,
+        "removed": 1,
+        "unchanged": 98,
+    }
+
+    # Not modified, so not even downloaded
+    downloads = env.file_api.downloads
+    assert sync_edit_set_mirror(TRAINING_DUMP_URL, mirror_path)["unchanged"] == 109
+    assert env.file_api.downloads == downloads + 1
+
+    fh = io.BytesIO()
+    assert materialise_edit_set_mirror(mirror_path, fh) == 109
+    assert fh.getvalue().count(b"<WPEdit>") == 109
+    assert b"<EditID>6</EditID>" not in fh.getvalue()
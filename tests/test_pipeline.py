@@ -0,0 +1,150 @@
+"""
+MIT License
+
+Copyright (c) 2025 Damian Zaremba
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import collections
+import io
+import json
+import os
+import sqlite3
+import tempfile
+from typing import List
+
+import pytest
+
+from benchmarks.fakes import TRAINER_HOST, TRAINING_DUMP_URL, TRIAL_DUMP_URL, FakeEnvironment
+from cbng_trainer.common import toolforge
+from cbng_trainer.common.bundle import read_pointer
+from cbng_trainer.common.consts import EDIT_SET_EDIT_ID_TAG
+from cbng_trainer.common.editsets import iter_edits, local_name
+from cbng_trainer.common.state import calculate_start_latencies_path
+
+INSTANCE_URL = f"{TRAINER_HOST}/Benchmark/benchmark"
+
+
+def _edit_ids(contents: bytes) -> List[int]:
+    return [
+        int(child.text)
+        for edit in iter_edits(io.BytesIO(contents))
+        for child in edit
+        if local_name(child.tag) == EDIT_SET_EDIT_ID_TAG
+    ]
+
+
+def test_run_edit_set(env):
+    env.run_edit_set()
+    assert not env.toolforge.jobs
+    # The review api dumps are stored as is
+    assert env.file_api.objects[f"{INSTANCE_URL}/edit-sets/train.xml"] == env.file_api.objects[TRAINING_DUMP_URL]
+    assert env.file_api.objects[f"{INSTANCE_URL}/edit-sets/trial.xml"] == env.file_api.objects[TRIAL_DUMP_URL]
+    manifest = json.loads(env.file_api.objects[f"{INSTANCE_URL}/bundle/manifest.json"])
+    assert set(manifest["edit_sets"]) == {"train", "trial"}
+    assert f"{TRAINER_HOST}/Benchmark/latest-good/0.json" in env.file_api.objects
+
+
+def test_run_edit_set_shards(env):
+    env.run_edit_set("--shards=4")
+    shards = [
+        _edit_ids(env.file_api.objects[f"{INSTANCE_URL}/edit-sets/shards/train-{shard}.xml"]) for shard in range(4)
+    ]
+    # Every edit lands in exactly one shard, & no shard is starved
+    assert sorted(edit_id for shard in shards for edit_id in shard) == list(range(1000))
+    assert all(shard for shard in shards)
+
+
+def test_trial_index(env):
+    env.run_edit_set()
+    with tempfile.NamedTemporaryFile() as fh:
+        fh.write(env.file_api.objects[f"{INSTANCE_URL}/trial/index.sqlite"])
+        fh.flush()
+        connection = sqlite3.connect(fh.name)
+        try:
+            outcomes = dict(connection.execute("SELECT outcome, COUNT(*) FROM edits GROUP BY outcome"))
+        finally:
+            connection.close()
+    # The fake lists every 97th edit as misclassified, which classify as false positives first
+    assert outcomes["false_positive"] == len(range(0, 1000, 97))
+    assert sum(outcomes.values()) == 1000
+
+
+@pytest.mark.parametrize("shared_workspace", [False, True])
+def test_shared_workspace(shared_workspace):
+    with FakeEnvironment() as env, tempfile.TemporaryDirectory() as tmp_dir:
+        env.run_edit_set("--shards=4", *([f"--shared-workspace-dir={tmp_dir}"] if shared_workspace else []))
+        # Removed once the run succeeded
+        assert not os.listdir(tmp_dir)
+        assert shared_workspace != any(
+            "/edit-sets/" in url for url in env.file_api.objects if url.startswith(INSTANCE_URL)
+        )
+
+        # Everything the manifest links to can be fetched
+        manifest = json.loads(env.file_api.objects[f"{INSTANCE_URL}/bundle/manifest.json"])
+        for edit_set in manifest["edit_sets"].values():
+            assert edit_set.get("workspace_only", False) == shared_workspace
+            assert shared_workspace or edit_set["url"] in env.file_api.objects
+
+
+def test_fail_fast():
+    # The main bayes db fails whilst the two bayes db is stuck pending, which should be cancelled rather than waited on
+    with FakeEnvironment(failing_jobs=["create-main-bayes-db"], stuck_jobs=["create-two-bayes-db"]) as env:
+        with pytest.raises(SystemExit) as e:
+            env.run_edit_set("--max-hedges=0", trial=False)
+        assert e.value.code == 1
+        assert not env.toolforge.jobs
+
+
+def test_resume_skips_completed_steps(env):
+    env.run_edit_set()
+    jobs_created = env.toolforge.calls["post"]
+    env.run_edit_set()
+    assert env.toolforge.calls["post"] == jobs_created
+
+
+def test_trace_file(env):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        env.run_edit_set(cli_args=[f"--trace-file={tmp_dir}/trace.json"])
+        with open(f"{tmp_dir}/trace.json") as fh:
+            events = json.load(fh)["traceEvents"]
+    names = {event["name"] for event in events if event["ph"] == "X"}
+    assert {"run-edit-set", "store-edit-sets", "create-ann"} <= names
+    # The file api (state, logs & reports) as well as the toolforge api
+    assert {"GET file-api.invalid", "POST file-api.invalid", "POST jobs"} <= names
+
+
+def test_start_latencies_are_carried_between_runs(env, monkeypatch):
+    history_url = calculate_start_latencies_path(TRAINER_HOST, "Benchmark")
+    monkeypatch.setattr(toolforge, "_start_latencies", collections.deque(maxlen=200))
+    env.run_edit_set("--max-hedges=1", trial=False)
+    latencies = read_pointer(history_url)["latencies"]
+    assert latencies
+
+    # As a new coordinator resuming the instance, which has nothing to add so does not publish
+    monkeypatch.setattr(toolforge, "_start_latencies", collections.deque(maxlen=200))
+    env.run_edit_set("--max-hedges=1", trial=False)
+    assert toolforge.start_latencies()[1] == latencies
+    assert read_pointer(history_url)["generation"] == 0
+
+
+def test_start_latencies_are_not_published_without_hedging(env):
+    env.run_edit_set(trial=False)
+    assert read_pointer(calculate_start_latencies_path(TRAINER_HOST, "Benchmark")) is None
@@ -0,0 +1,57 @@
+"""
+MIT License
+
+Copyright (c) 2025 Damian Zaremba
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import json
+
+from benchmarks.fakes import REVIEW_HOST, TRAINER_HOST, FakeEnvironment, invoke
+from cbng_trainer import cli
+
+
+def test_offline_plan(tmp_path):
+    with FakeEnvironment(targets=3) as env:
+        (tmp_path / "listing.json").write_text(json.dumps(env.edit_groups))
+        invoke(
+            cli.plan,
+            [
+                f"--listing-file={tmp_path / 'listing.json'}",
+                f"--output={tmp_path / 'plan.json'}",
+                f"--review-host={REVIEW_HOST}",
+                f"--trainer-host={TRAINER_HOST}",
+            ],
+        )
+        # Read only & offline, so no requests at all
+        assert env.listing_requests == 0
+        assert not env.toolforge.calls
+        assert env.file_api.downloads == 0
+        assert env.file_api.uploads == 0
+
+    plan = json.loads((tmp_path / "plan.json").read_text())
+    assert [target["target_name"] for target in plan["targets"]] == [f"Synthetic Target {index}" for index in range(3)]
+    for target in plan["targets"]:
+        assert target["coordinator"]["cached"] is False
+        steps = target["steps"]
+        assert steps[0]["identifier"] == "store-edit-sets"
+        # Every input is either external or produced by an earlier step
+        for position, step in enumerate(steps):
+            assert all(dependency < position for dependency in step["depends_on"])
@@ -0,0 +1,109 @@
+"""
+MIT License
+
+Copyright (c) 2025 Damian Zaremba
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import io
+
+import pytest
+
+from benchmarks.fakes import TRAINER_HOST, invoke
+from cbng_trainer import cli
+from cbng_trainer.common.reports import iter_listed_edit_ids, iter_trial_results
+
+
+def test_iter_trial_results():
+    source = io.BytesIO(
+        b"<WPEditSet>"
+        b"<WPEdit><EditID>1</EditID><isVandalism>true</isVandalism><score>0.5</score></WPEdit>"
+        b"<WPEdit><EditID>2</EditID></WPEdit>"
+        b"</WPEditSet>"
+    )
+    assert list(iter_trial_results(source)) == [(1, 0.5, True), (2, None, None)]
+
+
+@pytest.mark.parametrize(
+    "edit",
+    [
+        b"<WPEdit><EditID> </EditID></WPEdit>",
+        b"<WPEdit><EditID>x</EditID></WPEdit>",
+        b"<WPEdit><EditID>3</EditID><score>high</score></WPEdit>",
+        b"<WPEdit><score>0.5</score></WPEdit>",
+    ],
+)
+def test_iter_trial_results_skips_malformed_edits(edit):
+    source = io.BytesIO(b"<WPEditSet>" + edit + b"<WPEdit><EditID>4</EditID></WPEdit></WPEditSet>")
+    assert list(iter_trial_results(source)) == [(4, None, None)]
+
+
+def test_iter_listed_edit_ids():
+    lines = [b"https://en.wikipedia.org/w/index.php?diff=123", b"456", b"789 0.912", b""]
+    assert list(iter_listed_edit_ids(lines)) == [123, 456, 789]
+
+
+@pytest.mark.parametrize(
+    "line",
+    [
+        b"False positives: 12",
+        b"Edit 123",
+        b"https://en.wikipedia.org/w/index.php?oldid=123",
+        b"12.5",
+    ],
+)
+def test_iter_listed_edit_ids_skips_other_lines(line):
+    assert list(iter_listed_edit_ids([line, b"456"])) == [456]
+
+
+def _compare_trials(capsys, other_instance_name: str) -> str:
+    invoke(
+        cli.compare_trials,
+        [
+            "--target-name=Benchmark",
+            "--instance-name=benchmark",
+            f"--other-instance-name={other_instance_name}",
+            f"--trainer-host={TRAINER_HOST}",
+        ],
+    )
+    return capsys.readouterr().out
+
+
+def test_compare_trials(env, capsys):
+    env.run_edit_set()
+    # Against itself, nothing differs
+    assert _compare_trials(capsys, "benchmark").splitlines() == [
+        "edit_id\tis_vandalism\toutcome\tother_outcome\tscore\tother_score"
+    ]
+
+
+def test_compare_trials_missing_index(env, capsys):
+    env.run_edit_set()
+    with pytest.raises(SystemExit) as e:
+        _compare_trials(capsys, "missing")
+    assert e.value.code == 1
+
+
+def test_compare_trials_corrupt_index(env, capsys):
+    env.run_edit_set()
+    env.file_api.objects[f"{TRAINER_HOST}/Benchmark/other/trial/index.sqlite"] = b"not a database"
+    with pytest.raises(SystemExit) as e:
+        _compare_trials(capsys, "other")
+    assert e.value.code == 1
@@ -0,0 +1,100 @@
+"""
+MIT License
+
+Copyright (c) 2025 Damian Zaremba
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import io
+
+import click
+import pytest
+
+from benchmarks.fakes import synthetic_edit_set
+from cbng_trainer import cli
+from cbng_trainer.common.editsets import is_vandalism, iter_edits
+from cbng_trainer.common.sampling import SampleSpec, parse_sample_spec, sample_edit_set
+
+
+def _edit_set(vandalism: int, constructive: int) -> bytes:
+    # Vandalism first, then constructive, so the sample can not be balanced by position alone
+    return (
+        b"<WPEditSet>"
+        + b"".join(
+            f"<WPEdit><EditID>{edit_id}</EditID><isVandalism>{'true' if edit_id < vandalism else 'false'}"
+            "</isVandalism></WPEdit>".encode("utf-8")
+            for edit_id in range(vandalism + constructive)
+        )
+        + b"</WPEditSet>"
+    )
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ("1000", SampleSpec(size=1000)),
+        (" 1 ", SampleSpec(size=1)),
+        ("0.05", SampleSpec(fraction=0.05)),
+        ("1.0", SampleSpec(fraction=1.0)),
+        ("5%", SampleSpec(fraction=0.05)),
+        ("100%", SampleSpec(fraction=1.0)),
+    ],
+)
+def test_parse_sample_spec(value, expected):
+    assert parse_sample_spec(value) == expected
+
+
+@pytest.mark.parametrize("value", ["0", "-5", "0.0", "0%", "1.5", "150%", "-0.1", "nan", "five", "", "5 %%"])
+def test_parse_sample_spec_rejects(value):
+    with pytest.raises(ValueError):
+        parse_sample_spec(value)
+
+
+@pytest.mark.parametrize("value", ["0", "1.5", "five"])
+def test_sample_option_is_validated(value):
+    with pytest.raises(click.BadParameter):
+        cli._validate_sample(None, None, value)
+
+
+@pytest.mark.parametrize("size", [10, 100, 250])
+def test_reservoir_keeps_label_proportions(size):
+    target = io.BytesIO()
+    stats = sample_edit_set(io.BytesIO(_edit_set(vandalism=200, constructive=800)), target, SampleSpec(size=size))
+    assert stats["seen"] == {"vandalism": 200, "constructive": 800}
+    assert stats["kept"] == {"vandalism": size // 5, "constructive": size * 4 // 5}
+
+    target.seek(0)
+    edits = [(int(edit.findtext("EditID")), is_vandalism(edit)) for edit in iter_edits(target)]
+    assert len(edits) == size
+    assert sum(1 for _, vandalism in edits if vandalism) == size // 5
+    # The original ordering is kept
+    assert edits == sorted(edits)
+
+
+def test_reservoir_larger_than_edit_set():
+    stats = sample_edit_set(io.BytesIO(synthetic_edit_set(100)), io.BytesIO(), SampleSpec(size=1000))
+    assert stats["kept"] == {"vandalism": 50, "constructive": 50}
+
+
+def test_fraction_sample_is_seeded():
+    first, second = io.BytesIO(), io.BytesIO()
+    sample_edit_set(io.BytesIO(synthetic_edit_set(1000)), first, SampleSpec(fraction=0.1), seed=1)
+    sample_edit_set(io.BytesIO(synthetic_edit_set(1000)), second, SampleSpec(fraction=0.1), seed=1)
+    assert first.getvalue() == second.getvalue()
@@ -0,0 +1,50 @@
+"""
+MIT License
+
+Copyright (c) 2025 Damian Zaremba
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+from datetime import datetime, timezone
+
+import pytest
+
+from benchmarks.fakes import synthetic_telemetry_line
+from cbng_trainer.common.telemetry import build_telemetry_timeline, parse_telemetry_line
+
+
+def test_telemetry_timeline():
+    now = datetime.now(tz=timezone.utc)
+    logs = [(now, f"+ synthetic log line {index}") for index in range(100)]
+    logs.extend((now, synthetic_telemetry_line(index)) for index in range(10))
+
+    timeline = build_telemetry_timeline(logs)
+    assert timeline["summary"]["samples"] == 10
+    assert timeline["summary"]["duration_seconds"] == 9
+    assert timeline["summary"]["mean_cpu_cores"] == pytest.approx(0.9)
+    assert timeline["summary"]["rx_bytes"] == 9_000_000
+    assert len(timeline["timeline"]) == 10
+    assert "cpu_cores" not in timeline["timeline"][0]
+    assert timeline["timeline"][1]["cpu_cores"] == pytest.approx(0.9)
+
+
+def test_malformed_telemetry_is_ignored():
+    assert parse_telemetry_line(synthetic_telemetry_line(0)[:-1]) is None
+    assert build_telemetry_timeline([])["summary"] == {"samples": 0}
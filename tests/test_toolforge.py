@@ -0,0 +1,137 @@
+"""
+MIT License
+
+Copyright (c) 2025 Damian Zaremba
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+from cbng_trainer.common import toolforge
+from cbng_trainer.common.toolforge import run_job
+from benchmarks.fakes import FakeEnvironment
+
+
+def _run_job(**kwargs) -> bool:
+    success, _ = run_job(
+        target_user="test",
+        job_name="test-run-job",
+        image_name="test",
+        run_commands=['echo "test"'],
+        **kwargs,
+    )
+    return success
+
+
+def test_run_job(env):
+    assert _run_job()
+    assert not env.toolforge.jobs
+
+
+def test_failing_job():
+    with FakeEnvironment(failing_jobs=["test-run-job"]) as env:
+        assert not _run_job()
+        assert not env.toolforge.jobs
+
+
+def test_stuck_job_is_hedged():
+    with FakeEnvironment(stuck_jobs=["test-run-job"]) as env:
+        assert _run_job(max_hedges=1, hedge_after=0)
+        # The stuck original is deleted once the hedge starts
+        assert env.toolforge.calls["post"] == 2
+        assert not env.toolforge.jobs
+
+
+def test_hedge_continues_when_the_original_fails_to_start():
+    with FakeEnvironment(unstartable_jobs=["test-run-job"]) as env:
+        assert _run_job(max_hedges=1, hedge_after=0)
+        assert not env.toolforge.jobs
+
+
+def test_unstartable_job_without_hedges_fails():
+    with FakeEnvironment(unstartable_jobs=["test-run-job"]) as env:
+        assert not _run_job(max_hedges=0)
+        assert not env.toolforge.jobs
+
+
+def _delete_coordinator_then_stop(env, monkeypatch, cancelled: bool) -> None:
+    # We are the coordinator, with a step job running
+    toolforge.configure_coordinator_job("test", "coord-test")
+    assert toolforge._run_job("test", "test-step", "test", "true")
+    if cancelled:
+        # run-edit-sets being stopped by SIGINT, deleting the coordinator on purpose
+        monkeypatch.setattr(toolforge, "_shutdown_requested", True)
+        monkeypatch.setattr(toolforge, "_delete_jobs_on_shutdown", True)
+        toolforge._cancel_job("test", "coord-test", propagate_cancel=True)
+    # Then the SIGTERM from the coordinator being deleted (or evicted)
+    monkeypatch.setattr(toolforge, "_shutdown_requested", True)
+    monkeypatch.setattr(toolforge, "_delete_jobs_on_shutdown", False)
+    toolforge._cancel_job("test", "test-step")
+    toolforge.configure_coordinator_job("test", None)
+
+
+def test_cancelled_coordinator_deletes_its_children(env, monkeypatch):
+    _delete_coordinator_then_stop(env, monkeypatch, cancelled=True)
+    assert not env.toolforge.jobs
+    # The flag is consumed, so does not cancel a later resume
+    assert not env.toolforge.envvars
+
+
+def test_evicted_coordinator_leaves_its_children(env, monkeypatch):
+    _delete_coordinator_then_stop(env, monkeypatch, cancelled=False)
+    assert list(env.toolforge.jobs) == ["test-step"]
+
+
+def test_stale_cancel_is_ignored_by_a_resumed_coordinator(env, monkeypatch):
+    # From cancelling a previous coordinator of the same name
+    toolforge._flag_cancel("test", "coord-test")
+    _delete_coordinator_then_stop(env, monkeypatch, cancelled=False)
+    assert list(env.toolforge.jobs) == ["test-step"]
+
+
+def test_hedge_waits_for_a_free_job_slot():
+    with FakeEnvironment(stuck_jobs=["test-run-job"]) as env:
+        toolforge.configure_job_slots(1)
+        # The only slot is held by the stuck job, so it is never hedged
+        assert not _run_job(max_hedges=1, hedge_after=0, start_timeout=1)
+        assert env.toolforge.calls["post"] == 1
+
+
+def test_hedge_takes_a_job_slot():
+    with FakeEnvironment(stuck_jobs=["test-run-job"]) as env:
+        toolforge.configure_job_slots(2)
+        assert _run_job(max_hedges=1, hedge_after=0)
+        assert env.toolforge.calls["post"] == 2
+        # Both slots are released again
+        assert toolforge._job_slots.acquire(blocking=False) and toolforge._job_slots.acquire(blocking=False)
+
+
+def test_same_step_is_adopted_when_its_command_changed(env):
+    # Left running by a previous coordinator, since when the step's command changed (e.g. a new image)
+    _run_job(job_identity="test\0instance\0step", wait_for_completion=False)
+    env.toolforge.jobs["test-run-job"].command = env.toolforge.jobs["test-run-job"].command.replace("setup", "old")
+    assert _run_job(job_identity="test\0instance\0step", adopt_existing=True)
+    assert env.toolforge.calls["post"] == 1
+    assert not env.toolforge.jobs
+
+
+def test_other_job_holding_the_name_is_replaced(env):
+    _run_job(job_identity="test\0other-instance\0step", wait_for_completion=False)
+    assert _run_job(job_identity="test\0instance\0step", adopt_existing=True)
+    assert env.toolforge.calls["post"] == 2
+    assert not env.toolforge.jobs
@@ -0,0 +1,111 @@
+"""
+MIT License
+
+Copyright (c) 2025 Damian Zaremba
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+from unittest import mock
+
+import pytest
+
+from benchmarks.fakes import REVIEW_HOST, FakeEnvironment, synthetic_edit_set
+from cbng_trainer.common import http_client
+from cbng_trainer.common.watch import EditGroupWatcher
+
+
+@pytest.fixture
+def env():
+    with FakeEnvironment(targets=3) as env:
+        yield env
+
+
+def test_existing_groups_are_taken_as_trained(env):
+    watcher = EditGroupWatcher(REVIEW_HOST, [], debounce=0)
+    watcher.poll()
+    assert watcher.pop_ready() == {}
+
+
+def test_run_on_start(env):
+    watcher = EditGroupWatcher(REVIEW_HOST, [], debounce=0)
+    watcher.poll(run_on_start=True)
+    assert set(watcher.pop_ready()) == {f"Synthetic Target {index}" for index in range(3)}
+
+
+def test_failed_run_is_retried(env):
+    watcher = EditGroupWatcher(REVIEW_HOST, ["Synthetic Target 0"], debounce=0)
+    watcher.poll(run_on_start=True)
+    assert list(watcher.pop_ready()) == ["Synthetic Target 0"]
+    # Never run twice at once
+    watcher.poll()
+    assert watcher.pop_ready() == {}
+
+    watcher.mark_done("Synthetic Target 0", False)
+    assert list(watcher.pop_ready()) == ["Synthetic Target 0"]
+    watcher.mark_done("Synthetic Target 0", True)
+    watcher.poll()
+    assert watcher.pop_ready() == {}
+
+
+def test_trained_state_is_saved(env, tmp_path):
+    state_file = (tmp_path / "watch.json").as_posix()
+    watcher = EditGroupWatcher(REVIEW_HOST, [], debounce=0, state_file=state_file)
+    watcher.poll(run_on_start=True)
+    for target_name in watcher.pop_ready():
+        watcher.mark_done(target_name, target_name != "Synthetic Target 2")
+
+    # A restart only picks up what did not finish
+    watcher = EditGroupWatcher(REVIEW_HOST, [], debounce=0, state_file=state_file)
+    watcher.poll(run_on_start=True)
+    assert list(watcher.pop_ready()) == ["Synthetic Target 2"]
+
+
+def test_listing_is_requested_conditionally(env):
+    watcher = EditGroupWatcher(REVIEW_HOST, [], debounce=0)
+    for _ in range(3):
+        watcher.poll()
+    assert env.listing_requests == 3
+    assert watcher._etag is not None
+
+
+def test_edits_added_to_a_group_are_detected(env):
+    watcher = EditGroupWatcher(REVIEW_HOST, [], debounce=0)
+    watcher.poll()
+    # The listing is unchanged, only the dump of the first target's training group
+    env.edit_group_dumps[1] = synthetic_edit_set(11, first_edit_id=1000)
+    watcher.poll()
+    assert list(watcher.pop_ready()) == ["Synthetic Target 0"]
+
+
+def test_unchanged_dumps_are_not_downloaded(env):
+    watcher = EditGroupWatcher(REVIEW_HOST, [], debounce=0)
+    watcher.poll()
+    statuses = []
+    session_get = http_client._session.get
+
+    def _get(url, *args, **kwargs):
+        response = session_get(url, *args, **kwargs)
+        statuses.append(response.status_code)
+        return response
+
+    with mock.patch.object(http_client._session, "get", _get):
+        watcher.poll()
+    # The listing & every group's dump
+    assert statuses == [304] * (1 + len(env.edit_groups))